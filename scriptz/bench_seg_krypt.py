@@ -0,0 +1,64 @@
+""" bench_seg_krypt.py
+
+Benchmark thread pooled segment encryption/decryption (libr3dv1t.krypt_utilz.seg_krypt) for different worker counts.
+
+python3 scriptz/bench_seg_krypt.py [object size in MiB]
+
+"""
+
+import os
+import sys
+import time
+import subprocess as sp
+from pathlib import Path
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+_REPO_ROOT_PATH = Path(sp.check_output(["git", "rev-parse", "--show-toplevel"], text=True).strip()).resolve()
+
+if str(_REPO_ROOT_PATH / "src") not in sys.path:
+    sys.path.insert(0, str(_REPO_ROOT_PATH / "src"))
+
+from libr3dv1t.central_config import dfcc
+from libr3dv1t.krypt_utilz import seg_krypt
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+def bench_seg_krypt(obj_size_mib: int):
+
+    key = os.urandom(32)
+    chunk_size = dfcc().default_chunk_size
+    pt_data = os.urandom(obj_size_mib * 1024 * 1024)
+    pt_chunks = [pt_data[i:i + chunk_size] for i in range(0, len(pt_data), chunk_size)]
+
+    print(f"object size: {obj_size_mib} MiB -- {len(pt_chunks):_} segments of {chunk_size} bytes -- "
+          f"{os.cpu_count()} cpus")
+    print(f"{'workers':>8} | {'encrypt MiB/s':>14} | {'decrypt MiB/s':>14} | {'speedup':>8}")
+
+    base_total = None
+    workers = 1
+    while workers <= max(8, os.cpu_count() or 1):
+        t0 = time.perf_counter()
+        ct_chunks = seg_krypt.encrypt_chunks(key, pt_chunks, workers=workers)
+        t1 = time.perf_counter()
+
+        t2 = time.perf_counter()
+        out_chunks = seg_krypt.decrypt_chunks(key, ct_chunks, workers=workers)
+        t3 = time.perf_counter()
+
+        assert out_chunks == pt_chunks
+
+        total = (t1 - t0) + (t3 - t2)
+        if base_total is None:
+            base_total = total
+
+        print(f"{workers:>8} | {obj_size_mib / (t1 - t0):>14.1f} | {obj_size_mib / (t3 - t2):>14.1f} | "
+              f"{base_total / total:>7.2f}x")
+        workers *= 2
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+if '__main__' == __name__:
+    bench_seg_krypt(obj_size_mib=int(sys.argv[1]) if len(sys.argv) > 1 else 64)
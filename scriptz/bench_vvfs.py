@@ -0,0 +1,69 @@
+""" bench_vvfs.py
+
+Benchmark VaultVirtualFS (libr3dv1t.vault.vvfs) link/lookup/relink/unlink as the number of names grows.
+The time per operation should stay flat, every operation is O(1).
+
+python3 scriptz/bench_vvfs.py [max number of names, default 2_000_000]
+
+"""
+
+import sys
+import time
+import hashlib
+import subprocess as sp
+from pathlib import Path
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+_REPO_ROOT_PATH = Path(sp.check_output(["git", "rev-parse", "--show-toplevel"], text=True).strip()).resolve()
+
+if str(_REPO_ROOT_PATH / "src") not in sys.path:
+    sys.path.insert(0, str(_REPO_ROOT_PATH / "src"))
+
+from libr3dv1t.vault.vvfs import VaultVirtualFS, VirtualFile
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+def _per_op_us(fn, items: list) -> float:
+    """ Microseconds per call of fn over items. """
+
+    t0 = time.perf_counter()
+    for item in items:
+        fn(item)
+    t1 = time.perf_counter()
+
+    return (t1 - t0) / max(1, len(items)) * 1e6
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+def bench_vvfs(max_names: int):
+
+    print(f"{'names':>10} | {'link us/op':>10} | {'get_oid us/op':>13} | {'relink us/op':>12} | {'unlink us/op':>12}")
+
+    sizes = [10 ** e for e in range(3, 10) if 10 ** e < max_names] + [max_names]
+    for n_names in sizes:
+        # a few names per oid, like a vault with duplicate files
+        oids = [hashlib.sha3_384(str(k).encode()).hexdigest() for k in range(n_names // 4 + 1)]
+        vfiles = [VirtualFile(f"dir_{k % 1000}/sub_{k % 7}/file_{k}.bin") for k in range(n_names)]
+
+        vv_fs = VaultVirtualFS()
+
+        link_us = _per_op_us(lambda k: vv_fs.link_vf(vfiles[k], oids[k % len(oids)]), range(n_names))
+        get_oid_us = _per_op_us(vv_fs.get_oid, vfiles)
+
+        # point a tenth of the names somewhere else, then delete them
+        sample = range(0, n_names, 10)
+        relink_us = _per_op_us(lambda k: vv_fs.link_vf(vfiles[k], oids[(k + 1) % len(oids)]), sample)
+        unlink_us = _per_op_us(lambda k: vv_fs.unlink_vf(vfiles[k]), sample)
+
+        assert len(vv_fs.pname_to_oid) == n_names - len(sample)
+
+        print(f"{n_names:>10_} | {link_us:>10.2f} | {get_oid_us:>13.2f} | {relink_us:>12.2f} | {unlink_us:>12.2f}")
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+if '__main__' == __name__:
+    bench_vvfs(max_names=int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000)
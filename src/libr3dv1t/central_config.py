@@ -2,13 +2,41 @@
 Central configuration for the library.
 Also documentation for some library params might be found here.
 """
-from .typedefs import RVKryptMode
+import os
+
+from .typedefs import RVKryptMode, RVFrameFmt
 
 # ------------------------------------------------------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------------------------------------------------------
 _DEFAULT_CHUNK_SIZE = 2048
 _DEFAULT_REPLICATION = 3
 
+# content defined chunking sizes, see vault/chunker.py
+_DEFAULT_CDC_MIN_SIZE = 512
+_DEFAULT_CDC_AVG_SIZE = 2048
+_DEFAULT_CDC_MAX_SIZE = 8192
+
+# vault files smaller than this are loaded serially, starting worker processes is not worth it.
+_DEFAULT_PARALLEL_LOAD_MIN_SIZE = 16 * 1024 * 1024
+
+# bytes of frames an eager load reads and pre-parses ahead while the KDF is still running.
+_DEFAULT_KDF_READ_AHEAD = 256 * 1024 * 1024
+
+# segments handed to one encrypt/decrypt worker thread at a time.
+_DEFAULT_KRYPT_BATCH_SIZE = 64
+
+# appending saves rewrite the vault index once the frames it does not cover are this large relative to the ones it does.
+_DEFAULT_VLT_INDEX_TAIL_RATIO = 0.25
+
+# vvfs operations journaled since the last vvfs checkpoint before appending saves write a new checkpoint.
+_DEFAULT_VVFS_CHECKPOINT_OPS = 10_000
+
+_DEFAULT_SERVER_PORT = 8733
+_DEFAULT_SERVER_MAX_BODY_SIZE = 64 * 1024 * 1024 * 1024
+
+# seconds a key agent keeps derived vault keys
+_DEFAULT_AGENT_TTL = 3600
+
 
 # ------------------------------------------------------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------------------------------------------------------
@@ -19,9 +47,62 @@ class CentralConfig:
         self.default_replicas = _DEFAULT_REPLICATION
         self.default_chunk_size = _DEFAULT_CHUNK_SIZE
 
+        # segmenter for new objects: 'fixed' (default_chunk_size) or 'cdc' (content defined, cdc_*_size).
+        self.chunker = 'fixed'
+        self.cdc_min_size = _DEFAULT_CDC_MIN_SIZE
+        self.cdc_avg_size = _DEFAULT_CDC_AVG_SIZE
+        self.cdc_max_size = _DEFAULT_CDC_MAX_SIZE
+
+        # segment level dedup: identical chunks (across all objects) are encrypted and stored once, see VaultMan.seg_store
+        self.dedup = True
+
+        # write an index sidecar ([vault file].r3x) on save, so loads do not have to scan every frame. see vlt_index.
+        self.vlt_index = True
+
+        # appending saves leave the index alone, loads scan the frames after what it covers. it is only rewritten (from
+        # everything in the vault, O(vault size)) once that unindexed tail exceeds vlt_index_tail_ratio of the indexed
+        # part, so appends stay O(change) amortized.
+        self.vlt_index_tail_ratio = _DEFAULT_VLT_INDEX_TAIL_RATIO
+
+        # virtual file names are saved as vvfs journal frames (appending saves) and vvfs checkpoint frames (full saves,
+        # and appending saves once vvfs_checkpoint_ops operations were journaled since the last checkpoint).
+        self.vvfs_checkpoint_ops = _DEFAULT_VVFS_CHECKPOINT_OPS
+
         self.default_krypt_mode = RVKryptMode.CHACHA20_POLY1305
 
+        # compression stage for new segments: 'zlib', 'lzma', 'bz2' or None for no compression.
+        # objects that dont compress (sampled per object) are stored as is either way.
+        self.compression: str | None = None
+
+        # frame format for new vault files. loaded vaults keep the format they were loaded with.
+        self.default_frame_fmt = RVFrameFmt.PSV
+
+        # number of worker processes used to parse and verify frames when loading large vaults.
+        self.load_workers = os.cpu_count() or 1
+        self.parallel_load_min_size = _DEFAULT_PARALLEL_LOAD_MIN_SIZE
+
+        # the KDF runs on a thread, loads read (and pre-parse) up to kdf_read_ahead bytes of frames while it runs.
+        self.kdf_read_ahead = _DEFAULT_KDF_READ_AHEAD
+
+        # bytes of decrypted object data VaultMan keeps in memory (LRU, see vault/pt_cache.py). None means no limit.
+        # evicted objects are decrypted again from their segments when needed.
+        self.pt_cache_budget: int | None = None
+
+        # number of threads encrypting/decrypting segments of one object. 1 means no thread pool.
+        self.krypt_workers = os.cpu_count() or 1
+        self.krypt_batch_size = _DEFAULT_KRYPT_BATCH_SIZE
+
+        # local http object server (see server/vlt_server.py), port and largest upload accepted
+        self.server_port = _DEFAULT_SERVER_PORT
+        self.server_max_body_size = _DEFAULT_SERVER_MAX_BODY_SIZE
+
+        # local key agent (see krypt_utilz/key_agent.py). socket of a running agent, vault keys are derived by it (and
+        # cached) instead of in process. None runs the KDF in process. agent_ttl is the default ttl of agents started here.
+        self.agent_sock: str | None = None
+        self.agent_ttl: float | None = _DEFAULT_AGENT_TTL
+
         # implement any env variable overrides here
+        self.agent_sock = os.environ.get('R3DV1T_AGENT_SOCK') or self.agent_sock
 
         self.dbg_mode = True
 
@@ -69,6 +69,7 @@ def _vks_set_from_user_pass(upw: bytes) -> VaultKeys:
     vks.frame_hmac_key = _pbkdf2_hmac(hash_name=_PRF, password=vk_long[200:260], salt=b'fl_hmac', iterations=42, dklen=32)
     vks.sgk_chacha20 = _pbkdf2_hmac(hash_name=_PRF, password=vk_long[300:360], salt=b'sgk_cha20', iterations=42, dklen=32)
     vks.sgk_fernet = _pbkdf2_hmac(hash_name=_PRF, password=vk_long[400:460], salt=b'sgk_fernet', iterations=42, dklen=32)
+    vks.ssfp_key = _pbkdf2_hmac(hash_name=_PRF, password=vk_long[500:560], salt=b'ssfp', iterations=42, dklen=32)
 
     # NOTE: feel free to add more vault keys here as needed. vk_long has plenty unused bytes left,
     # and further increasing the length of vk_long should not change earlier bytes.
@@ -0,0 +1,501 @@
+''' key_agent.py
+
+Local key agent, similar to ssh-agent. Deriving the vault keys from a password (kdf.vks_set_from_user_pass) takes
+seconds of scrypt and pbkdf2, on every VaultMan. A key agent runs the KDF once per password and hands the derived
+VaultKeys to processes of the same user over a unix socket, repeated vault operations start in milliseconds.
+
+Opt in: start an agent (python -m libr3dv1t.krypt_utilz.key_agent) and set R3DV1T_AGENT_SOCK to its socket (see
+CentralConfig.agent_sock). derive_vks() then asks the agent, and runs the KDF in process if there is no agent or it
+can't be reached. Vault passwords and keys still cross the socket, the agent is only as safe as the user account.
+
+- The socket is in a directory only the user can enter (0700), the socket itself is 0600. The agent refuses peers of
+  another uid where the platform tells (SO_PEERCRED), clients refuse sockets owned by another uid.
+- Keys expire ttl seconds after they were derived or added (None keeps them until the agent exits or forgets them).
+- A locked agent keeps its keys but refuses every request other than unlock (with the passphrase it was locked with).
+
+Protocol: one json line request, one json line reply per connection. Requests have an 'op' and its fields, bytes
+(passwords) as b64. Replies have 'ok', and either the result fields or an 'error'. Ops:
+- vks {upw}                 keys of a vault password, derived on the first request, cached after that.
+- add {name, upw, ttl}      derive the keys of a password and keep them under a name (ttl null: the agent default).
+- get {name}                keys added under a name, without the password.
+- lock {passphrase}, unlock {passphrase}, forget {} (drop all keys), status {}.
+
+'''
+
+import os
+import sys
+import json
+import stat
+import time
+import hmac
+import socket
+import struct
+import hashlib
+import tempfile
+import argparse
+import threading
+import socketserver
+
+import base64 as b64
+
+from libr3dv1t.central_config import dfcc
+from libr3dv1t.errors import R3D_V1T_Error
+from libr3dv1t.typedefs import VaultKeys
+from libr3dv1t.krypt_utilz import kdf
+from libr3dv1t.log_utilz.log_man import default_logger as log
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+# largest request line the agent reads
+_MAX_MSG_SIZE = 64 * 1024
+
+# clients wait this long for a reply, the agent may be running the KDF
+_CALL_TIMEOUT = 120.0
+
+# wrong unlock passphrases are answered after this delay, so guessing it is slow
+_BAD_UNLOCK_DELAY = 0.5
+
+_OPS = ('vks', 'add', 'get', 'lock', 'unlock', 'forget', 'status')
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+def _vks_to_dict(vks: VaultKeys) -> dict[str, str]:
+    return {slot: getattr(vks, slot).hex() for slot in VaultKeys.__slots__}
+
+
+def _vks_from_dict(vks_dict: dict[str, str]) -> VaultKeys:
+
+    vks = VaultKeys()
+    for slot in VaultKeys.__slots__:
+        setattr(vks, slot, bytes.fromhex(vks_dict[slot]))
+
+    return vks
+
+
+def _check_sock_dir(sock_dir: str):
+    """ Raise unless sock_dir is a directory of this user that no one else can enter. """
+
+    st = os.lstat(sock_dir)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise R3D_V1T_Error(f"key agent: '{sock_dir}' must be a directory owned by this user with mode 0700.")
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+class KeyAgent:
+    """ Derives and caches vault keys, see the module doc. ttl is the default lifetime of keys in seconds. """
+
+    def __init__(self, ttl: float | None = None):
+
+        self.ttl = ttl
+
+        # cache key -> (keys, expiry time.monotonic(), None for never). vault passwords are cached under a keyed hash
+        # ('upw:' + hex) so the agent never holds the passwords themselves, added keys under 'name:' + their name.
+        self._keys: dict[str, tuple[VaultKeys, float | None]] = {}
+        self._upw_hash_key = os.urandom(32)
+
+        # keyed hash of the lock passphrase while locked
+        self._lock_digest: bytes | None = None
+
+        self._mutex = threading.Lock()
+        self._server: _AgentServer | None = None
+        self._server_thread: threading.Thread | None = None
+        self.sock_path = ''
+
+        # private directory made by bind() for the socket, removed again on shutdown
+        self._tmp_sock_dir = ''
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    # --------------------------------------------------------------------------------------------------------------------------
+    # --------------------------------------------------------------------------------------------------------------- requests
+    def handle_request(self, request: dict) -> dict:
+        """ Reply to a request (see the module doc). """
+
+        try:
+            op = request.get('op')
+            if op not in _OPS:
+                raise R3D_V1T_Error(f"unknown op {op!r}.")
+
+            if op == 'unlock':
+                return self._unlock(self._field_bytes(request, 'passphrase'))
+
+            with self._mutex:
+                if self._lock_digest is not None:
+                    raise R3D_V1T_Error("agent is locked.")
+                self._purge_expired()
+
+            return getattr(self, f'_op_{op}')(request)
+
+        except (R3D_V1T_Error, ValueError, TypeError) as err:
+            return {'ok': False, 'error': str(err)}
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def _op_vks(self, request: dict) -> dict:
+
+        upw = self._field_bytes(request, 'upw')
+        cache_key = 'upw:' + hashlib.blake2b(upw, key=self._upw_hash_key).hexdigest()
+
+        with self._mutex:
+            cached = self._keys.get(cache_key)
+        if cached is not None:
+            return {'ok': True, 'vks': _vks_to_dict(cached[0])}
+
+        # no lock while deriving, it takes seconds. two requests for a new password both derive it, same keys.
+        vks = kdf.vks_set_from_user_pass(upw)
+        self._put(cache_key, vks, self.ttl)
+
+        return {'ok': True, 'vks': _vks_to_dict(vks)}
+
+    def _op_add(self, request: dict) -> dict:
+
+        name = self._field_str(request, 'name')
+        ttl = request.get('ttl')
+        if ttl is not None and (not isinstance(ttl, (int, float)) or ttl <= 0):
+            raise R3D_V1T_Error("ttl must be a positive number of seconds or null.")
+
+        vks = kdf.vks_set_from_user_pass(self._field_bytes(request, 'upw'))
+        self._put('name:' + name, vks, self.ttl if ttl is None else ttl)
+
+        return {'ok': True}
+
+    def _op_get(self, request: dict) -> dict:
+
+        name = self._field_str(request, 'name')
+        with self._mutex:
+            cached = self._keys.get('name:' + name)
+        if cached is None:
+            raise R3D_V1T_Error(f"no keys named '{name}'.")
+
+        return {'ok': True, 'vks': _vks_to_dict(cached[0])}
+
+    def _op_lock(self, request: dict) -> dict:
+
+        passphrase = self._field_bytes(request, 'passphrase')
+        with self._mutex:
+            self._lock_digest = self._passphrase_digest(passphrase)
+
+        log.info("key agent: locked")
+        return {'ok': True}
+
+    def _unlock(self, passphrase: bytes) -> dict:
+
+        with self._mutex:
+            if self._lock_digest is None:
+                raise R3D_V1T_Error("agent is not locked.")
+            if hmac.compare_digest(self._lock_digest, self._passphrase_digest(passphrase)):
+                self._lock_digest = None
+                log.info("key agent: unlocked")
+                return {'ok': True}
+
+        time.sleep(_BAD_UNLOCK_DELAY)
+        raise R3D_V1T_Error("wrong passphrase.")
+
+    def _op_forget(self, request: dict) -> dict:
+
+        with self._mutex:
+            self._keys.clear()
+
+        return {'ok': True}
+
+    def _op_status(self, request: dict) -> dict:
+
+        with self._mutex:
+            names = sorted(key[len('name:'):] for key in self._keys if key.startswith('name:'))
+            return {'ok': True, 'keys': len(self._keys), 'names': names}
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def _put(self, cache_key: str, vks: VaultKeys, ttl: float | None):
+
+        with self._mutex:
+            self._keys[cache_key] = (vks, None if ttl is None else time.monotonic() + ttl)
+
+    def _purge_expired(self):
+        """ Drop keys past their ttl. Caller holds _mutex (or is the only thread using the agent). """
+
+        now = time.monotonic()
+        for cache_key in [key for key, (_, expiry) in self._keys.items() if expiry is not None and expiry <= now]:
+            del self._keys[cache_key]
+
+    def _passphrase_digest(self, passphrase: bytes) -> bytes:
+        return hashlib.blake2b(passphrase, key=self._upw_hash_key, person=b'r3dv1t_lock').digest()
+
+    @staticmethod
+    def _field_bytes(request: dict, field: str) -> bytes:
+
+        value = request.get(field)
+        if not isinstance(value, str):
+            raise R3D_V1T_Error(f"missing field '{field}'.")
+
+        return b64.b64decode(value, validate=True)
+
+    @staticmethod
+    def _field_str(request: dict, field: str) -> str:
+
+        value = request.get(field)
+        if not isinstance(value, str) or not value:
+            raise R3D_V1T_Error(f"missing field '{field}'.")
+
+        return value
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    # --------------------------------------------------------------------------------------------------------------------------
+    # ----------------------------------------------------------------------------------------------------------------- socket
+    def bind(self, sock_path: str | None = None) -> str:
+        """ Create the listening socket, sock_path None makes a new private directory for it. Return the socket path.
+        Raise R3D_V1T_Error if the directory is not private or another agent is listening on sock_path. """
+
+        if sock_path is None:
+            self._tmp_sock_dir = tempfile.mkdtemp(prefix='r3dv1t_agent_')
+            sock_path = os.path.join(self._tmp_sock_dir, 'agent.sock')
+
+        sock_path = os.path.abspath(sock_path)
+        sock_dir = os.path.dirname(sock_path)
+        os.makedirs(sock_dir, mode=0o700, exist_ok=True)
+        _check_sock_dir(sock_dir)
+
+        # a socket file left by an agent that did not exit cleanly is replaced, a live agent is not
+        if os.path.exists(sock_path):
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                is_live = probe.connect_ex(sock_path) == 0
+            if not is_live:
+                os.unlink(sock_path)
+            else:
+                raise R3D_V1T_Error(f"key agent: an agent is already listening on '{sock_path}'.")
+
+        old_umask = os.umask(0o177)
+        try:
+            self._server = _AgentServer(sock_path, self)
+        finally:
+            os.umask(old_umask)
+        os.chmod(sock_path, 0o600)
+
+        self.sock_path = sock_path
+        log.info(f"key agent: listening on '{sock_path}'")
+        return sock_path
+
+    def serve_forever(self):
+        """ Serve requests until shutdown(). bind() first. """
+
+        self._server.serve_forever(poll_interval=1.0)
+
+    def start(self, sock_path: str | None = None) -> str:
+        """ bind() and serve on a daemon thread. Return the socket path. """
+
+        sock_path = self.bind(sock_path)
+        self._server_thread = threading.Thread(target=self.serve_forever, name='r3dv1t_key_agent', daemon=True)
+        self._server_thread.start()
+
+        return sock_path
+
+    def shutdown(self):
+        """ Stop serving, remove the socket and drop all keys. """
+
+        if self._server is not None:
+            if self._server_thread is not None:
+                self._server.shutdown()
+                self._server_thread.join()
+                self._server_thread = None
+            self._server.server_close()
+            self._server = None
+
+            try:
+                os.unlink(self.sock_path)
+                if self._tmp_sock_dir:
+                    os.rmdir(self._tmp_sock_dir)
+            except FileNotFoundError:
+                pass
+
+        with self._mutex:
+            self._keys.clear()
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+class _AgentRequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+
+        if not self._peer_is_owner():
+            return
+
+        # nothing sent, e.g. bind() checking for a live agent
+        line = self.rfile.readline(_MAX_MSG_SIZE + 1)
+        if not line:
+            return
+
+        if len(line) > _MAX_MSG_SIZE:
+            reply = {'ok': False, 'error': "request too large."}
+        else:
+            try:
+                request = json.loads(line)
+            except ValueError:
+                reply = {'ok': False, 'error': "request is not json."}
+            else:
+                if isinstance(request, dict):
+                    reply = self.server.agent.handle_request(request)
+                else:
+                    reply = {'ok': False, 'error': "request is not a json object."}
+
+        self.wfile.write(json.dumps(reply).encode('utf8') + b'\n')
+
+    def _peer_is_owner(self) -> bool:
+        """ False if the peer is another uid. platforms without SO_PEERCRED rely on the socket permissions. """
+
+        if not hasattr(socket, 'SO_PEERCRED'):
+            return True
+
+        creds = self.request.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+        _, peer_uid, _ = struct.unpack('3i', creds)
+        if peer_uid != os.getuid():
+            log.warn(f"key agent: refused a connection from uid {peer_uid}")
+            return False
+
+        return True
+
+
+class _AgentServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+
+    daemon_threads = True
+
+    def __init__(self, sock_path: str, agent: KeyAgent):
+
+        self.agent = agent
+        super().__init__(sock_path, _AgentRequestHandler)
+
+    def service_actions(self):
+
+        with self.agent._mutex:
+            self.agent._purge_expired()
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+class AgentClient:
+    """ Client of a key agent listening on sock_path. Calls raise OSError if the agent can't be reached and
+    R3D_V1T_Error if it refuses the request. """
+
+    def __init__(self, sock_path: str, timeout: float = _CALL_TIMEOUT):
+
+        self.sock_path = sock_path
+        self.timeout = timeout
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def vks(self, upw: bytes) -> VaultKeys:
+        """ Keys of a vault password, derived by the agent (or from its cache). """
+
+        return _vks_from_dict(self._call('vks', upw=b64.b64encode(upw).decode('ascii'))['vks'])
+
+    def add(self, name: str, upw: bytes, ttl: float | None = None):
+        """ Have the agent derive the keys of a password and keep them under name, ttl None for its default. """
+
+        self._call('add', name=name, upw=b64.b64encode(upw).decode('ascii'), ttl=ttl)
+
+    def get(self, name: str) -> VaultKeys:
+        """ Keys added under name. """
+
+        return _vks_from_dict(self._call('get', name=name)['vks'])
+
+    def lock(self, passphrase: bytes):
+        self._call('lock', passphrase=b64.b64encode(passphrase).decode('ascii'))
+
+    def unlock(self, passphrase: bytes):
+        self._call('unlock', passphrase=b64.b64encode(passphrase).decode('ascii'))
+
+    def forget(self):
+        self._call('forget')
+
+    def status(self) -> dict:
+        return self._call('status')
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def _call(self, op: str, **fields) -> dict:
+
+        sock_st = os.stat(self.sock_path)
+        if not stat.S_ISSOCK(sock_st.st_mode) or sock_st.st_uid != os.getuid():
+            raise R3D_V1T_Error(f"key agent: '{self.sock_path}' is not a socket owned by this user.")
+
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect(self.sock_path)
+            sock.sendall(json.dumps({'op': op, **fields}).encode('utf8') + b'\n')
+
+            with sock.makefile('rb') as rfile:
+                line = rfile.readline()
+
+        if not line:
+            raise R3D_V1T_Error("key agent: connection closed without a reply.")
+
+        reply = json.loads(line)
+        if not reply.get('ok'):
+            raise R3D_V1T_Error(f"key agent: {reply.get('error')}")
+
+        return reply
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+def derive_vks(upw: bytes) -> VaultKeys:
+    """ kdf.vks_set_from_user_pass, through the key agent at dfcc().agent_sock if there is one. Falls back to running
+    the KDF in process if the agent can't be reached or refuses (e.g. it is locked). """
+
+    sock_path = dfcc().agent_sock
+    if sock_path:
+        try:
+            return AgentClient(sock_path).vks(upw)
+        except (OSError, ValueError, KeyError, R3D_V1T_Error) as err:
+            log.warn(f"key agent: '{sock_path}' not usable ({err}), deriving the vault keys here")
+
+    return kdf.vks_set_from_user_pass(upw)
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+def _main(argv: list[str]):
+
+    import getpass
+    import signal
+
+    parser = argparse.ArgumentParser(prog='python -m libr3dv1t.krypt_utilz.key_agent',
+                                     description="r3dv1t key agent, caches derived vault keys for this user.")
+    parser.add_argument('--sock', default=None, help="socket path (default: in a new private temp directory)")
+    parser.add_argument('--ttl', type=float, default=dfcc().agent_ttl, help="seconds keys are kept (default: %(default)s)")
+    parser.add_argument('cmd', nargs='?', default='serve', choices=['serve', 'add', 'lock', 'unlock', 'forget', 'status'],
+                        help="serve (default) runs an agent in the foreground, the others talk to R3DV1T_AGENT_SOCK")
+    parser.add_argument('name', nargs='?', default=None, help="name for add")
+    args = parser.parse_args(argv)
+
+    if args.cmd == 'serve':
+        agent = KeyAgent(ttl=args.ttl if args.ttl and args.ttl > 0 else None)
+        sock_path = agent.bind(args.sock)
+        print(f"R3DV1T_AGENT_SOCK={sock_path}; export R3DV1T_AGENT_SOCK;", flush=True)
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        try:
+            agent.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            agent.shutdown()
+        return
+
+    sock_path = args.sock or dfcc().agent_sock
+    if not sock_path:
+        parser.error("no agent, set R3DV1T_AGENT_SOCK or pass --sock")
+    client = AgentClient(sock_path)
+
+    if args.cmd == 'add':
+        if not args.name:
+            parser.error("add needs a name")
+        client.add(args.name, getpass.getpass("vault password: ").encode('utf8'))
+    elif args.cmd == 'lock':
+        client.lock(getpass.getpass("lock passphrase: ").encode('utf8'))
+    elif args.cmd == 'unlock':
+        client.unlock(getpass.getpass("unlock passphrase: ").encode('utf8'))
+    elif args.cmd == 'forget':
+        client.forget()
+    else:
+        print(json.dumps(client.status()))
+
+
+if '__main__' == __name__:
+    _main(sys.argv[1:])
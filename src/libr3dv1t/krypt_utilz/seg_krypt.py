@@ -0,0 +1,88 @@
+''' seg_krypt.py
+
+Segment encryption/decryption (krypt mode km_1, ChaCha20-Poly1305 via libsodium SecretBox).
+
+libsodium releases the GIL, so batches of segments are handed to a thread pool. Results always come back in the
+same order as the input, the thread pool is purely a speed up. The pools are module level and reused across calls
+(one per worker count), so a batch does not pay for starting threads.
+
+'''
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from nacl.secret import SecretBox
+from nacl.exceptions import CryptoError
+
+from libr3dv1t.central_config import dfcc
+from libr3dv1t.errors import R3D_V1T_Error
+from libr3dv1t.krypt_utilz.nonce_gen import make_nonce
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+# worker count -> the thread pool of that size, created when first needed
+_executors: dict[int, ThreadPoolExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def _get_executor(workers: int) -> ThreadPoolExecutor:
+
+    with _executors_lock:
+        executor = _executors.get(workers)
+        if executor is None:
+            executor = _executors[workers] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='r3dv1t_krypt')
+
+    return executor
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+def _encrypt_batch(box: SecretBox, pt_chunks: list[bytes]) -> list[bytes]:
+    """ Encrypt a batch of plaintext chunks, return the raw ciphertexts (nonce + ct + mac). """
+
+    return [bytes(box.encrypt(pt_chunk, make_nonce(SecretBox.NONCE_SIZE))) for pt_chunk in pt_chunks]
+
+
+def _decrypt_batch(box: SecretBox, ct_chunks: list[bytes]) -> list[bytes]:
+    """ Decrypt a batch of raw (not b64) ciphertext chunks. """
+
+    try:
+        return [box.decrypt(ct_chunk) for ct_chunk in ct_chunks]
+    except CryptoError as e:
+        raise R3D_V1T_Error(f"Segment decryption failed: {e}")
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+def _run_batched(batch_fn, box: SecretBox, chunks: list[bytes], workers: int | None) -> list[bytes]:
+    """ Run batch_fn over chunks, in a thread pool if there is enough work to go around. Output order == input order. """
+
+    if workers is None:
+        workers = dfcc().krypt_workers
+
+    batch_size = dfcc().krypt_batch_size
+    if workers <= 1 or len(chunks) <= batch_size:
+        return batch_fn(box, chunks)
+
+    batches = [chunks[i:i + batch_size] for i in range(0, len(chunks), batch_size)]
+
+    results = []
+    for batch_result in _get_executor(workers).map(lambda batch: batch_fn(box, batch), batches):
+        results.extend(batch_result)
+
+    return results
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+def encrypt_chunks(key: bytes, pt_chunks: list[bytes], workers: int | None = None) -> list[bytes]:
+    """ Encrypt plaintext chunks with ChaCha20-Poly1305, return the raw ciphertexts in input order. """
+
+    return _run_batched(_encrypt_batch, SecretBox(key), pt_chunks, workers)
+
+
+def decrypt_chunks(key: bytes, ct_chunks: list[bytes], workers: int | None = None) -> list[bytes]:
+    """ Decrypt raw ChaCha20-Poly1305 ciphertext chunks, return the plaintexts in input order. """
+
+    return _run_batched(_decrypt_batch, SecretBox(key), ct_chunks, workers)
@@ -0,0 +1,275 @@
+''' vlt_server.py
+
+Local HTTP object server, exposes an opened vault (AsyncVaultMan) over HTTP on localhost. Tooling can fetch single
+files out of a large vault without extracting it.
+
+- GET /objs/<virtual path>  object data. single range Range requests (bytes=a-b, bytes=a-, bytes=-n) get a 206 with
+                            only the covering segments decrypted. the body is streamed a chunk at a time.
+- HEAD /objs/<virtual path> size, no body.
+- PUT /objs/<virtual path>  upsert an object. the body is streamed into the vault as it arrives (never buffered whole),
+                            replies 201 with the obj_id. an upload cut off by the client leaves nothing behind.
+- GET /metrics              server counters and vault stats, json.
+
+The server only listens on loopback addresses and only answers requests whose Host is a loopback address or localhost
+(a page in a browser can't reach it through a DNS name rebound to 127.0.0.1). serve() also generates a bearer token,
+every request has to carry it (Authorization: Bearer <token>), other local users and processes can't use the server
+without it. Objects put over http are in the vault in memory, saving the vault is up to the owner of the AsyncVaultMan.
+
+'''
+
+import re
+import hmac
+import secrets
+import ipaddress
+
+import tornado.web
+import tornado.ioloop
+import tornado.httpserver
+
+from libr3dv1t.central_config import dfcc
+from libr3dv1t.errors import R3D_V1T_Error
+from libr3dv1t.vault.async_vault_man import AsyncVaultMan
+from libr3dv1t.log_utilz.log_man import default_logger as log
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+class ServerMetrics:
+    """ Counters of a running server. """
+
+    def __init__(self):
+
+        self.requests = 0
+        self.range_requests = 0
+        self.uploads = 0
+        self.errors = 0
+        self.bytes_out = 0
+        self.bytes_in = 0
+
+    def as_dict(self) -> dict[str, int]:
+        return dict(vars(self))
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+def parse_range(range_header: str, size: int) -> tuple[int, int] | None:
+    """ [start, end) of a single range Range header for an object of this size. None if the header should be ignored
+    (not a single byte range, the whole object is sent). Raise ValueError if the range is not satisfiable. """
+
+    match = _RANGE_RE.match(range_header.strip())
+    if match is None:
+        return None
+
+    first, last = match.groups()
+    if not first and not last:
+        return None
+
+    if not first:
+        # suffix range, the last n bytes
+        n = int(last)
+        if n == 0 or size == 0:
+            raise ValueError(f"Range {range_header} is empty.")
+        return max(0, size - n), size
+
+    start = int(first)
+    end = size if not last else min(int(last) + 1, size)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise ValueError(f"Range {range_header} starts past the end of the object ({size} bytes).")
+
+    return start, end
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+def _is_loopback_host(host_name: str) -> bool:
+    """ True if host_name (the Host header, no port) is a loopback address or localhost. """
+
+    try:
+        return ipaddress.ip_address(host_name.strip("[]")).is_loopback
+    except ValueError:
+        return host_name.lower() == "localhost"
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+class _VltHandler(tornado.web.RequestHandler):
+    """ Base of the vault server handlers. """
+
+    def initialize(self, avm: AsyncVaultMan, metrics: ServerMetrics, token: str | None):
+
+        self.avm = avm
+        self.metrics = metrics
+        self.token = token
+
+    def prepare(self):
+
+        self.metrics.requests += 1
+
+        if not _is_loopback_host(self.request.host_name):
+            raise tornado.web.HTTPError(403, reason=f"Host not allowed: {self.request.host_name}")
+
+        if self.token is not None:
+            auth = self.request.headers.get("Authorization", "")
+            if not hmac.compare_digest(auth.encode("utf8"), f"Bearer {self.token}".encode("utf8")):
+                raise tornado.web.HTTPError(401, reason="Missing or wrong bearer token.")
+
+    def write_error(self, status_code: int, **kwargs):
+
+        self.metrics.errors += 1
+        if status_code == 401:
+            self.set_header("WWW-Authenticate", "Bearer")
+        self.finish({"error": self._reason, "status": status_code})
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+@tornado.web.stream_request_body
+class ObjHandler(_VltHandler):
+    """ /objs/<virtual path> """
+
+    def prepare(self):
+
+        super().prepare()
+
+        self._obj_writer = None
+        if self.request.method == "PUT":
+            self.request.connection.set_max_body_size(self.settings["max_body_size"])
+            self._obj_writer = self.avm.new_obj_writer()
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    async def data_received(self, chunk: bytes):
+
+        if self._obj_writer is None:
+            raise tornado.web.HTTPError(400, reason="Request body not expected.")
+
+        self.metrics.bytes_in += len(chunk)
+        await self._obj_writer.write(chunk)
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def on_connection_close(self):
+
+        # an upload cut off by the client, nothing goes into the vault and its staged payloads are dropped.
+        # (aborting a writer that already finished does nothing)
+        if self._obj_writer is not None:
+            log.info(f"vlt_server: PUT '{self.request.path}' aborted after {self._obj_writer.pt_len:_} bytes")
+            tornado.ioloop.IOLoop.current().spawn_callback(self._obj_writer.abort)
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    async def put(self, pname: str):
+
+        oid = await self._obj_writer.finish(pname)
+        self.metrics.uploads += 1
+        log.info(f"vlt_server: PUT '{pname}' -- {self._obj_writer.pt_len:_} bytes -- oid='{oid}'")
+
+        self.set_status(201)
+        self.finish({"oid": oid, "size": self._obj_writer.pt_len})
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    async def get(self, pname: str):
+        await self._serve(pname, include_body=True)
+
+    async def head(self, pname: str):
+        await self._serve(pname, include_body=False)
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    async def _serve(self, pname: str, include_body: bool):
+
+        try:
+            oid = self.avm.get_oid(pname)
+        except R3D_V1T_Error:
+            raise tornado.web.HTTPError(404, reason=f"No such object: {pname}")
+
+        size = await self.avm.obj_size(oid)
+        start, end = 0, size
+
+        self.set_header("Accept-Ranges", "bytes")
+        self.set_header("Content-Type", "application/octet-stream")
+
+        range_header = self.request.headers.get("Range")
+        if range_header:
+            try:
+                byte_range = parse_range(range_header, size)
+            except ValueError as e:
+                # not an HTTPError, send_error would drop the Content-Range header
+                self.metrics.errors += 1
+                self.set_status(416)
+                self.set_header("Content-Range", f"bytes */{size}")
+                self.finish({"error": str(e), "status": 416})
+                return
+
+            if byte_range is not None:
+                start, end = byte_range
+                self.metrics.range_requests += 1
+                self.set_status(206)
+                self.set_header("Content-Range", f"bytes {start}-{end - 1}/{size}")
+
+        self.set_header("Content-Length", end - start)
+        if not include_body or end == start:
+            return
+
+        async for data in self.avm.iter_obj(oid, offset=start, size=end - start):
+            self.write(data)
+            self.metrics.bytes_out += len(data)
+            await self.flush()
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+class MetricsHandler(_VltHandler):
+    """ /metrics """
+
+    async def get(self):
+
+        vman = self.avm.vman
+        self.finish({
+            "server": self.metrics.as_dict(),
+            "objects": len(vman.mem_os),
+            "cache": vman.cache_stats(),
+            "dedup": await self.avm.dedup_stats(),
+        })
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+def make_app(avm: AsyncVaultMan, metrics: ServerMetrics | None = None, max_body_size: int | None = None,
+             token: str | None = None) -> tornado.web.Application:
+    """ Tornado application serving avm. max_body_size is the largest upload accepted, dfcc().server_max_body_size
+    if None. Requests have to carry token as a bearer token, unless it is None. """
+
+    handler_args = {"avm": avm, "metrics": metrics if metrics is not None else ServerMetrics(), "token": token}
+
+    return tornado.web.Application(
+        [
+            (r"/objs/(.+)", ObjHandler, handler_args),
+            (r"/metrics", MetricsHandler, handler_args),
+        ],
+        max_body_size=max_body_size if max_body_size is not None else dfcc().server_max_body_size,
+    )
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+def serve(avm: AsyncVaultMan, port: int | None = None,
+          address: str = "127.0.0.1") -> tuple[tornado.httpserver.HTTPServer, str]:
+    """ Start serving avm on address:port (dfcc().server_port if None), on the running event loop. address has to be
+    a loopback address. Return the HTTPServer (stop() it to stop serving) and the bearer token clients have to send,
+    a new one for every server. """
+
+    if not ipaddress.ip_address(address).is_loopback:
+        raise R3D_V1T_Error(f"vlt_server: refusing to listen on {address}, only loopback addresses are allowed.")
+
+    port = port if port is not None else dfcc().server_port
+    token = secrets.token_urlsafe(32)
+    app = make_app(avm, token=token)
+
+    server = tornado.httpserver.HTTPServer(app, max_body_size=app.settings["max_body_size"])
+    server.listen(port, address=address)
+    log.info(f"vlt_server: serving on http://{address}:{port}")
+
+    return server, token
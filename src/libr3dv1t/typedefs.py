@@ -5,6 +5,8 @@ structs, typedefs, dataclasses, enums .... used in the libr3dv1t library.
 Try to avoid logic in this file as much as possible. Most of the classes here are to be treated
 as data containers/data classes, not grouping of data and logic.
 
+The classes use __slots__, vaults hold millions of segments and a __dict__ per instance adds up.
+
 '''
 
 from enum import Enum
@@ -15,11 +17,46 @@ from enum import Enum
 class MemObj:
     """ Data class ish tracking a r3dv1t object in memory. """
 
+    __slots__ = ('obj_id', 'pt_data', '_ct_segments', 'seg_table', 'seg_rows', 'z_codec', 'pt_len', 'z_len')
+
     def __init__(self):
 
         self.obj_id: str = ''
-        self.pt_data: bytes = b''
-        self.ct_segments: list[CTSegment] = []
+
+        # None until the object is decrypted (or put into the vault), lazily loaded vaults leave this as None.
+        # set back to None when evicted from the decrypted data cache (VaultMan.pt_cache).
+        self.pt_data: bytes | None = None
+        self._ct_segments: list[CTSegment] = []
+
+        # lazily loaded objects keep their segments as rows of a vault.seg_table.SegTable instead of CTSegments.
+        # they become ct_segments the first time those are asked for. (walks over all objects use the rows as they are,
+        # see VaultMan._obj_segs.)
+        self.seg_table = None
+        self.seg_rows: range | None = None
+
+        # compression stats: plaintext bytes and bytes after the compression stage (before encryption).
+        # z_codec is '' if the object is stored uncompressed. filled in when the object is encrypted or decrypted.
+        # only segments the object stores itself count, segment references (dedup) are counted where they point to.
+        self.z_codec: str = ''
+        self.pt_len: int = 0
+        self.z_len: int = 0
+
+    @property
+    def ct_segments(self) -> 'list[CTSegment]':
+
+        if self.seg_table is not None:
+            self._ct_segments = self.seg_table.segs(self.seg_rows)
+            self.seg_table = None
+            self.seg_rows = None
+
+        return self._ct_segments
+
+    @ct_segments.setter
+    def ct_segments(self, ct_segments: 'list[CTSegment]'):
+
+        self._ct_segments = ct_segments
+        self.seg_table = None
+        self.seg_rows = None
 
 
 # ------------------------------------------------------------------------------------------------------------------------------
@@ -27,6 +64,9 @@ class MemObj:
 class CTSegment:
     """ Data class ish tracking a segment of a file stored in the vault. """
 
+    __slots__ = ('idx', 'parent_obj_id', 'km', 'km_data', 'sid', 'is_ref', 'ct_chunk_b64', 'ct_chunk', 'fl_offset',
+                 'fl_length', 'fl_alts', 'stg_offset', 'stg_length')
+
     def __init__(self, idx: int = 0, ct_chunk_b64: bytes = b""):
 
         # 'i' key in meta_dict - offset of this segment in the original file
@@ -41,9 +81,36 @@ class CTSegment:
         # 'km_1' or 'km_2' ... key in meta_dict - value for this key will be this dict. which contains data specific to this km
         self.km_data: dict = {}
 
+        # 's' key in meta_dict - segment id, keyed fingerprint of the plaintext chunk (dedup, see VaultMan.seg_store).
+        # '' for segments written without dedup.
+        self.sid: str = ''
+
+        # 'r' key in meta_dict (instead of 's' and km) - this segment is a reference to the segment with the same sid,
+        # possibly of another object. references carry no payload and no km.
+        self.is_ref: bool = False
+
         # not in meta_dict, ct_chunk is in the frame payload.
         self.ct_chunk_b64: bytes = ct_chunk_b64  # b64 of ciphertext of the segment
 
+        # not in meta_dict - raw ciphertext of the segment. segments hold either ct_chunk_b64 (read from psv frames) or
+        # ct_chunk (new segments, read from bin frames), whichever is cheaper to get, the other one is derived on demand.
+        self.ct_chunk: bytes = b''
+
+        # not in meta_dict - location of the frame line carrying this segment in the vault file.
+        # fl_offset is -1 if the segment is not backed by a vault file. lazily loaded segments have an empty ct_chunk_b64
+        # and their payload is read back from the vault file (and verified) only when its needed.
+        self.fl_offset: int = -1
+        self.fl_length: int = 0
+
+        # (fl_offset, fl_length) of replicas of this frame, fallbacks in case the primary copy fails verification.
+        # None if there are no known replicas (only lazily loaded segments track them).
+        self.fl_alts: list[tuple[int, int]] | None = None
+
+        # not in meta_dict - location of the payload in the VaultMan staging file (streamed objects that are not saved yet).
+        # stg_offset is -1 if the payload is not staged. staged segments also have an empty ct_chunk_b64.
+        self.stg_offset: int = -1
+        self.stg_length: int = 0
+
     def __str__(self):
         " str rep for debugging purposes. "
 
@@ -52,7 +119,41 @@ class CTSegment:
                f"parent_obj_id='{self.parent_obj_id}', \n" \
                f"km='{self.km.value}', \n" \
                f"km_data={self.km_data}, \n" \
-               f"ct_chunk_b64='{self.ct_chunk_b64.hex()[:5]}...'\n"
+               f"sid='{self.sid[:8]}...', is_ref={self.is_ref}, \n" \
+               f"ct_chunk_b64='{self.ct_chunk_b64.hex()[:5]}...', \n" \
+               f"ct_chunk='{self.ct_chunk.hex()[:5]}...', \n" \
+               f"fl_offset={self.fl_offset}, fl_length={self.fl_length}\n"
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+class VVFSFrame:
+    """ Data class ish tracking a vvfs frame, the virtual file names of the vault (see VaultVirtualFS) persisted in the
+    vault file. a journal frame carries a batch of link/unlink operations, a checkpoint frame the whole name table. """
+
+    __slots__ = ('is_checkpoint', 'seq', 'km', 'km_data', 'ct_chunk_b64', 'ct_chunk', 'fl_offset', 'fl_length', 'fl_alts')
+
+    def __init__(self):
+
+        # 'v' key in meta_dict - 'c' for checkpoint frames, 'j' for journal frames
+        self.is_checkpoint: bool = False
+
+        # 'q' key in meta_dict - sequence number, every vvfs frame written to a vault file gets the next one.
+        # journal frames apply on top of the checkpoint (or journal) with the sequence number before theirs.
+        self.seq: int = 0
+
+        # krypt mode and its km_data, same as for segments
+        self.km: RVKryptMode = RVKryptMode.PT
+        self.km_data: dict = {}
+
+        # payload, same as for segments. frames found by lazy loads or in the index have neither until verified.
+        self.ct_chunk_b64: bytes = b''
+        self.ct_chunk: bytes = b''
+
+        # location of the frame in the vault file (and its replicas), see CTSegment
+        self.fl_offset: int = -1
+        self.fl_length: int = 0
+        self.fl_alts: list[tuple[int, int]] | None = None
 
 
 # ------------------------------------------------------------------------------------------------------------------------------
@@ -66,11 +167,22 @@ class RVKryptMode(Enum):
     # TODO: look into github.com/tink-crypto/tink-py
 
 
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+class RVFrameFmt(Enum):
+    """ Enum for the frame formats of a vault file. One vault file uses one format. """
+
+    PSV = "psv"  # text frame lines, meta_dict_b64|ct_chunk_b64. git friendly.
+    BIN = "bin"  # binary frames, struct header + raw ciphertext. smaller and faster.
+
+
 # ------------------------------------------------------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------------------------------------------------------
 class VaultKeys:
     """ Data class ish tracking the different crypto keys used by the vault. """
 
+    __slots__ = ('osfp_key', 'frame_hmac_key', 'sgk_chacha20', 'sgk_fernet', 'ssfp_key')
+
     def __init__(self):
 
         # object store fingerprinting key
@@ -85,6 +197,9 @@ class VaultKeys:
         # segment key for fernet encryption
         self.sgk_fernet = b''
 
+        # segment store fingerprinting key (segment ids for dedup)
+        self.ssfp_key = b''
+
     def __str__(self):
         " str rep for debugging purposes. "
 
@@ -93,6 +208,7 @@ class VaultKeys:
             f"osfp_key       = '{self.osfp_key.hex()[:4]}...', \n" \
             f"frame_hmac_key = '{self.frame_hmac_key.hex()[:4]}...'\n" \
             f"sgk_chacha20   = '{self.sgk_chacha20.hex()[:4]}...', \n" \
-            f"sgk_fernet     = '{self.sgk_fernet.hex()[:4]}...'\n"
+            f"sgk_fernet     = '{self.sgk_fernet.hex()[:4]}...'\n" \
+            f"ssfp_key       = '{self.ssfp_key.hex()[:4]}...'\n"
 
         return result
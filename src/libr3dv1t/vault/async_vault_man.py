@@ -0,0 +1,239 @@
+''' async_vault_man.py
+
+asyncio facade over VaultMan, for embedding a vault in asyncio services.
+
+Everything CPU heavy or blocking (the KDF, loading, encrypting, decrypting, saving, extracting) runs on an executor,
+the event loop only awaits it. Streams are fed in and read out in chunks, one executor step per chunk, so a large
+object never blocks the loop (or holds a thread) for longer than one chunk.
+
+Concurrency:
+- reads (get_obj_data, read, iter_obj) run concurrently, also with each other on different objects.
+- operations that change the vault or walk all of it (load, put, save, xtract, close) are serialized with an
+  asyncio.Lock. streamed puts only take the lock to finish, their chunks are encrypted and staged without it.
+
+'''
+
+import asyncio
+import functools
+from concurrent.futures import Executor
+from typing import AsyncIterable, AsyncIterator, BinaryIO, Iterable
+
+from libr3dv1t.central_config import dfcc
+from libr3dv1t.errors import R3D_V1T_Error
+from libr3dv1t.typedefs import RVFrameFmt
+from libr3dv1t.vault.vault_man import VaultMan
+from libr3dv1t.vault.vvfs import VirtualFile
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+class AsyncVaultMan:
+    """ Async VaultMan. Use AsyncVaultMan.create() to derive the keys and load the vault off the event loop, or wrap
+    an existing VaultMan. executor None uses the default executor of the loop. """
+
+    def __init__(self, vman: VaultMan, executor: Executor | None = None):
+
+        self.vman = vman
+        self._executor = executor
+        self._lock = asyncio.Lock()
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    @classmethod
+    async def create(cls,
+                     vlt_password: bytes,
+                     vlt_file_pathname_to_load: str = '',
+                     lazy_load: bool = False,
+                     frame_fmt: RVFrameFmt | None = None,
+                     executor: Executor | None = None) -> 'AsyncVaultMan':
+        """ Async VaultMan(...). The KDF (seconds of scrypt and pbkdf2, or a key agent call) and the load run on the
+        executor, overlapped (see VaultMan.load_vlt). """
+
+        loop = asyncio.get_running_loop()
+        vman = await loop.run_in_executor(executor, functools.partial(VaultMan, vlt_password, vlt_file_pathname_to_load,
+                                                                      lazy_load, frame_fmt))
+
+        # a VaultMan without a vault file to load returns before the KDF is done, nothing on the loop may wait for it
+        await loop.run_in_executor(executor, getattr, vman, 'vks')
+
+        return cls(vman, executor=executor)
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    async def _run(self, fn, *args, **kwargs):
+        """ Run fn(*args, **kwargs) on the executor. """
+
+        return await asyncio.get_running_loop().run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    # --------------------------------------------------------------------------------------------------------------------------
+    # ------------------------------------------------------------------------------------------------------------------- read
+    async def load_vlt(self, vlt_file_pathname: str, lazy: bool = False, workers: int | None = None):
+        """ Async VaultMan.load_vlt. """
+
+        async with self._lock:
+            await self._run(self.vman.load_vlt, vlt_file_pathname, lazy=lazy, workers=workers)
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def get_oid(self, virt_name: str) -> str:
+        """ obj_id of a virtual file (an in memory lookup, no need to await). """
+
+        return self.vman.vv_fs.get_oid(VirtualFile(pname=virt_name))
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    async def get_obj_data(self, obj_id: str) -> bytes:
+        """ Async VaultMan.get_obj_data. The whole object is decrypted in one executor step, see iter_obj for large ones. """
+
+        return await self._run(self.vman.get_obj_data, obj_id)
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    async def obj_size(self, obj_id: str) -> int:
+        """ Plaintext size of an object (see ObjReader.size, takes decrypting the last segment of lazy objects). """
+
+        def _size() -> int:
+            with self.vman.open_obj(obj_id) as reader:
+                return reader.size
+
+        return await self._run(_size)
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    async def read(self, obj_id: str, offset: int = 0, size: int = -1) -> bytes:
+        """ Read size bytes (all if size < 0) of an object starting at offset. Only the segments covering the range are
+        decrypted (see VaultMan.open_obj). """
+
+        def _read_range() -> bytes:
+            with self.vman.open_obj(obj_id) as reader:
+                reader.seek(offset)
+                return reader.read(size)
+
+        return await self._run(_read_range)
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    async def iter_obj(self, obj_id: str, offset: int = 0, size: int = -1,
+                       chunk_size: int | None = None) -> AsyncIterator[bytes]:
+        """ Yield size bytes (all if size < 0) of an object starting at offset, in chunks. One executor step per chunk.
+        chunk_size defaults to one krypt batch of segments. """
+
+        if chunk_size is None:
+            chunk_size = dfcc().default_chunk_size * dfcc().krypt_batch_size
+
+        reader = self.vman.open_obj(obj_id)
+        try:
+            await self._run(reader.seek, offset)
+            remaining = size
+            while remaining != 0:
+                n = chunk_size if remaining < 0 else min(chunk_size, remaining)
+                data = await self._run(reader.read, n)
+                if not data:
+                    break
+                if remaining > 0:
+                    remaining -= len(data)
+                yield data
+        finally:
+            reader.close()
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    # --------------------------------------------------------------------------------------------------------------------------
+    # ------------------------------------------------------------------------------------------------------------------ write
+    async def put_object(self, pt_data: bytes, virt_name: str) -> str:
+        """ Async VaultMan.put_object, return the obj_id. """
+
+        async with self._lock:
+            await self._run(self.vman.put_object, pt_data=pt_data, virt_name=virt_name)
+            return self.get_oid(virt_name)
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def new_obj_writer(self) -> 'AsyncObjWriter':
+        """ Start writing an object into the vault in pieces, as they arrive (e.g. an upload). see AsyncObjWriter. """
+
+        return AsyncObjWriter(self)
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    async def put_stream(self, src: AsyncIterable[bytes] | BinaryIO | Iterable[bytes], virt_name: str) -> str:
+        """ Async VaultMan.put_stream, src can also be an async iterable of bytes. Return the obj_id. """
+
+        obj_writer = self.new_obj_writer()
+
+        if hasattr(src, "__aiter__"):
+            async for data in src:
+                await obj_writer.write(data)
+        elif hasattr(src, "read"):
+            read_size = dfcc().default_chunk_size * dfcc().krypt_batch_size
+            while data := await self._run(src.read, read_size):
+                await obj_writer.write(data)
+        else:
+            for data in src:
+                await obj_writer.write(data)
+
+        return await obj_writer.finish(virt_name)
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    async def dedup_stats(self) -> dict[str, int | float]:
+        """ Async VaultMan.dedup_stats, it walks all objects. """
+
+        return await self._run(self.vman.dedup_stats)
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    async def save_vault(self, output_pathname: str, append: bool = False):
+        """ Async VaultMan.save_vault. """
+
+        async with self._lock:
+            await self._run(self.vman.save_vault, output_pathname, append=append)
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    async def xtract_vlt_to_path(self, xtraction_path: str, workers: int | None = None,
+                                 virt_dir: str | None = None) -> dict[str, int]:
+        """ Async VaultMan.xtract_vlt_to_path. """
+
+        async with self._lock:
+            return await self._run(self.vman.xtract_vlt_to_path, xtraction_path, workers=workers, virt_dir=virt_dir)
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    async def close(self):
+        """ Async VaultMan.close. """
+
+        async with self._lock:
+            await self._run(self.vman.close)
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+class AsyncObjWriter:
+    """ Async ObjWriter. Pieces are encrypted and staged on the executor without the AsyncVaultMan lock, finish takes
+    it to add the object to the vault. Use AsyncVaultMan.new_obj_writer() to get one. """
+
+    def __init__(self, avm: AsyncVaultMan):
+
+        self._avm = avm
+        self._obj_writer = avm.vman.new_obj_writer()
+
+        # one executor step at a time, abort must not run while a write is still encrypting
+        self._busy = asyncio.Lock()
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    @property
+    def pt_len(self) -> int:
+        """ Number of plaintext bytes written so far. """
+        return self._obj_writer.pt_len
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    async def write(self, data: bytes):
+        """ Add the next piece of plaintext to the object. """
+
+        if not isinstance(data, (bytes, bytearray, memoryview)):
+            raise R3D_V1T_Error("AsyncObjWriter.write: data must be bytes.")
+
+        async with self._busy:
+            await self._avm._run(self._obj_writer.write, data)
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    async def finish(self, virt_name: str) -> str:
+        """ Add the object to the vault as virt_name, return the obj_id. """
+
+        async with self._busy, self._avm._lock:
+            return await self._avm._run(self._obj_writer.finish, virt_name)
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    async def abort(self):
+        """ Async ObjWriter.abort, after the write in progress (if any). """
+
+        async with self._busy:
+            await self._avm._run(self._obj_writer.abort)
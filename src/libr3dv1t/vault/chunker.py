@@ -0,0 +1,141 @@
+''' chunker.py
+
+Segmenters, they decide where an object is cut into chunks (segments).
+
+- FixedChunker: cuts every chunk_size bytes. one inserted byte shifts every later chunk.
+- CDCChunker: content defined chunking, FastCDC style gear rolling hash with normalized chunking. cut points depend on
+  the content around them, so an insert/delete only changes the chunks near it and the rest of the object still
+  produces the same chunks (same segments, small git diffs of psv vaults, segment level reuse).
+
+Both work incrementally: split() is given whatever data is available and only returns cuts it is sure about, unless
+final is set. CTSegment.idx records byte offsets, so chunks of varying size need nothing special downstream.
+
+NOTE: the gear hash loop is pure python, expect a few MB/s per core for CDC.
+
+'''
+
+import hashlib
+
+from libr3dv1t.central_config import dfcc
+from libr3dv1t.errors import R3D_V1T_Error
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+_MASK64 = (1 << 64) - 1
+
+# gear table, 256 pseudo random 64 bit values. must never change, cut points (and so segments) depend on it.
+_GEAR = [int.from_bytes(hashlib.sha3_256(b"r3dv1t_gear_" + bytes([i])).digest()[:8], "big") for i in range(256)]
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+class FixedChunker:
+    """ Cut every chunk_size bytes. """
+
+    def __init__(self, chunk_size: int):
+
+        if chunk_size < 1:
+            raise R3D_V1T_Error(f"FixedChunker: chunk_size must be positive, got {chunk_size}.")
+
+        self.chunk_size = chunk_size
+
+        # largest chunk this chunker produces
+        self.max_size = chunk_size
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def split(self, buf: bytes | bytearray, final: bool) -> list[int]:
+        """ Return the lengths of the chunks at the start of buf. if not final, a trailing partial chunk is left out. """
+
+        n_full, rest = divmod(len(buf), self.chunk_size)
+        lengths = [self.chunk_size] * n_full
+        if final and rest:
+            lengths.append(rest)
+
+        return lengths
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+class CDCChunker:
+    """ Content defined chunking with a gear rolling hash (FastCDC style, normalized chunking). """
+
+    def __init__(self, min_size: int, avg_size: int, max_size: int):
+
+        if not 0 < min_size <= avg_size <= max_size:
+            raise R3D_V1T_Error(f"CDCChunker: need 0 < min <= avg <= max, got {min_size}, {avg_size}, {max_size}.")
+
+        self.min_size = min_size
+        self.avg_size = avg_size
+        self.max_size = max_size
+
+        # normalized chunking: a harder mask (more bits) before avg_size and an easier one after it, pulls chunk sizes
+        # towards avg_size. masks use the top bits of the hash, those depend on the last 64 bytes seen.
+        avg_bits = max(1, avg_size.bit_length() - 1)
+        self._mask_s = ((1 << (avg_bits + 1)) - 1) << (64 - avg_bits - 1)
+        self._mask_l = ((1 << (avg_bits - 1)) - 1) << (64 - avg_bits + 1)
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def _cut(self, buf: bytes | bytearray, start: int, end: int) -> int:
+        """ Length of the chunk starting at buf[start], looking at no more than buf[start:end]. """
+
+        avail = end - start
+        if avail <= self.min_size:
+            return avail
+
+        limit = min(avail, self.max_size)
+        normal = min(limit, self.avg_size)
+
+        gear = _GEAR
+        mask_s = self._mask_s
+        mask_l = self._mask_l
+
+        h = 0
+        i = start + self.min_size
+        stop = start + normal
+        while i < stop:
+            h = ((h << 1) + gear[buf[i]]) & _MASK64
+            i += 1
+            if not h & mask_s:
+                return i - start
+
+        stop = start + limit
+        while i < stop:
+            h = ((h << 1) + gear[buf[i]]) & _MASK64
+            i += 1
+            if not h & mask_l:
+                return i - start
+
+        return limit
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def split(self, buf: bytes | bytearray, final: bool) -> list[int]:
+        """ Return the lengths of the chunks at the start of buf. if not final, the trailing data that might still
+        end up in a different chunk once more data arrives is left out. """
+
+        lengths = []
+        pos = 0
+        n = len(buf)
+        while pos < n:
+            cut = self._cut(buf, pos, n)
+            if cut == n - pos and cut < self.max_size and not final:
+                # ran out of data before finding a cut point, more data could move it
+                break
+
+            lengths.append(cut)
+            pos += cut
+
+        return lengths
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+def make_chunker() -> FixedChunker | CDCChunker:
+    """ Make the chunker configured in dfcc(). """
+
+    cc = dfcc()
+    if cc.chunker == 'fixed':
+        return FixedChunker(cc.default_chunk_size)
+    if cc.chunker == 'cdc':
+        return CDCChunker(cc.cdc_min_size, cc.cdc_avg_size, cc.cdc_max_size)
+
+    raise R3D_V1T_Error(f"Unknown chunker: '{cc.chunker}', supported: 'fixed', 'cdc'")
@@ -0,0 +1,98 @@
+''' compression.py
+
+Optional per segment compression stage, applied to plaintext chunks before they are encrypted.
+
+- Only stdlib codecs (zlib, lzma, bz2).
+- A compressed segment records the codec in its km_data: km_data['z'] = codec name. Segments without 'z' are stored as is.
+- Each object is sampled first, objects that do not compress (jpegs, archives, already encrypted data ...) skip the
+  compression stage entirely. Chunks that happen not to shrink are stored as is too.
+
+'''
+
+import bz2
+import lzma
+import zlib
+
+from libr3dv1t.errors import R3D_V1T_Error
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+# km_data key recording the codec of a compressed segment
+KM_DATA_KEY = 'z'
+
+_CODECS = {
+    'zlib': (lambda data: zlib.compress(data, 6), zlib.decompress),
+    'lzma': (lzma.compress, lzma.decompress),
+    'bz2': (lambda data: bz2.compress(data, 9), bz2.decompress),
+}
+
+# objects whose sample does not get below this ratio (compressed / original) are stored uncompressed.
+_MAX_SAMPLE_RATIO = 0.9
+
+# number of chunks sampled per object, spread over the object.
+_SAMPLE_CHUNKS = 4
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+def check_codec(codec: str):
+    """ Raise R3D_V1T_Error if codec is not a supported codec name. """
+
+    if codec not in _CODECS:
+        raise R3D_V1T_Error(f"Unknown compression codec: '{codec}', supported: {sorted(_CODECS)}")
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+def worth_compressing(codec: str, pt_chunks: list[bytes]) -> bool:
+    """ Sample a few of an objects chunks and decide if compressing the object is worth it. """
+
+    check_codec(codec)
+    if not pt_chunks:
+        return False
+
+    step = max(1, len(pt_chunks) // _SAMPLE_CHUNKS)
+    sample = pt_chunks[::step][:_SAMPLE_CHUNKS]
+
+    compress_fn, _ = _CODECS[codec]
+    sample_in = sum(len(chunk) for chunk in sample)
+    sample_out = sum(len(compress_fn(chunk)) for chunk in sample)
+
+    return sample_in > 0 and sample_out < sample_in * _MAX_SAMPLE_RATIO
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+def compress_chunks(codec: str, pt_chunks: list[bytes]) -> list[tuple[bytes, bool]]:
+    """ Compress chunks, return (data, compressed) per chunk. Chunks that do not shrink are returned as is. """
+
+    check_codec(codec)
+    compress_fn, _ = _CODECS[codec]
+
+    result = []
+    for pt_chunk in pt_chunks:
+        z_chunk = compress_fn(pt_chunk)
+        if len(z_chunk) < len(pt_chunk):
+            result.append((z_chunk, True))
+        else:
+            result.append((pt_chunk, False))
+
+    return result
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+def decompress_chunk(km_data: dict, chunk: bytes) -> bytes:
+    """ Undo the compression stage of a segment, according to its km_data. """
+
+    codec = km_data.get(KM_DATA_KEY)
+    if codec is None:
+        return chunk
+
+    check_codec(codec)
+    _, decompress_fn = _CODECS[codec]
+
+    try:
+        return decompress_fn(chunk)
+    except Exception as e:
+        raise R3D_V1T_Error(f"Segment does not decompress with codec '{codec}': {e!r}")
@@ -0,0 +1,655 @@
+''' frames.py
+
+Frame encoding/decoding for r3dv1t vault files (see docs/r3dv1t_file_format.txt).
+
+Two frame formats exist, a vault file uses one of them (auto detected when loading):
+- psv: text frame lines, '[meta_dict_b64]|[ct_chunk_b64]'. git friendly, the original format.
+- bin: fixed struct header + km_data + raw ciphertext + raw hmac. about 25% smaller and much cheaper to encode/decode.
+
+Everything here is module level and only depends on its arguments (keys are passed in), so it can run in worker
+processes as well as in the VaultMan that owns the keys.
+
+'''
+
+import os
+import json
+import mmap
+import struct
+import hashlib
+import hmac
+from typing import Iterator
+
+import base64 as b64
+
+from libr3dv1t.errors import R3D_V1T_Error
+from libr3dv1t.typedefs import CTSegment, VVFSFrame, RVKryptMode, RVFrameFmt
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+# bin frame: header | sid (if flagged) | km_data (json, may be empty) | payload (raw ct_chunk) | hmac_sha3_256 (raw)
+# header: magic, frame version, frame kind, km number, flags, idx, km_data_len, payload_len, oid (raw sha3_384)
+_BIN_MAGIC = b'\xb1r3F'
+_BIN_VERSION = 1
+_BIN_KIND_SEGMENT = 0
+_BIN_KIND_REF = 1
+_BIN_KIND_VVFS_JOURNAL = 2
+_BIN_KIND_VVFS_CHECKPOINT = 3
+_BIN_FLAG_SID = 0x01
+_BIN_HDR = struct.Struct('>4sBBBBQII48s')
+_BIN_SID_SIZE = 32
+_BIN_HMAC_SIZE = 32
+
+# vvfs frames belong to no object, their oid field is all zeros and idx is the sequence number
+_BIN_NO_OID = bytes(48)
+
+_KM_NUMBERS = {
+    RVKryptMode.PT: 0,
+    RVKryptMode.CHACHA20_POLY1305: 1,
+    RVKryptMode.FERNET: 2,
+}
+_KM_BY_NUMBER = {km_number: km for km, km_number in _KM_NUMBERS.items()}
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+def detect_frame_fmt(buf: bytes | mmap.mmap) -> RVFrameFmt:
+    """ Detect the frame format of a vault file from its first bytes. """
+
+    if buf[:len(_BIN_MAGIC)] == _BIN_MAGIC:
+        return RVFrameFmt.BIN
+
+    return RVFrameFmt.PSV
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+def decode_meta_dict(meta_dict_b64: bytes) -> dict:
+    """ Decode the meta dict part of a frame line. The result is not authenticated yet. """
+
+    try:
+        meta_dict = json.loads(b64.urlsafe_b64decode(meta_dict_b64).decode("utf-8"))
+    except Exception as e:
+        raise R3D_V1T_Error(f"Invalid frame: meta_dict does not decode @ Line starting with: {meta_dict_b64[:16]}") from e
+
+    if not isinstance(meta_dict, dict):
+        raise R3D_V1T_Error(f"Invalid frame: meta_dict is not a dict @ Line starting with: {meta_dict_b64[:16]}")
+
+    return meta_dict
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+def make_ct_seg(meta_dict: dict, line_prefix: bytes) -> CTSegment:
+    """ Create a CTSegment (without its payload) from a decoded meta dict. """
+
+    ct_seg = CTSegment()
+    ct_seg.idx = meta_dict['i']
+    ct_seg.parent_obj_id = meta_dict['o']
+
+    # --- segment reference (dedup), no km and no payload
+    if 'r' in meta_dict:
+        if not isinstance(meta_dict['r'], str) or not meta_dict['r']:
+            raise R3D_V1T_Error(f"Invalid frame: bad segment reference @ Line starting with: {line_prefix}")
+        ct_seg.sid = meta_dict['r']
+        ct_seg.is_ref = True
+        return ct_seg
+
+    ct_seg.sid = meta_dict.get('s', '')
+    if not isinstance(ct_seg.sid, str):
+        raise R3D_V1T_Error(f"Invalid frame: bad segment id @ Line starting with: {line_prefix}")
+
+    if RVKryptMode.CHACHA20_POLY1305.value in meta_dict:
+        ct_seg.km = RVKryptMode.CHACHA20_POLY1305
+        ct_seg.km_data = meta_dict[RVKryptMode.CHACHA20_POLY1305.value]
+    elif RVKryptMode.FERNET.value in meta_dict:
+        ct_seg.km = RVKryptMode.FERNET
+        ct_seg.km_data = meta_dict[RVKryptMode.FERNET.value]
+    else:
+        raise R3D_V1T_Error(f"Invalid frame: unknown krypt mode @ Line starting with: {line_prefix}")
+
+    return ct_seg
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+def make_vvfs_frame_meta(meta_dict: dict, line_prefix: bytes) -> VVFSFrame:
+    """ Create a VVFSFrame (without its payload) from a decoded meta dict. """
+
+    vvfs_frame = VVFSFrame()
+    if meta_dict['v'] not in ('c', 'j') or not isinstance(meta_dict.get('q'), int):
+        raise R3D_V1T_Error(f"Invalid frame: bad vvfs frame meta data @ Line starting with: {line_prefix}")
+
+    vvfs_frame.is_checkpoint = meta_dict['v'] == 'c'
+    vvfs_frame.seq = meta_dict['q']
+
+    if RVKryptMode.CHACHA20_POLY1305.value not in meta_dict:
+        raise R3D_V1T_Error(f"Invalid frame: unknown krypt mode in vvfs frame @ Line starting with: {line_prefix}")
+
+    vvfs_frame.km = RVKryptMode.CHACHA20_POLY1305
+    vvfs_frame.km_data = meta_dict[RVKryptMode.CHACHA20_POLY1305.value]
+
+    return vvfs_frame
+
+
+def make_frame_meta(meta_dict: dict, line_prefix: bytes) -> CTSegment | VVFSFrame:
+    """ CTSegment or VVFSFrame (without its payload), whichever the decoded meta dict describes. """
+
+    if 'v' in meta_dict:
+        return make_vvfs_frame_meta(meta_dict, line_prefix=line_prefix)
+
+    return make_ct_seg(meta_dict, line_prefix=line_prefix)
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+def parse_frame_line(line: bytes, frame_hmac_key: bytes) -> CTSegment | VVFSFrame:
+    """ Parse and verify a single frame line from the vault file. Raise R3D_V1T_Error if the frame is invalid. """
+
+    return _verify_frame_line(_pre_parse_frame_line(line), frame_hmac_key=frame_hmac_key)
+
+
+def _pre_parse_frame_line(line: bytes) -> tuple:
+    """ The part of parse_frame_line that needs no key: split the line, decode its meta dict and build the message
+    its hmac covers. """
+
+    fields = line.strip().split(b'|')
+    if len(fields) != 2:
+        raise R3D_V1T_Error(f"Invalid frame line @ line starting with: {line[:16]}")
+
+    meta_dict_b64 = fields[0]
+    ct_chunk_b64 = fields[1]
+
+    # --- decode meta dict
+    meta_dict = decode_meta_dict(meta_dict_b64)
+
+    if 'h' not in meta_dict:
+        raise R3D_V1T_Error(f"Invalid frame: no hmac in meta_dict @ Line starting with: {line[:16]}")
+
+    frame_hmac = meta_dict['h']
+    meta_dict.pop('h', None)  # remove hmac from meta_dict for hmac calculation
+
+    frame_hmac_msg = json.dumps(meta_dict).encode("ascii") + ct_chunk_b64
+
+    return line[:16], meta_dict, ct_chunk_b64, frame_hmac_msg, frame_hmac
+
+
+def _verify_frame_line(pre_parsed: tuple, frame_hmac_key: bytes) -> CTSegment | VVFSFrame:
+    """ The rest of parse_frame_line, check the frame hmac of a pre parsed line. """
+
+    line_prefix, meta_dict, ct_chunk_b64, frame_hmac_msg, frame_hmac = pre_parsed
+
+    # --- check frame hmac
+    recomputed_hmac = hmac.new(key=frame_hmac_key, msg=frame_hmac_msg, digestmod=hashlib.sha3_256).hexdigest()
+    if frame_hmac != recomputed_hmac:
+        raise R3D_V1T_Error(f"Invalid frame: hmac mismatch @ Line starting with: {line_prefix}")
+
+    # --- create segment (or vvfs frame) object
+    ct_seg = make_frame_meta(meta_dict, line_prefix=line_prefix)
+    ct_seg.ct_chunk_b64 = ct_chunk_b64
+
+    return ct_seg
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+def make_frame_line(ct_seg: CTSegment, ct_chunk_b64: bytes, frame_hmac_key: bytes) -> bytes:
+    """ Make a frame line from a CTSegment and its payload. """
+
+    meta_dict = {
+        "i": ct_seg.idx,  # starting offset of the chunk in the original file
+        "o": ct_seg.parent_obj_id,
+    }
+
+    if ct_seg.is_ref:
+        meta_dict["r"] = ct_seg.sid
+    else:
+        meta_dict[ct_seg.km.value] = ct_seg.km_data
+        if ct_seg.sid:
+            meta_dict["s"] = ct_seg.sid
+
+    return _seal_frame_line(meta_dict, ct_chunk_b64, frame_hmac_key=frame_hmac_key)
+
+
+def make_vvfs_frame_line(vvfs_frame: VVFSFrame, ct_chunk_b64: bytes, frame_hmac_key: bytes) -> bytes:
+    """ Make a frame line from a VVFSFrame and its payload. """
+
+    meta_dict = {
+        "v": 'c' if vvfs_frame.is_checkpoint else 'j',
+        "q": vvfs_frame.seq,
+        vvfs_frame.km.value: vvfs_frame.km_data,
+    }
+
+    return _seal_frame_line(meta_dict, ct_chunk_b64, frame_hmac_key=frame_hmac_key)
+
+
+def _seal_frame_line(meta_dict: dict, ct_chunk_b64: bytes, frame_hmac_key: bytes) -> bytes:
+    """ Add the frame hmac to meta_dict and encode the frame line. """
+
+    # --- compute frame hmac
+    frame_hmac_msg = json.dumps(meta_dict).encode("ascii") + ct_chunk_b64
+    frame_hmac = hmac.new(key=frame_hmac_key, msg=frame_hmac_msg, digestmod=hashlib.sha3_256).hexdigest()
+
+    meta_dict['h'] = frame_hmac
+
+    # --- encode meta dict
+    meta_dict_b64 = b64.urlsafe_b64encode(json.dumps(meta_dict).encode("ascii"))
+
+    # [meta_dict_b64] | [chunk or frame payload]
+    line = meta_dict_b64 + b'|' + ct_chunk_b64 + b'\n'
+
+    return line
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+def make_bin_frame(ct_seg: CTSegment, ct_chunk: bytes, frame_hmac_key: bytes) -> bytes:
+    """ Make a bin frame from a CTSegment and its raw payload (b'' for segment references). """
+
+    try:
+        oid_raw = bytes.fromhex(ct_seg.parent_obj_id)
+    except ValueError:
+        raise R3D_V1T_Error(f"make_bin_frame: parent_obj_id is not hex: '{ct_seg.parent_obj_id}'")
+    if len(oid_raw) != 48:
+        raise R3D_V1T_Error(f"make_bin_frame: parent_obj_id is not a sha3_384 hex digest: '{ct_seg.parent_obj_id}'")
+
+    sid_raw = b''
+    if ct_seg.sid:
+        try:
+            sid_raw = bytes.fromhex(ct_seg.sid)
+        except ValueError:
+            raise R3D_V1T_Error(f"make_bin_frame: sid is not hex: '{ct_seg.sid}'")
+        if len(sid_raw) != _BIN_SID_SIZE:
+            raise R3D_V1T_Error(f"make_bin_frame: sid is not a sha3_256 hex digest: '{ct_seg.sid}'")
+
+    flags = _BIN_FLAG_SID if sid_raw else 0
+
+    if ct_seg.is_ref:
+        if not sid_raw or ct_chunk:
+            raise R3D_V1T_Error("make_bin_frame: segment references need a sid and carry no payload.")
+        kind, km_number, km_data = _BIN_KIND_REF, _KM_NUMBERS[RVKryptMode.PT], b''
+    else:
+        kind, km_number = _BIN_KIND_SEGMENT, _KM_NUMBERS[ct_seg.km]
+        km_data = json.dumps(ct_seg.km_data).encode("ascii") if ct_seg.km_data else b''
+
+    return _seal_bin_frame(kind, km_number, flags, ct_seg.idx, oid_raw, sid_raw, km_data, ct_chunk, frame_hmac_key)
+
+
+def make_vvfs_bin_frame(vvfs_frame: VVFSFrame, ct_chunk: bytes, frame_hmac_key: bytes) -> bytes:
+    """ Make a bin frame from a VVFSFrame and its raw payload. """
+
+    kind = _BIN_KIND_VVFS_CHECKPOINT if vvfs_frame.is_checkpoint else _BIN_KIND_VVFS_JOURNAL
+    km_data = json.dumps(vvfs_frame.km_data).encode("ascii") if vvfs_frame.km_data else b''
+
+    return _seal_bin_frame(kind, _KM_NUMBERS[vvfs_frame.km], 0, vvfs_frame.seq, _BIN_NO_OID, b'', km_data, ct_chunk,
+                           frame_hmac_key)
+
+
+def _seal_bin_frame(kind: int, km_number: int, flags: int, idx: int, oid_raw: bytes, sid_raw: bytes, km_data: bytes,
+                    ct_chunk: bytes, frame_hmac_key: bytes) -> bytes:
+    """ Pack the header of a bin frame and append the frame hmac. """
+
+    hdr = _BIN_HDR.pack(_BIN_MAGIC, _BIN_VERSION, kind, km_number, flags, idx, len(km_data), len(ct_chunk), oid_raw)
+
+    frame_hmac = hmac.new(key=frame_hmac_key, msg=hdr, digestmod=hashlib.sha3_256)
+    frame_hmac.update(sid_raw)
+    frame_hmac.update(km_data)
+    frame_hmac.update(ct_chunk)
+
+    return hdr + sid_raw + km_data + ct_chunk + frame_hmac.digest()
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+def _bin_meta_length(buf: bytes | mmap.mmap, pos: int) -> int:
+    """ Length of the meta part (header, sid, km_data) of the bin frame at pos, according to its header. """
+
+    _, _, _, _, flags, _, km_data_len, _, _ = _BIN_HDR.unpack_from(buf, pos)
+    sid_len = _BIN_SID_SIZE if flags & _BIN_FLAG_SID else 0
+
+    return _BIN_HDR.size + sid_len + km_data_len
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+def _bin_frame_length(buf: bytes | mmap.mmap, pos: int) -> int:
+    """ Length of the bin frame at pos according to its header, 0 if there is no plausible frame header at pos. """
+
+    if len(buf) - pos < _BIN_HDR.size + _BIN_HMAC_SIZE:
+        return 0
+
+    magic, version, _, _, _, _, _, payload_len, _ = _BIN_HDR.unpack_from(buf, pos)
+    if magic != _BIN_MAGIC or version != _BIN_VERSION:
+        return 0
+
+    frame_len = _bin_meta_length(buf, pos) + payload_len + _BIN_HMAC_SIZE
+    if pos + frame_len > len(buf):
+        return 0
+
+    return frame_len
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+def parse_bin_frame_meta(frame: bytes | memoryview) -> CTSegment | VVFSFrame:
+    """ Create a CTSegment or VVFSFrame (without its payload) from the header of a bin frame. The result is not
+    authenticated. """
+
+    if len(frame) < _BIN_HDR.size:
+        raise R3D_V1T_Error("Invalid frame: bin frame is shorter than its header")
+
+    _, _, kind, km_number, flags, idx, km_data_len, _, oid_raw = _BIN_HDR.unpack_from(frame, 0)
+
+    if kind not in (_BIN_KIND_SEGMENT, _BIN_KIND_REF, _BIN_KIND_VVFS_JOURNAL, _BIN_KIND_VVFS_CHECKPOINT):
+        raise R3D_V1T_Error(f"Invalid frame: unknown bin frame kind {kind}")
+
+    km_data_start = _bin_meta_length(frame, 0) - km_data_len
+    if len(frame) < km_data_start + km_data_len:
+        raise R3D_V1T_Error("Invalid frame: bin frame is shorter than its meta data")
+
+    if kind in (_BIN_KIND_VVFS_JOURNAL, _BIN_KIND_VVFS_CHECKPOINT):
+        vvfs_frame = VVFSFrame()
+        vvfs_frame.is_checkpoint = kind == _BIN_KIND_VVFS_CHECKPOINT
+        vvfs_frame.seq = idx
+        ct_seg = vvfs_frame
+    else:
+        ct_seg = CTSegment()
+        ct_seg.idx = idx
+        ct_seg.parent_obj_id = bytes(oid_raw).hex()
+        if flags & _BIN_FLAG_SID:
+            ct_seg.sid = bytes(frame[_BIN_HDR.size:_BIN_HDR.size + _BIN_SID_SIZE]).hex()
+
+    # --- segment reference (dedup), no km and no payload
+    if kind == _BIN_KIND_REF:
+        if not ct_seg.sid:
+            raise R3D_V1T_Error("Invalid frame: bin segment reference without sid")
+        ct_seg.is_ref = True
+        return ct_seg
+
+    if km_number not in _KM_BY_NUMBER or km_number == _KM_NUMBERS[RVKryptMode.PT]:
+        raise R3D_V1T_Error(f"Invalid frame: unknown krypt mode number {km_number} in bin frame")
+
+    ct_seg.km = _KM_BY_NUMBER[km_number]
+
+    ct_seg.km_data = {}
+    if km_data_len:
+        try:
+            ct_seg.km_data = json.loads(bytes(frame[km_data_start:km_data_start + km_data_len]).decode("utf-8"))
+        except Exception:
+            raise R3D_V1T_Error("Invalid frame: km_data does not decode in bin frame")
+
+    return ct_seg
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+def parse_bin_frame(frame: bytes, frame_hmac_key: bytes) -> CTSegment | VVFSFrame:
+    """ Parse and verify a single bin frame. Raise R3D_V1T_Error if the frame is invalid. """
+
+    return _verify_bin_frame(_pre_parse_bin_frame(frame), frame_hmac_key=frame_hmac_key)
+
+
+def _pre_parse_bin_frame(frame: bytes) -> tuple:
+    """ The part of parse_bin_frame that needs no key, check the lengths in its header. """
+
+    if _bin_frame_length(frame, 0) != len(frame):
+        raise R3D_V1T_Error(f"Invalid bin frame @ frame starting with: {frame[:16]}")
+
+    return (frame,)
+
+
+def _verify_bin_frame(pre_parsed: tuple, frame_hmac_key: bytes) -> CTSegment | VVFSFrame:
+    """ The rest of parse_bin_frame, check the hmac of a pre parsed bin frame and decode it. """
+
+    frame, = pre_parsed
+
+    recomputed_hmac = hmac.new(key=frame_hmac_key, msg=frame[:-_BIN_HMAC_SIZE], digestmod=hashlib.sha3_256).digest()
+    if not hmac.compare_digest(frame[-_BIN_HMAC_SIZE:], recomputed_hmac):
+        raise R3D_V1T_Error(f"Invalid frame: hmac mismatch in bin frame for idx/oid: {frame[8:16]}")
+
+    ct_seg = parse_bin_frame_meta(frame)
+
+    payload_len = _BIN_HDR.unpack_from(frame, 0)[7]
+    payload_start = _bin_meta_length(frame, 0)
+    ct_seg.ct_chunk = frame[payload_start:payload_start + payload_len]
+
+    return ct_seg
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+def parse_frame(frame: bytes, frame_fmt: RVFrameFmt, frame_hmac_key: bytes) -> CTSegment | VVFSFrame:
+    """ Parse and verify a frame in the given format. psv sets ct_chunk_b64 on the result, bin sets ct_chunk.
+    Vault files hold segment frames and vvfs frames, the result is a CTSegment or a VVFSFrame. """
+
+    return verify_frame(pre_parse_frame(frame, frame_fmt), frame_fmt, frame_hmac_key)
+
+
+def pre_parse_frame(frame: bytes, frame_fmt: RVFrameFmt) -> tuple:
+    """ The part of parse_frame that needs no key (decoding psv frames, checking the header of bin frames), it can run
+    while the keys are still being derived. verify_frame() finishes the job. Raise R3D_V1T_Error if the frame is
+    invalid already. """
+
+    if frame_fmt == RVFrameFmt.BIN:
+        return _pre_parse_bin_frame(frame)
+
+    return _pre_parse_frame_line(frame)
+
+
+def verify_frame(pre_parsed: tuple, frame_fmt: RVFrameFmt, frame_hmac_key: bytes) -> CTSegment | VVFSFrame:
+    """ parse_frame for a frame that went through pre_parse_frame already. """
+
+    if frame_fmt == RVFrameFmt.BIN:
+        return _verify_bin_frame(pre_parsed, frame_hmac_key=frame_hmac_key)
+
+    return _verify_frame_line(pre_parsed, frame_hmac_key=frame_hmac_key)
+
+
+def parse_frame_meta(buf: bytes | mmap.mmap, pos: int, length: int, frame_fmt: RVFrameFmt) -> CTSegment | VVFSFrame:
+    """ Create a CTSegment or VVFSFrame (without its payload) from the frame at buf[pos:pos + length], without verifying it.
+    Only the meta part of the frame is copied out of buf. """
+
+    if frame_fmt == RVFrameFmt.BIN:
+        if length < _BIN_HDR.size:
+            raise R3D_V1T_Error("Invalid frame: bin frame is shorter than its header")
+        return parse_bin_frame_meta(buf[pos:pos + min(length, _bin_meta_length(buf, pos))])
+
+    sep = buf.find(b'|', pos, pos + length)
+    if sep == -1:
+        raise R3D_V1T_Error(f"Invalid frame line @ line starting with: {buf[pos:pos + 16]}")
+
+    meta_dict = decode_meta_dict(buf[pos:sep])
+    return make_frame_meta(meta_dict, line_prefix=buf[pos:pos + 16])
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+def iter_frame_spans(buf: bytes | mmap.mmap, start: int, end: int, frame_fmt: RVFrameFmt) -> Iterator[tuple[int, int]]:
+    """ Yield (offset, length) of every candidate frame that starts in [start, end) of buf. Frames are not verified.
+
+    psv: every non empty line (without its new line).
+    bin: frames are found by hopping from header to header. if a header is broken, or its lengths dont land on the next
+    header, scan forward for the next magic and carry on from there.
+    """
+
+    pos = start
+
+    if frame_fmt == RVFrameFmt.PSV:
+        while pos < end:
+            eol = buf.find(b'\n', pos)
+            if eol == -1:
+                eol = len(buf)
+            if eol > pos:
+                yield pos, eol - pos
+            pos = eol + 1
+        return
+
+    buf_len = len(buf)
+    while pos < end:
+        frame_len = _bin_frame_length(buf, pos)
+        next_pos = pos + frame_len
+        if frame_len and (next_pos == buf_len or buf[next_pos:next_pos + len(_BIN_MAGIC)] == _BIN_MAGIC):
+            yield pos, frame_len
+            pos = next_pos
+            continue
+
+        # --- resync
+        pos = buf.find(_BIN_MAGIC, pos + 1)
+        if pos == -1:
+            return
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+class ReplicaFilter:
+    """ Recognise replicas of frames that were already verified during one load, so they can be skipped cheaply.
+
+    Only verified frames are remembered. if the primary copy of a frame fails verification its replica is not known
+    yet and gets verified (and used) as usual.
+    The locations of skipped replicas are added to the fl_alts of the segment taken for them.
+    vvfs frames are filtered the same way, by their sequence number.
+    """
+
+    def __init__(self):
+
+        # replicas are usually written back to back, a plain byte compare with the last verified frame catches those.
+        self._last_ok_frame = b''
+        self._last_ok_key: tuple[str, int] | None = None
+
+        # digests of all verified frames -> their (oid, idx), for replicas that are not adjacent.
+        self._ok_digests: dict[bytes, tuple[str, int]] = {}
+
+        # (oid, idx) -> the segment taken for it
+        self._taken: dict[tuple[str, int], CTSegment | VVFSFrame] = {}
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def skip_replica(self, frame: bytes, fl_offset: int) -> bool:
+        """ True if frame (found at fl_offset) is byte identical to a frame that was already verified. """
+
+        if frame == self._last_ok_frame:
+            seg_key = self._last_ok_key
+        else:
+            seg_key = self._ok_digests.get(hashlib.blake2b(frame, digest_size=16).digest())
+
+        if seg_key is None:
+            return False
+
+        self._add_alts(self._taken.get(seg_key), [(fl_offset, len(frame))])
+        return True
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def mark_verified(self, frame: bytes, ct_seg: CTSegment | VVFSFrame):
+        """ Remember a frame that passed verification, ct_seg is what it parsed to. """
+
+        self._last_ok_frame = frame
+        self._last_ok_key = self._seg_key(ct_seg)
+        self._ok_digests[hashlib.blake2b(frame, digest_size=16).digest()] = self._last_ok_key
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def take_seg(self, ct_seg: CTSegment | VVFSFrame) -> bool:
+        """ True if this is the first segment seen for its (oid, idx), False for replicas of it. """
+
+        seg_key = self._seg_key(ct_seg)
+        if seg_key in self._taken:
+            if ct_seg.fl_offset >= 0:
+                self._add_alts(self._taken[seg_key], [(ct_seg.fl_offset, ct_seg.fl_length)] + (ct_seg.fl_alts or []))
+            return False
+
+        self._taken[seg_key] = ct_seg
+        return True
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def _seg_key(ct_seg: CTSegment | VVFSFrame) -> tuple[str, int]:
+
+        # oids are hex, 'vvfs' never clashes with one
+        if isinstance(ct_seg, VVFSFrame):
+            return 'vvfs', ct_seg.seq
+
+        return ct_seg.parent_obj_id, ct_seg.idx
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def _add_alts(ct_seg: CTSegment | VVFSFrame | None, fl_alts: list[tuple[int, int]]):
+
+        if ct_seg is None or ct_seg.fl_offset < 0:
+            return
+
+        if ct_seg.fl_alts is None:
+            ct_seg.fl_alts = []
+        ct_seg.fl_alts.extend(fl_alts)
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+def split_vlt_file(vlt_file_pathname: str, n_parts: int) -> list[tuple[int, int]]:
+    """ Split a vault file into up to n_parts [start, end) byte ranges. Every range starts at the beginning of a frame. """
+
+    file_size = os.path.getsize(vlt_file_pathname)
+    if file_size == 0:
+        return []
+
+    n_parts = max(1, n_parts)
+    part_size = max(1, file_size // n_parts)
+
+    boundaries = [0]
+    with open(vlt_file_pathname, "rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        frame_fmt = detect_frame_fmt(mm)
+
+        if frame_fmt == RVFrameFmt.PSV:
+            # --- move every tentative boundary forward to just after the next new line
+            for i in range(1, n_parts):
+                tentative = max(i * part_size, boundaries[-1])
+                if tentative >= file_size:
+                    break
+
+                eol = mm.find(b'\n', tentative)
+                if eol == -1 or eol + 1 >= file_size:
+                    break
+                if eol + 1 > boundaries[-1]:
+                    boundaries.append(eol + 1)
+        else:
+            # --- bin frames can not be found from an arbitrary offset, hop over the headers (cheap, no payload is read)
+            for pos, _ in iter_frame_spans(mm, 0, file_size, frame_fmt):
+                if pos >= len(boundaries) * part_size and len(boundaries) < n_parts:
+                    boundaries.append(pos)
+
+    boundaries.append(file_size)
+    return [(boundaries[i], boundaries[i + 1]) for i in range(len(boundaries) - 1)]
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+def parse_frame_range(vlt_file_pathname: str, start: int, end: int,
+                      frame_hmac_key: bytes) -> tuple[list[CTSegment | VVFSFrame], list[str]]:
+    """ Parse and verify the frames that start in [start, end) of a vault file. start must be at the start of a frame.
+
+    Return the verified segments (and vvfs frames) in file order (replicas skipped, their locations in fl_alts), and
+    the errors for frames that did not verify.
+    This is the unit of work of the parallel loader and runs in a worker process.
+    """
+
+    ct_segs = []
+    errors = []
+    replica_filter = ReplicaFilter()
+
+    with open(vlt_file_pathname, "rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        frame_fmt = detect_frame_fmt(mm)
+
+        for pos, length in iter_frame_spans(mm, start, end, frame_fmt):
+            frame = mm[pos:pos + length]
+            if replica_filter.skip_replica(frame, pos):
+                continue
+
+            try:
+                ct_seg = parse_frame(frame, frame_fmt, frame_hmac_key)
+            except Exception as e:
+                errors.append(repr(e))
+                continue
+
+            ct_seg.fl_offset = pos
+            ct_seg.fl_length = length
+            replica_filter.mark_verified(frame, ct_seg)
+            if replica_filter.take_seg(ct_seg):
+                ct_segs.append(ct_seg)
+
+    return ct_segs, errors
@@ -0,0 +1,168 @@
+''' obj_reader.py
+
+Seekable, read only file object over a vault object, see VaultMan.open().
+
+Only the segments covering the requested range are decrypted (found by bisecting the segment offsets, CTSegment.idx),
+the rest of the object is never touched. A read costs about the size of the read, not the size of the object.
+
+Decrypted segments are kept in a small LRU cache. Sequential readers (next segment after the last one read) get a few
+segments of readahead, decrypted in one batch.
+
+'''
+
+import io
+import bisect
+from collections import OrderedDict
+
+from libr3dv1t.errors import R3D_V1T_Error
+from libr3dv1t.typedefs import MemObj
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+# decrypted segments kept per reader
+_CACHE_SEGMENTS = 16
+
+# segments decrypted ahead of a sequential reader
+_READAHEAD_SEGMENTS = 4
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+class ObjReader(io.RawIOBase):
+    """ Read a vault object like a binary file. Use VaultMan.open() or VaultMan.open_obj() to get one. """
+
+    def __init__(self, vman, mem_obj: MemObj):
+
+        super().__init__()
+
+        self._vman = vman
+        self._mem_obj = mem_obj
+        self._pos = 0
+
+        # segments in plaintext offset order, and their offsets for bisecting
+        self._ct_segments = sorted(vman._obj_segs(mem_obj), key=lambda ct_seg: ct_seg.idx)
+        self._seg_idxs = [ct_seg.idx for ct_seg in self._ct_segments]
+
+        # segment number -> plaintext, LRU order
+        self._cache: OrderedDict[int, bytes] = OrderedDict()
+        self._last_seg_num = -1
+
+        # object size, found on first need (it takes decrypting the last segment)
+        self._size: int | None = None
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    @property
+    def size(self) -> int:
+        """ Plaintext size of the object. """
+
+        if self._size is None:
+            pt_data = self._mem_obj.pt_data
+            if pt_data is not None:
+                self._size = len(pt_data)
+            elif not self._ct_segments:
+                self._size = 0
+            else:
+                last_seg_num = len(self._ct_segments) - 1
+                self._size = self._seg_idxs[last_seg_num] + len(self._load_segment(last_seg_num))
+
+        return self._size
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+
+        if self.closed:
+            raise ValueError("seek on closed ObjReader")
+
+        if whence == io.SEEK_SET:
+            new_pos = offset
+        elif whence == io.SEEK_CUR:
+            new_pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            new_pos = self.size + offset
+        else:
+            raise ValueError(f"ObjReader.seek: invalid whence {whence}")
+
+        if new_pos < 0:
+            raise ValueError(f"ObjReader.seek: negative position {new_pos}")
+
+        self._pos = new_pos
+        return self._pos
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def readinto(self, buf) -> int:
+        """ Read up to len(buf) bytes at the current position into buf, return the number of bytes read (0 at EOF). """
+
+        if self.closed:
+            raise ValueError("readinto on closed ObjReader")
+
+        out = memoryview(buf).cast('B')
+
+        # --- already decrypted objects are served as is. (pt_data can be evicted any time, see VaultMan.pt_cache)
+        pt_data = self._mem_obj.pt_data
+        if pt_data is not None:
+            data = pt_data[self._pos:self._pos + len(out)]
+            out[:len(data)] = data
+            self._pos += len(data)
+            return len(data)
+
+        n_read = 0
+        while n_read < len(out) and self._ct_segments:
+            seg_num = bisect.bisect_right(self._seg_idxs, self._pos) - 1
+            if seg_num < 0:
+                raise R3D_V1T_Error(f"ObjReader: no segment covers offset {self._pos} of {self._mem_obj.obj_id}")
+
+            pt_chunk = self._load_segment(seg_num)
+            seg_offset = self._pos - self._seg_idxs[seg_num]
+            if seg_offset >= len(pt_chunk):
+                # past the end of the last segment is EOF, anywhere else its a hole in the object
+                if seg_num == len(self._ct_segments) - 1:
+                    break
+                raise R3D_V1T_Error(f"ObjReader: no segment covers offset {self._pos} of {self._mem_obj.obj_id}")
+
+            n = min(len(out) - n_read, len(pt_chunk) - seg_offset)
+            out[n_read:n_read + n] = pt_chunk[seg_offset:seg_offset + n]
+            n_read += n
+            self._pos += n
+
+        return n_read
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def _load_segment(self, seg_num: int) -> bytes:
+        """ Plaintext of segment number seg_num, from the cache or decrypted (with readahead for sequential reads). """
+
+        if seg_num in self._cache:
+            self._cache.move_to_end(seg_num)
+            self._last_seg_num = seg_num
+            return self._cache[seg_num]
+
+        seg_nums = [seg_num]
+        if seg_num == self._last_seg_num + 1:
+            readahead_end = min(seg_num + 1 + _READAHEAD_SEGMENTS, len(self._ct_segments))
+            seg_nums += [k for k in range(seg_num + 1, readahead_end) if k not in self._cache]
+
+        pt_chunks = self._vman._open_segments([self._ct_segments[k] for k in seg_nums])
+        for k, pt_chunk in zip(seg_nums, pt_chunks):
+            self._cache[k] = pt_chunk
+
+        # readahead segments go in after seg_num, make seg_num the most recently used
+        self._cache.move_to_end(seg_num)
+        while len(self._cache) > _CACHE_SEGMENTS:
+            self._cache.popitem(last=False)
+
+        self._last_seg_num = seg_num
+        return self._cache[seg_num]
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def close(self):
+        self._cache.clear()
+        super().close()
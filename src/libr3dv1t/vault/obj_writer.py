@@ -0,0 +1,188 @@
+''' obj_writer.py
+
+Incremental (streaming) object writer for VaultMan.
+
+Plaintext is fed in with write() in pieces of any size. Full chunks are encrypted a batch at a time and their
+ciphertext goes straight to the VaultMan staging file, the keyed object fingerprint (obj_id) is computed along the way.
+Peak memory is about one encryption batch, no matter how large the object is.
+
+The obj_id is only known once all data is in (finish), segments get their parent_obj_id at that point.
+Chunks that are already in the VaultMan segment store (or earlier in the same object) become segment references
+and are not encrypted or staged again (dedup).
+
+'''
+
+import hmac
+import hashlib
+
+from libr3dv1t.central_config import dfcc
+from libr3dv1t.errors import R3D_V1T_Error
+from libr3dv1t.typedefs import MemObj, CTSegment, RVKryptMode
+from libr3dv1t.vault import chunker
+from libr3dv1t.vault.vvfs import VirtualFile
+from libr3dv1t.log_utilz.log_man import default_logger as log
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+# krypt batches (dfcc().krypt_batch_size chunks each) encrypted per flush. fixed, not scaled with the number of cores,
+# so a streamed put buffers a bounded amount of plaintext on any machine.
+_FLUSH_BATCHES = 4
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+class ObjWriter:
+    """ Write one object into a VaultMan in pieces. Use VaultMan.new_obj_writer() to get one. """
+
+    def __init__(self, vman):
+
+        if vman._new_segment_krypt_mode != RVKryptMode.CHACHA20_POLY1305:
+            raise NotImplementedError(f"ObjWriter: krypt mode {vman._new_segment_krypt_mode} is not supported.")
+
+        self._vman = vman
+        self._chunker = chunker.make_chunker()
+
+        # encrypt about this many chunks at a time, enough to keep a few krypt workers busy.
+        self._batch_bytes = self._chunker.max_size * dfcc().krypt_batch_size * _FLUSH_BATCHES
+
+        self._osfp = hmac.new(key=vman.vks.osfp_key, digestmod=hashlib.sha3_384)
+        self._pending = bytearray()
+        self._pt_len = 0
+        self._ct_segments: list[CTSegment] = []
+        self._stg_start = -1
+
+        # sid -> new (not deduped) segments of this object, they go to the segment store on finish.
+        self._own_segs: dict[str, CTSegment] = {}
+        self._done = False
+
+        # compression is decided on the first batch of chunks and kept for the rest of the object.
+        self._z_decided = False
+        self._z_codec: str | None = None
+        self._z_pt_len = 0
+        self._z_len = 0
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    @property
+    def pt_len(self) -> int:
+        """ Number of plaintext bytes written so far. """
+        return self._pt_len
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def write(self, data: bytes):
+        """ Add the next piece of plaintext to the object. """
+
+        if self._done:
+            raise R3D_V1T_Error("ObjWriter.write: writer is already finished.")
+
+        self._osfp.update(data)
+        self._pending += data
+        self._pt_len += len(data)
+
+        if len(self._pending) >= self._batch_bytes:
+            self._flush(final=False)
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def _flush(self, final: bool):
+        """ Encrypt and stage all chunks the chunker is sure about in the pending buffer, everything if final. """
+
+        chunk_lens = self._chunker.split(self._pending, final=final)
+        if not chunk_lens:
+            return
+
+        # plaintext offset of self._pending[0] in the object
+        base_idx = self._pt_len - len(self._pending)
+
+        offsets = []
+        pt_chunks = []
+        end = 0
+        for chunk_len in chunk_lens:
+            offsets.append(base_idx + end)
+            pt_chunks.append(bytes(self._pending[end:end + chunk_len]))
+            end += chunk_len
+
+        if not self._z_decided:
+            self._z_codec = self._vman._pick_compression(pt_chunks)
+            self._z_decided = True
+
+        ct_segments, pt_len, z_len = self._vman._make_segments(offsets, pt_chunks, self._z_codec,
+                                                               own_segs=self._own_segs, stage=True)
+        self._z_pt_len += pt_len
+        self._z_len += z_len
+
+        for ct_seg in ct_segments:
+            if self._stg_start < 0 and ct_seg.stg_offset >= 0:
+                self._stg_start = ct_seg.stg_offset
+
+        self._ct_segments.extend(ct_segments)
+        del self._pending[:end]
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def finish(self, virt_name: str) -> str:
+        """ Finish the object, add it to the vault under virt_name and return its obj_id. """
+
+        if self._done:
+            raise R3D_V1T_Error("ObjWriter.finish: writer is already finished.")
+
+        if not isinstance(virt_name, str):
+            raise R3D_V1T_Error("ObjWriter.finish: virt_name must be a string.")
+
+        self._flush(final=True)
+        self._done = True
+
+        obj_id = self._osfp.hexdigest()
+        log.dbg(f"ObjWriter.finish: obj_id='{obj_id}' -- pt_len={self._pt_len:_} -- virt_name='{virt_name}'")
+
+        vman = self._vman
+        if obj_id in vman.mem_os:
+            # same content is already in the vault, the staged segments are not needed.
+            self._unstage()
+        else:
+            for ct_seg in self._ct_segments:
+                ct_seg.parent_obj_id = obj_id
+
+            mobj = MemObj()
+            mobj.obj_id = obj_id
+            mobj.ct_segments = self._ct_segments
+            mobj.z_codec = self._z_codec or ''
+            mobj.pt_len = self._z_pt_len
+            mobj.z_len = self._z_len
+            vman.mem_os[obj_id] = mobj
+            vman._register_segments(self._own_segs)
+
+        self._ct_segments = []
+        self._own_segs = {}
+
+        # --- update the vvfs
+        vman.vv_fs.link_vf(vf=VirtualFile(pname=virt_name), oid=obj_id)
+
+        return obj_id
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def abort(self):
+        """ Drop the object (e.g. its upload was cut off), nothing is added to the vault and the staging space of its
+        payloads is given back. Does nothing if the writer is already finished. """
+
+        if self._done:
+            return
+
+        self._done = True
+        log.dbg(f"ObjWriter.abort: dropping {self._pt_len:_} bytes written so far")
+
+        self._unstage()
+        self._pending = bytearray()
+        self._ct_segments = []
+        self._own_segs = {}
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def _unstage(self):
+        """ Give back the staging space of the payloads of this object (see VaultMan._unstage). Other writers may have
+        staged in between ours, only done if our payloads are contiguous. """
+
+        staged_segs = [ct_seg for ct_seg in self._ct_segments if ct_seg.stg_offset >= 0]
+        if not staged_segs:
+            return
+
+        last_seg = staged_segs[-1]
+        stg_end = last_seg.stg_offset + last_seg.stg_length
+        if stg_end - self._stg_start == sum(ct_seg.stg_length for ct_seg in staged_segs):
+            self._vman._unstage(self._stg_start, stg_end)
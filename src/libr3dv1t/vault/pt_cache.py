@@ -0,0 +1,98 @@
+''' pt_cache.py
+
+Byte budgeted LRU cache of decrypted object data (MemObj.pt_data), see VaultMan.pt_cache.
+
+The cache does not hold the data itself, it tracks which mem_objs have their pt_data set and how big it is. Evicting an
+object drops its pt_data (sets it to None), the object is decrypted again from its segments the next time its needed.
+The ciphertext (or the location of it in the vault file) is never dropped.
+
+'''
+
+import threading
+from collections import OrderedDict
+
+from libr3dv1t.typedefs import MemObj
+from libr3dv1t.log_utilz.log_man import default_logger as log
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+class PTCache:
+    """ LRU of the mem_objs holding decrypted data, evicted down to budget bytes. budget None means no limit. """
+
+    def __init__(self, budget: int | None = None):
+
+        self.budget = budget
+
+        # obj_id -> (mem_obj, size of its pt_data), least recently used first
+        self._entries: OrderedDict[str, tuple[MemObj, int]] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def hit(self, mem_obj: MemObj):
+        """ mem_obj data was used from memory, make it the most recently used. """
+
+        with self._lock:
+            self.hits += 1
+            if mem_obj.obj_id in self._entries:
+                self._entries.move_to_end(mem_obj.obj_id)
+
+    def miss(self):
+        """ Data was not in memory and had to be decrypted. """
+
+        with self._lock:
+            self.misses += 1
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def admit(self, mem_obj: MemObj):
+        """ mem_obj just got its pt_data (decrypted or put into the vault), track it and evict down to budget.
+        Objects bigger than the whole budget are evicted right away. """
+
+        if mem_obj.pt_data is None:
+            return
+
+        with self._lock:
+            old_entry = self._entries.pop(mem_obj.obj_id, None)
+            if old_entry is not None:
+                self._size -= old_entry[1]
+
+            self._entries[mem_obj.obj_id] = (mem_obj, len(mem_obj.pt_data))
+            self._size += len(mem_obj.pt_data)
+
+            if self.budget is None:
+                return
+
+            while self._size > self.budget and self._entries:
+                obj_id, (lru_obj, size) = self._entries.popitem(last=False)
+                lru_obj.pt_data = None
+                self._size -= size
+                self.evictions += 1
+                log.dbg(f"PTCache: evicted {obj_id}, {size:_} bytes.")
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def discard(self, obj_id: str):
+        """ Stop tracking an object (removed from the vault). its pt_data is left as is. """
+
+        with self._lock:
+            entry = self._entries.pop(obj_id, None)
+            if entry is not None:
+                self._size -= entry[1]
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def stats(self) -> dict[str, int | None]:
+        """ Budget and bytes held, objects held, hit/miss/eviction counters. """
+
+        with self._lock:
+            return {
+                "budget": self.budget,
+                "bytes": self._size,
+                "objects": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
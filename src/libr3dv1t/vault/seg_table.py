@@ -0,0 +1,220 @@
+''' seg_table.py
+
+Columnar table of the segments of persisted objects, where their frames are in a vault file and their meta data.
+
+A CTSegment is a full python object, with a km_data dict, a fl_alts list and its own oid and sid strings, several
+hundred bytes each. Vaults with millions of segments keep them in a SegTable instead, one row per segment in a few
+arrays (about 60 bytes a row):
+- idx, fl_offset, fl_length, oid (index into the oids of the table) and km_data (index into the distinct km_datas,
+  there are only a handful, the nonce is in the payload) columns.
+- a flags column: is_ref, has a sid, has the usual replica (right after the frame, or after its new line for psv
+  frames found by a scan, same length), the krypt mode.
+- sids (hex of 32 byte fingerprints) packed as raw bytes.
+Odd values (other replicas, sids that are not 64 hex digits) go to small side tables.
+
+The rows of an object are contiguous. VaultMan keeps the index entries of everything persisted in its vault file in
+one (see vlt_index), and lazily loaded objects keep their segments in it (see MemObj.seg_table). Segments are made
+into CTSegments (without payload, located by fl_offset) only when asked for.
+
+'''
+
+import json
+from array import array
+
+from libr3dv1t.typedefs import CTSegment, RVKryptMode
+from libr3dv1t.vault import vlt_index
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+_SID_SIZE = 32
+
+_F_REF = 0x01
+_F_SID = 0x02
+_F_REPLICA = 0x04
+_F_REPLICA_NL = 0x08
+_KM_SHIFT = 4
+
+_KMS = list(RVKryptMode)
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+class SegTable:
+    """ Append only columnar table of segments and their frames, see the module doc. """
+
+    __slots__ = ('_idx', '_fl_offset', '_fl_length', '_oid', '_km_data', '_flags', '_sids', '_odd_sids', '_odd_alts',
+                 '_oids', '_oid_nums', '_km_datas', '_km_nums', '_spans')
+
+    def __init__(self):
+
+        # --- one entry per row
+        self._idx = array('q')
+        self._fl_offset = array('q')
+        self._fl_length = array('I')
+        self._oid = array('I')
+        self._km_data = array('I')
+        self._flags = array('B')
+        self._sids = bytearray()
+
+        # row -> sid / fl_alts that do not fit the columns
+        self._odd_sids: dict[int, str] = {}
+        self._odd_alts: dict[int, list[tuple[int, int]]] = {}
+
+        # distinct oids and km_datas (json) the rows point to
+        self._oids: list[str] = []
+        self._oid_nums: dict[str, int] = {}
+        self._km_datas: list[str] = []
+        self._km_nums: dict[str, int] = {}
+
+        # oid -> its rows
+        self._spans: dict[str, range] = {}
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def __len__(self) -> int:
+        """ Number of objects in the table. """
+
+        return len(self._spans)
+
+    def __contains__(self, oid: str) -> bool:
+        return oid in self._spans
+
+    def rows(self, oid: str) -> range:
+        """ Rows of the segments of an object. """
+
+        return self._spans[oid]
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def add_obj(self, oid: str, seg_locs: list[tuple[CTSegment, int, int, list[tuple[int, int]] | None]]) -> range:
+        """ Add an object, seg_locs has (ct_seg, fl_offset, fl_length, fl_alts) for each of its segments, its frame
+        (and replicas) in the vault file. Return the rows of the segments, they line up with seg_locs. An object already
+        in the table is replaced (its old rows are garbage). Raise OverflowError or TypeError (nothing is added) if a
+        value does not fit its column. """
+
+        first_row = len(self._flags)
+
+        # --- columns of the new rows first, so a value that does not fit changes nothing
+        idx = array('q', [ct_seg.idx for ct_seg, _, _, _ in seg_locs])
+        fl_offset = array('q', [fl_offset for _, fl_offset, _, _ in seg_locs])
+        fl_length = array('I', [fl_length for _, _, fl_length, _ in seg_locs])
+
+        oid_num = self._oid_nums.get(oid)
+        if oid_num is None:
+            oid_num = self._oid_nums[oid] = len(self._oids)
+            self._oids.append(oid)
+
+        self._idx.extend(idx)
+        self._fl_offset.extend(fl_offset)
+        self._fl_length.extend(fl_length)
+
+        for row, (ct_seg, fl_offset, fl_length, fl_alts) in enumerate(seg_locs, start=first_row):
+            flags = _F_REF if ct_seg.is_ref else _KMS.index(ct_seg.km) << _KM_SHIFT
+
+            raw_sid = self._raw_sid(ct_seg.sid)
+            if raw_sid is not None:
+                flags |= _F_SID
+                self._sids += raw_sid
+            else:
+                self._sids += bytes(_SID_SIZE)
+                if ct_seg.sid:
+                    self._odd_sids[row] = ct_seg.sid
+
+            if fl_alts == [(fl_offset + fl_length, fl_length)]:
+                flags |= _F_REPLICA
+            elif fl_alts == [(fl_offset + fl_length + 1, fl_length)]:
+                flags |= _F_REPLICA_NL
+            elif fl_alts:
+                self._odd_alts[row] = list(fl_alts)
+
+            self._oid.append(oid_num)
+            self._km_data.append(self._km_num({} if ct_seg.is_ref else ct_seg.km_data))
+            self._flags.append(flags)
+
+        rows = range(first_row, len(self._flags))
+        self._spans[oid] = rows
+
+        return rows
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def drop_obj(self, oid: str):
+        """ Remove an object, its rows are left as garbage. """
+
+        self._spans.pop(oid, None)
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def seg(self, row: int) -> CTSegment:
+        """ Lazy CTSegment (no payload, located by fl_offset) of a row. """
+
+        flags = self._flags[row]
+
+        ct_seg = CTSegment()
+        ct_seg.idx = self._idx[row]
+        ct_seg.parent_obj_id = self._oids[self._oid[row]]
+        ct_seg.fl_offset = self._fl_offset[row]
+        ct_seg.fl_length = self._fl_length[row]
+        ct_seg.fl_alts = self._fl_alts(row, flags)
+        ct_seg.is_ref = bool(flags & _F_REF)
+        if flags & _F_SID:
+            ct_seg.sid = self._sids[row * _SID_SIZE:(row + 1) * _SID_SIZE].hex()
+        else:
+            ct_seg.sid = self._odd_sids.get(row, '')
+        if not ct_seg.is_ref:
+            ct_seg.km = _KMS[flags >> _KM_SHIFT]
+            ct_seg.km_data = json.loads(self._km_datas[self._km_data[row]])
+
+        return ct_seg
+
+    def segs(self, rows: range) -> list[CTSegment]:
+        """ Lazy CTSegments of some rows, see seg(). """
+
+        return [self.seg(row) for row in rows]
+
+    def is_ref(self, row: int) -> bool:
+        return bool(self._flags[row] & _F_REF)
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def index_objs(self) -> dict[str, list]:
+        """ oid -> index entries of its segments, of every object in the table (see vlt_index.write_index). """
+
+        objs = {}
+        for oid, rows in self._spans.items():
+            objs[oid] = [
+                vlt_index.index_entry(ct_seg, ct_seg.fl_offset, ct_seg.fl_length, ct_seg.fl_alts)
+                for ct_seg in self.segs(rows)
+            ]
+
+        return objs
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def _fl_alts(self, row: int, flags: int) -> list[tuple[int, int]] | None:
+
+        if flags & (_F_REPLICA | _F_REPLICA_NL):
+            fl_length = self._fl_length[row]
+            gap = 1 if flags & _F_REPLICA_NL else 0
+            return [(self._fl_offset[row] + fl_length + gap, fl_length)]
+
+        alts = self._odd_alts.get(row)
+        return list(alts) if alts else None
+
+    @staticmethod
+    def _raw_sid(sid: str) -> bytes | None:
+        """ sid as raw bytes, None if it would not come back the same (not 64 lower case hex digits). """
+
+        if len(sid) != _SID_SIZE * 2:
+            return None
+
+        try:
+            raw_sid = bytes.fromhex(sid)
+        except ValueError:
+            return None
+
+        return raw_sid if raw_sid.hex() == sid else None
+
+    def _km_num(self, km_data: dict) -> int:
+
+        km_json = json.dumps(km_data, sort_keys=True)
+        km_num = self._km_nums.get(km_json)
+        if km_num is None:
+            km_num = self._km_nums[km_json] = len(self._km_datas)
+            self._km_datas.append(km_json)
+
+        return km_num
@@ -11,71 +11,348 @@ Vault Man represents an in memory vault.
 import os
 import io
 import json
+import mmap
 import hashlib
 import hmac
+import tempfile
+import threading
+from typing import BinaryIO, Iterable
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 
 import base64 as b64
 
-from nacl.secret import SecretBox
-
 from libr3dv1t.central_config import dfcc
 from libr3dv1t.errors import R3D_IO_Error, R3D_V1T_Error
-from libr3dv1t.typedefs import MemObj, CTSegment, RVKryptMode
-from libr3dv1t.krypt_utilz import kdf
+from libr3dv1t.typedefs import MemObj, CTSegment, VVFSFrame, RVKryptMode, RVFrameFmt, VaultKeys
+from libr3dv1t.krypt_utilz import key_agent, seg_krypt
+from libr3dv1t.vault import frames, compression, chunker, vlt_index
+from libr3dv1t.vault.obj_writer import ObjWriter
+from libr3dv1t.vault.obj_reader import ObjReader
+from libr3dv1t.vault.xtract import ObjXtractor
+from libr3dv1t.vault.pt_cache import PTCache
+from libr3dv1t.vault.seg_table import SegTable
 from libr3dv1t.vault.vvfs import VaultVirtualFS, VirtualFile
-from libr3dv1t.krypt_utilz.nonce_gen import make_nonce
 from libr3dv1t.log_utilz.log_man import default_logger as log
 
 
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+def _fsync_dir(pathname: str):
+    """ Sync the directory holding pathname, so a rename into it is durable. no-op where directories can't be opened. """
+
+    try:
+        dir_fd = os.open(os.path.dirname(os.path.abspath(pathname)), os.O_RDONLY)
+    except OSError:
+        return
+
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+
 # ------------------------------------------------------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------------------------------------------------------
 class VaultMan:
     """ An in memory r3d vault. """
 
     # --------------------------------------------------------------------------------------------------------------------------
-    def __init__(self, vlt_password: bytes, vlt_file_pathname_to_load: str = ''):
-        """ Initialize the vault manager. """
-
-        self.vks = kdf.vks_set_from_user_pass(vlt_password)
-        log.info(f"self.vks: {self.vks}")
+    def __init__(self,
+                 vlt_password: bytes | None,
+                 vlt_file_pathname_to_load: str = '',
+                 lazy_load: bool = False,
+                 frame_fmt: RVFrameFmt | None = None,
+                 vks: VaultKeys | None = None):
+        """ Initialize the vault manager. frame_fmt is only used for new vaults, loaded vaults keep their format.
+        vks are keys already derived from the vault password (kdf.vks_set_from_user_pass), vlt_password is not used
+        if they are given. Otherwise they are derived by the key agent, if there is one (see key_agent.derive_vks).
+
+        The keys are derived on a thread, the vault file is read in the meantime (see load_vlt and the vks property).
+        """
+
+        if vks is None and vlt_password is None:
+            raise R3D_V1T_Error("VaultMan: either vlt_password or vks is required.")
+
+        # checked here, the KDF thread would only raise when the keys are first needed
+        if vks is not None and not isinstance(vks, VaultKeys):
+            raise R3D_V1T_Error(f"VaultMan: vks must be VaultKeys, not {type(vks).__name__}.")
+        if vks is None and not isinstance(vlt_password, bytes):
+            raise R3D_V1T_Error(f"VaultMan: vlt_password must be bytes, not {type(vlt_password).__name__}.")
+
+        # vault keys, None until the KDF running in _vks_future is done. use the vks property, it waits for them.
+        self._vks: VaultKeys | None = vks
+        self._vks_future: Future | None = None
+        if vks is None:
+            self._vks_future = self._start_kdf(vlt_password)
 
         # TODO this is tricky. i am not sure what happens if multiple modes exist in vault. comeback to this later.
         self._new_segment_krypt_mode = dfcc().default_krypt_mode
         log.info(f"self._new_segment_krypt_mode: {self._new_segment_krypt_mode}")
 
+        # frame format used when saving. set to the format of the vault file on load.
+        self._frame_fmt = frame_fmt if frame_fmt is not None else dfcc().default_frame_fmt
+
         # memory object store - map from obj_id -> MemObj
         self.mem_os: dict[str, MemObj] = {}
 
+        # segment store (dedup) - map from sid -> the CTSegment holding the payload of that chunk.
+        # objects list their segments in mem_os, segments they share with others are references to entries here.
+        # segments of lazily loaded objects are in here as their row in _vlt_segs (see _seg_store_get).
+        self.seg_store: dict[str, CTSegment | int] = {}
+
+        # decrypted object data (MemObj.pt_data) kept in memory, LRU with a byte budget
+        self.pt_cache = PTCache(budget=dfcc().pt_cache_budget)
+
         # vault virtual file system
         self.vv_fs = VaultVirtualFS()
 
+        # vault file backing lazily loaded segments (see load_vlt). the mmap is never written to.
+        self._vlt_fh: io.BufferedReader | None = None
+        self._vlt_mm: mmap.mmap | None = None
+        self._vlt_mm_fmt = RVFrameFmt.PSV
+
+        # segments of the objects that came out of that file, see MemObj.seg_table
+        self._vlt_segs: SegTable | None = None
+
+        # staging file for ciphertext of streamed objects (see put_stream), created when first needed.
+        self._stg_fh: BinaryIO | None = None
+        self._stg_size = 0
+        self._stg_lock = threading.Lock()
+
+        # vault file this VaultMan was last loaded from or saved to, and the objects whose frames are already in it.
+        # _persisted_segs has the frames of those objects in that file (what its index lists, see vlt_index).
+        self._persisted_pathname = ''
+        self._persisted_oids: set[str] = set()
+        self._persisted_segs = SegTable()
+
+        # vvfs frames in that file: the last vvfs sequence number used, the operations journaled since the last
+        # checkpoint, and the index entries of the frames a load needs (the last checkpoint and the journal after it).
+        self._vvfs_seq = 0
+        self._vvfs_journaled_ops = 0
+        self._persisted_vvfs: list[list] = []
+
+        # bytes of that file its index sidecar covers, 0 if it has none (see _save_vault_append)
+        self._index_covered = 0
+
+        # vvfs frames found while loading a vault file, replayed into vv_fs once all frames are in (see _replay_vvfs)
+        self._loaded_vvfs: list[VVFSFrame] = []
+
         log.info("Initialized new VaultMan instance.")
 
         if vlt_file_pathname_to_load:
             log.dbg(f"Loading vault from file @ path: {vlt_file_pathname_to_load}")
-            self.load_vlt(vlt_file_pathname_to_load)
+            self.load_vlt(vlt_file_pathname_to_load, lazy=lazy_load)
 
         # --- anymore init work goes here
 
+    # --------------------------------------------------------------------------------------------------------------------------
+    @property
+    def vks(self) -> VaultKeys:
+        """ The vault keys. Waits for the KDF if it is still running (and raises what it raised if it failed). """
+
+        if self._vks is None:
+            vks = self._vks_future.result()
+            if self._vks is None:
+                self._vks = vks
+                log.info(f"self.vks: {self._vks}")
+
+        return self._vks
+
+    def _vks_ready(self) -> bool:
+        """ True if vks would not wait. """
+
+        return self._vks is not None or self._vks_future.done()
+
+    @staticmethod
+    def _start_kdf(vlt_password: bytes) -> Future:
+        """ Derive the vault keys on a thread. hashlib scrypt and pbkdf2 release the GIL, so does waiting for a key
+        agent. """
+
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='r3dv1t_kdf')
+        vks_future = executor.submit(key_agent.derive_vks, vlt_password)
+        executor.shutdown(wait=False)
+
+        return vks_future
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def close(self):
+        """ Release the vault file backing lazily loaded segments and the staging file.
+        Lazy and staged segments can not be read after this. """
+
+        if self._vlt_mm is not None:
+            self._vlt_mm.close()
+            self._vlt_mm = None
+
+        if self._vlt_fh is not None:
+            self._vlt_fh.close()
+            self._vlt_fh = None
+
+        if self._stg_fh is not None:
+            self._stg_fh.close()
+            self._stg_fh = None
+            self._stg_size = 0
+
     # --------------------------------------------------------------------------------------------------------------------------
     # --------------------------------------------------------------------------------------------------------------------------
     # --------------------------------------------------------------------------------------------------------------------------
     # --------------------------------------------------------------------------------------------------------------------------
     # --------------------------------------------------------------------------------------------------------------- read vault
-    def load_vlt(self, vlt_file_pathname: str):
-        """ Initialize the vault manager from an existing vault file. """
+    def load_vlt(self, vlt_file_pathname: str, lazy: bool = False, workers: int | None = None, use_index: bool = True):
+        """ Initialize the vault manager from an existing vault file.
+
+        lazy=False reads, verifies and decrypts every frame up front.
+        lazy=True mmaps the vault file and only records where each frame is, frame payloads are read, verified and
+        decrypted when an object is actually requested (see get_obj_data).
+
+        workers > 1 parses and verifies frames in that many worker processes (not used with lazy).
+        workers=None uses dfcc().load_workers for vault files of at least dfcc().parallel_load_min_size bytes.
+
+        use_index=True uses the index sidecar of the vault file (see vlt_index) if there is a valid one, instead of
+        scanning the frames. lazy loads then cost O(index size). parallel loads always scan.
+
+        Virtual file names are rebuilt from the vvfs frames of the file, the latest checkpoint plus the journal after it.
+
+        Loads overlap with the KDF of a new VaultMan (see _start_kdf). Lazy scans need no keys. Eager loads ask the
+        os to read the file ahead, and serial loads read and pre-parse frames (the indexed ones, or the scanned ones)
+        until the keys are there (see _read_frames_ahead and _read_indexed_ahead). The index is read and decoded
+        without the keys, its hmac is checked once they are there. A bad index falls back to a scan.
+        """
 
         if not os.path.exists(vlt_file_pathname):
             raise R3D_IO_Error(f"Vault file {vlt_file_pathname} does not exist.")
 
-        # --- read the vault file and process each frame line
+        oids_before = set(self.mem_os.keys())
+
         with open(vlt_file_pathname, "rb") as fh:
-            for line in fh:
-                try:
-                    self.process_frame_line(line)
-                except Exception as e:
-                    log.warn(repr(e))
-                    continue
+            vlt_head = fh.read(16)
+            if vlt_head:
+                self._frame_fmt = frames.detect_frame_fmt(vlt_head)
+        log.dbg(f"load_vlt: frame format {self._frame_fmt}")
+
+        if not lazy and not self._vks_ready():
+            self._advise_willneed(vlt_file_pathname)
+
+        index, index_data = self._read_index(vlt_file_pathname) if use_index else (None, b'')
+
+        # eager loads verify the index themselves, after reading the indexed frames ahead of the keys
+        if lazy:
+            index = self._verified_index(index, index_data)
+            self._load_vlt_lazy(vlt_file_pathname, index=index)
+        else:
+            index = self._load_vlt_eager(vlt_file_pathname, workers=workers, index=index, index_data=index_data)
+
+        # the replay needs the keys and skips vvfs frames it can't open, a failed KDF is raised here instead
+        _ = self.vks
+        self._replay_vvfs()
+
+        # --- everything that came out of this file is already persisted there (see save_vault append mode).
+        # lazily loaded objects keep their segments in that table from here on, not as CTSegments.
+        self._persisted_pathname = os.path.realpath(vlt_file_pathname)
+        self._index_covered = index["covered"] if index is not None else 0
+        self._persisted_oids = {oid for oid in self.mem_os if oid not in oids_before}
+        self._persisted_segs = SegTable()
+        for oid in self._persisted_oids:
+            mem_obj = self.mem_os[oid]
+            seg_locs = [(ct_seg, ct_seg.fl_offset, ct_seg.fl_length, ct_seg.fl_alts) for ct_seg in mem_obj.ct_segments]
+            try:
+                seg_rows = self._persisted_segs.add_obj(oid, seg_locs)
+            except (OverflowError, TypeError) as e:
+                log.warn(f"Segments of {oid} do not fit a segment table, keeping them as they are: {e!r}")
+                continue
+
+            if lazy:
+                self._use_seg_table(mem_obj, self._persisted_segs, seg_rows)
+
+        if lazy:
+            self._vlt_segs = self._persisted_segs
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def _use_seg_table(self, mem_obj: MemObj, seg_table: SegTable, seg_rows: range):
+        """ Keep the (lazy) segments of mem_obj as seg_rows of seg_table from now on, see MemObj.seg_table. Its entries
+        in the segment store become row numbers. """
+
+        for ct_seg, row in zip(mem_obj.ct_segments, seg_rows):
+            if ct_seg.sid and not ct_seg.is_ref and self.seg_store.get(ct_seg.sid) is ct_seg:
+                self.seg_store[ct_seg.sid] = row
+
+        mem_obj.ct_segments = []
+        mem_obj.seg_table = seg_table
+        mem_obj.seg_rows = seg_rows
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def _obj_segs(self, mem_obj: MemObj) -> list[CTSegment]:
+        """ The segments of mem_obj. Segments kept in a SegTable are made from their rows for the caller, without
+        being kept (the way to walk all objects, mem_obj.ct_segments would keep them). """
+
+        seg_table = mem_obj.seg_table
+        if seg_table is not None:
+            return seg_table.segs(mem_obj.seg_rows)
+
+        return mem_obj.ct_segments
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def _seg_store_get(self, sid: str) -> CTSegment | None:
+        """ The segment holding the payload of sid, None if there is none in the segment store. """
+
+        pl_seg = self.seg_store.get(sid) if sid else None
+        if isinstance(pl_seg, int):
+            return self._vlt_segs.seg(pl_seg)
+
+        return pl_seg
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def _read_index(self, vlt_file_pathname: str) -> tuple[dict | None, bytes]:
+        """ The index of a vault file and its raw data, None if it has none or its index does not decode or is stale.
+        Needs no keys, the index is not verified yet (see _verified_index). """
+
+        try:
+            read = vlt_index.read_index(vlt_file_pathname, self._frame_fmt)
+        except Exception as e:
+            log.warn(f"Ignoring vault index, falling back to a full scan: {e!r}")
+            return None, b''
+
+        if read is None:
+            return None, b''
+
+        index, index_data = read
+        log.dbg(f"_read_index: {len(index['objs'])} objects, covers {index['covered']:_} bytes")
+
+        return index, index_data
+
+    def _verified_index(self, index: dict | None, index_data: bytes) -> dict | None:
+        """ index if its hmac checks out, None otherwise. Waits for the keys. """
+
+        if index is None:
+            return None
+
+        frame_hmac_key = self.vks.frame_hmac_key
+        try:
+            vlt_index.verify_index(index_data, frame_hmac_key=frame_hmac_key)
+        except R3D_V1T_Error as e:
+            log.warn(f"Ignoring vault index, falling back to a full scan: {e!r}")
+            return None
+
+        return index
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def _load_vlt_eager(self, vlt_file_pathname: str, workers: int | None, index: dict | None,
+                        index_data: bytes) -> dict | None:
+        """ Read and verify every frame of the vault file, then decrypt all objects. Return the index if it was valid
+        (see _load_frames_serial), None otherwise. """
+
+        if workers is None:
+            workers = 1
+            if os.path.getsize(vlt_file_pathname) >= dfcc().parallel_load_min_size:
+                workers = dfcc().load_workers
+
+        # --- read the vault file and process each frame. replicas of verified frames are skipped.
+        if workers > 1:
+            self._load_frames_parallel(vlt_file_pathname, workers=workers)
+            index = self._verified_index(index, index_data)
+        else:
+            index = self._load_frames_serial(vlt_file_pathname, index=index, index_data=index_data)
 
         # --- decrypt all segments, construct vault objects in memory
         for mem_obj in self.mem_os.values():
@@ -85,52 +362,249 @@ class VaultMan:
                 log.warn(repr(e))
                 continue
 
+        return index
+
     # --------------------------------------------------------------------------------------------------------------------------
-    def process_frame_line(self, line: bytes):
-        """ Process a single frame line from the vault file and update in mem structures accordingly . """
+    def _load_frames_serial(self, vlt_file_pathname: str, index: dict | None, index_data: bytes) -> dict | None:
+        """ Parse and verify the frames of a vault file one by one, and merge them into mem_os.
+        With an index, the indexed frames are read directly and only the part of the file after it is scanned. The
+        index is verified once the keys are there, the whole file is scanned if it does not verify. Return the index
+        if it did, None otherwise. """
+
+        if os.path.getsize(vlt_file_pathname) == 0:
+            return self._verified_index(index, index_data)
+
+        replica_filter = frames.ReplicaFilter()
+        with open(vlt_file_pathname, "rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            frame_fmt = frames.detect_frame_fmt(mm)
+
+            scan_start = 0
+            if index is not None:
+                indexed = self._read_indexed_ahead(mm, frame_fmt, index)
+                index = self._verified_index(index, index_data)
+                if index is None:
+                    indexed = []
+                else:
+                    scan_start = index["covered"]
+
+                for indexed_seg, pre_parsed in indexed:
+                    try:
+                        ct_seg = self._load_verified_frame(mm, frame_fmt, indexed_seg, pre_parsed=pre_parsed)
+                    except R3D_V1T_Error as e:
+                        # the index does not match the file after all, scan all of it (taken segments stay).
+                        log.warn(repr(e))
+                        scan_start = 0
+                        continue
+
+                    if replica_filter.take_seg(ct_seg):
+                        self._add_frame(ct_seg)
+
+            for pos, frame, pre_parsed in self._read_frames_ahead(mm, scan_start, frame_fmt):
+                if replica_filter.skip_replica(frame, pos):
+                    continue
 
-        fields = line.strip().split(b'|')
-        if len(fields) != 2:
-            raise R3D_V1T_Error(f"Invalid frame line @ line starting with: {line[:16]}")
+                try:
+                    if pre_parsed is not None:
+                        ct_seg = frames.verify_frame(pre_parsed, frame_fmt, self.vks.frame_hmac_key)
+                    else:
+                        ct_seg = frames.parse_frame(frame, frame_fmt, self.vks.frame_hmac_key)
+                except Exception as e:
+                    log.warn(repr(e))
+                    continue
 
-        meta_dict_b64 = fields[0]
-        ct_chunk_b64 = fields[1]
+                ct_seg.fl_offset = pos
+                ct_seg.fl_length = len(frame)
+                replica_filter.mark_verified(frame, ct_seg)
+                if replica_filter.take_seg(ct_seg):
+                    self._add_frame(ct_seg)
 
-        # --- decode meta dict
-        meta_dict = {}
-        try:
-            meta_dict = json.loads(b64.urlsafe_b64decode(meta_dict_b64).decode("utf-8"))
-        except Exception as e:
-            raise R3D_V1T_Error(f"Invalid frame: meta_dict does not decode @ Line starting with: {line[:16]}")
-
-        # --- check frame hmac
-        if 'h' not in meta_dict:
-            raise R3D_V1T_Error(f"Invalid frame: no hmac in meta_dict @ Line starting with: {line[:16]}")
-
-        frame_hmac = meta_dict['h']
-        meta_dict.pop('h', None)  # remove hmac from meta_dict for hmac calculation
-
-        frame_hmac_msg = json.dumps(meta_dict).encode("ascii") + ct_chunk_b64
-        recomputed_hmac = hmac.new(key=self.vks.frame_hmac_key, msg=frame_hmac_msg, digestmod=hashlib.sha3_256).hexdigest()
-        if frame_hmac != recomputed_hmac:
-            raise R3D_V1T_Error(f"Invalid frame: hmac mismatch @ Line starting with: {line[:16]}")
-
-        # --- create segment object
-        ct_seg = CTSegment()
-        ct_seg.idx = meta_dict['i']
-        ct_seg.parent_obj_id = meta_dict['o']
-        ct_seg.ct_chunk_b64 = ct_chunk_b64
-
-        if RVKryptMode.CHACHA20_POLY1305.value in meta_dict:
-            ct_seg.km = RVKryptMode.CHACHA20_POLY1305
-            ct_seg.km_data = meta_dict[RVKryptMode.CHACHA20_POLY1305.value]
-        elif RVKryptMode.FERNET.value in meta_dict:
-            ct_seg.km = RVKryptMode.FERNET
-            ct_seg.km_data = meta_dict[RVKryptMode.FERNET.value]
+        return index
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def _read_indexed_ahead(self, mm: mmap.mmap, frame_fmt: RVFrameFmt,
+                            index: dict) -> list[tuple[CTSegment | VVFSFrame, tuple | None]]:
+        """ (indexed segment or vvfs frame, pre_parsed) for every frame listed in index. Like _read_frames_ahead: while
+        the KDF is running their primary copies are read and pre-parsed, up to dfcc().kdf_read_ahead bytes.
+        pre_parsed is None for frames that were not pre-parsed (or did not pre-parse). """
+
+        indexed = [vlt_index.index_entry_seg(oid, entry) for oid, entries in index["objs"].items() for entry in entries]
+        indexed += [vlt_index.vvfs_entry_frame(entry) for entry in index["vvfs"]]
+
+        read_ahead = []
+        read_ahead_size = 0
+        for indexed_seg in indexed:
+            if self._vks_ready() or read_ahead_size >= dfcc().kdf_read_ahead:
+                break
+
+            frame = mm[indexed_seg.fl_offset:indexed_seg.fl_offset + indexed_seg.fl_length]
+            try:
+                pre_parsed = frames.pre_parse_frame(frame, frame_fmt)
+            except Exception:
+                pre_parsed = None
+
+            read_ahead.append((indexed_seg, pre_parsed))
+            read_ahead_size += indexed_seg.fl_length
+
+        log.dbg(f"_read_indexed_ahead: {len(read_ahead)} frames ({read_ahead_size:_} bytes) read ahead of the keys")
+
+        return read_ahead + [(indexed_seg, None) for indexed_seg in indexed[len(read_ahead):]]
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def _read_frames_ahead(self, mm: mmap.mmap, start: int,
+                           frame_fmt: RVFrameFmt) -> Iterable[tuple[int, bytes, tuple | None]]:
+        """ Yield (fl_offset, frame, pre_parsed) for the frames from start on, in file order. While the KDF is running
+        frames are read and pre-parsed (frames.pre_parse_frame) ahead, up to dfcc().kdf_read_ahead bytes, and yielded
+        once the keys are there. pre_parsed is None for frames that were not pre-parsed (or did not pre-parse). """
+
+        spans = frames.iter_frame_spans(mm, start, len(mm), frame_fmt)
+
+        read_ahead = []
+        read_ahead_size = 0
+        prev_frame, prev_pre_parsed = b'', None
+        for pos, length in spans:
+            if self._vks_ready() or read_ahead_size >= dfcc().kdf_read_ahead:
+                yield from read_ahead
+                yield pos, mm[pos:pos + length], None
+                break
+
+            frame = mm[pos:pos + length]
+
+            # replicas are usually back to back, they share the pre-parse of the frame before them
+            if frame != prev_frame:
+                try:
+                    prev_pre_parsed = frames.pre_parse_frame(frame, frame_fmt)
+                except Exception:
+                    prev_pre_parsed = None
+                prev_frame = frame
+
+            read_ahead.append((pos, frame, prev_pre_parsed))
+            read_ahead_size += length
         else:
-            raise R3D_V1T_Error(f"Invalid frame: unknown krypt mode @ Line starting with: {line[:16]}")
+            yield from read_ahead
+
+        log.dbg(f"_read_frames_ahead: {len(read_ahead)} frames ({read_ahead_size:_} bytes) read ahead of the keys")
+
+        for pos, length in spans:
+            yield pos, mm[pos:pos + length], None
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def _advise_willneed(vlt_file_pathname: str):
+        """ Ask the os to start reading the vault file into the page cache, where it has posix_fadvise. """
+
+        if not hasattr(os, 'posix_fadvise'):
+            return
+
+        try:
+            fd = os.open(vlt_file_pathname, os.O_RDONLY)
+        except OSError:
+            return
+
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def _load_frames_parallel(self, vlt_file_pathname: str, workers: int):
+        """ Parse and verify the frame lines of a vault file in worker processes, and merge the results into mem_os.
+
+        The file is split into frame aligned byte ranges. results are merged in range order, so mem_os ends up
+        exactly as it would with the serial loader.
+        """
+
+        # a few ranges per worker keeps all workers busy even if ranges take uneven time to verify
+        ranges = frames.split_vlt_file(vlt_file_pathname, n_parts=workers * 4)
+        log.dbg(f"_load_frames_parallel: {len(ranges)} ranges, {workers} workers")
+
+        # replicas within a range are skipped by the workers, this catches the ones that straddle range boundaries.
+        replica_filter = frames.ReplicaFilter()
+
+        frame_hmac_key = self.vks.frame_hmac_key
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(frames.parse_frame_range, vlt_file_pathname, start, end, frame_hmac_key)
+                for start, end in ranges
+            ]
+
+            for future in futures:
+                ct_segs, errors = future.result()
+                for error in errors:
+                    log.warn(error)
+                for ct_seg in ct_segs:
+                    if replica_filter.take_seg(ct_seg):
+                        self._add_frame(ct_seg)
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def _load_vlt_lazy(self, vlt_file_pathname: str, index: dict | None):
+        """ mmap the vault file and index its frames by offset. only the frame meta data is decoded here.
+        With an index, segments come straight from the index and only the part of the file after it is scanned. """
+
+        if self._vlt_mm is not None:
+            raise R3D_V1T_Error("load_vlt: this VaultMan already has a lazily loaded vault file.")
+
+        fh = open(vlt_file_pathname, "rb")
+        if os.fstat(fh.fileno()).st_size == 0:
+            fh.close()
+            return
+
+        self._vlt_fh = fh
+        self._vlt_mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+        # later copies of a (oid, idx) become fallback replicas of the first one seen
+        replica_filter = frames.ReplicaFilter()
+
+        mm = self._vlt_mm
+        self._vlt_mm_fmt = frames.detect_frame_fmt(mm)
+
+        scan_start = 0
+        if index is not None:
+            for oid, entries in index["objs"].items():
+                for entry in entries:
+                    ct_seg = vlt_index.index_entry_seg(oid, entry)
+                    if replica_filter.take_seg(ct_seg):
+                        self._add_ct_seg(ct_seg)
+
+            # vvfs frames are verified when they are replayed
+            for entry in index["vvfs"]:
+                vvfs_frame = vlt_index.vvfs_entry_frame(entry)
+                if replica_filter.take_seg(vvfs_frame):
+                    self._add_frame(vvfs_frame)
+            scan_start = index["covered"]
+
+        # --- only the meta part of each frame is copied out of the mmap
+        for pos, length in frames.iter_frame_spans(mm, scan_start, len(mm), self._vlt_mm_fmt):
+            try:
+                ct_seg = frames.parse_frame_meta(mm, pos, length, self._vlt_mm_fmt)
+            except Exception as e:
+                log.warn(repr(e))
+                continue
+
+            ct_seg.fl_offset = pos
+            ct_seg.fl_length = length
+            if replica_filter.take_seg(ct_seg):
+                self._add_frame(ct_seg)
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def _add_frame(self, ct_seg: CTSegment | VVFSFrame):
+        """ Add what a frame of the vault file parsed to, a segment (see _add_ct_seg) or a vvfs frame. """
+
+        if isinstance(ct_seg, VVFSFrame):
+            self._loaded_vvfs.append(ct_seg)
+            return
+
+        self._add_ct_seg(ct_seg)
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def _add_ct_seg(self, ct_seg: CTSegment):
+        """ Add a segment to the mem_obj it belongs to, create the mem_obj if needed. Segments with a payload and a sid
+        go to the segment store too, the first one seen for a sid is the one references resolve to. """
+
+        if ct_seg.sid and not ct_seg.is_ref:
+            self.seg_store.setdefault(ct_seg.sid, ct_seg)
 
-        # --- create or update vault object
         if ct_seg.parent_obj_id not in self.mem_os:
             mem_obj = MemObj()
             mem_obj.obj_id = ct_seg.parent_obj_id
@@ -140,53 +614,330 @@ class VaultMan:
             mem_obj = self.mem_os[ct_seg.parent_obj_id]
             mem_obj.ct_segments.append(ct_seg)
 
+    # --------------------------------------------------------------------------------------------------------------------------
+    def parse_frame_line(self, line: bytes) -> CTSegment | VVFSFrame:
+        """ Parse and verify a single frame line from the vault file. Raise R3D_V1T_Error if the frame is invalid. """
+
+        return frames.parse_frame_line(line, frame_hmac_key=self.vks.frame_hmac_key)
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def process_frame_line(self, line: bytes):
+        """ Process a single frame line from the vault file and update in mem structures accordingly . """
+
+        self._add_frame(self.parse_frame_line(line))
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def _payload_seg(self, ct_seg: CTSegment) -> CTSegment:
+        """ The segment holding the payload of ct_seg, ct_seg itself unless its a segment reference. """
+
+        if not ct_seg.is_ref:
+            return ct_seg
+
+        pl_seg = self._seg_store_get(ct_seg.sid)
+        if pl_seg is None:
+            raise R3D_V1T_Error(f"Segment of {ct_seg.parent_obj_id} @ idx={ct_seg.idx} references sid='{ct_seg.sid}', "
+                                f"which is not in the segment store.")
+
+        return pl_seg
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def _load_ct_chunk(self, ct_seg: CTSegment) -> bytes:
+        """ Get the raw ciphertext of a segment. Staged segments are read back from the staging file, lazily loaded
+        segments are read back from the vault file and verified. """
+
+        if ct_seg.ct_chunk:
+            return ct_seg.ct_chunk
+
+        if ct_seg.ct_chunk_b64:
+            return b64.urlsafe_b64decode(ct_seg.ct_chunk_b64)
+
+        if ct_seg.stg_offset >= 0:
+            if self._stg_fh is None:
+                raise R3D_IO_Error(f"Staged segment of {ct_seg.parent_obj_id} can not be read, staging file is closed.")
+            return os.pread(self._stg_fh.fileno(), ct_seg.stg_length, ct_seg.stg_offset)
+
+        if ct_seg.fl_offset >= 0:
+            verified_seg = self._load_lazy_frame(ct_seg)
+            if verified_seg.ct_chunk:
+                return verified_seg.ct_chunk
+            return b64.urlsafe_b64decode(verified_seg.ct_chunk_b64)
+
+        return b''
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def _load_ct_chunk_b64(self, ct_seg: CTSegment) -> bytes:
+        """ Get the b64 ciphertext of a segment (the psv frame payload). """
+
+        if ct_seg.ct_chunk_b64:
+            return ct_seg.ct_chunk_b64
+
+        if ct_seg.fl_offset >= 0 and self._vlt_mm_fmt == RVFrameFmt.PSV:
+            return self._load_lazy_frame(ct_seg).ct_chunk_b64
+
+        return b64.urlsafe_b64encode(self._load_ct_chunk(ct_seg))
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def _load_lazy_frame(self, ct_seg: CTSegment) -> CTSegment:
+        """ Read the frame of a lazily loaded segment back from the vault file, verify it and return the verified
+        segment (with its payload). """
+
+        if self._vlt_mm is None:
+            raise R3D_IO_Error(f"Lazy segment of {ct_seg.parent_obj_id} can not be read, vault file is closed.")
+
+        return self._load_verified_frame(self._vlt_mm, self._vlt_mm_fmt, ct_seg)
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def _load_verified_frame(self, buf: bytes | mmap.mmap, frame_fmt: RVFrameFmt, ct_seg: CTSegment | VVFSFrame,
+                             pre_parsed: tuple | None = None) -> CTSegment | VVFSFrame:
+        """ Read the frame of a segment (or vvfs frame) whose meta data is already known (lazy or indexed) from buf,
+        verify it and return the verified segment (with its payload). The primary copy is tried first, then its
+        replicas. pre_parsed is the primary copy already through frames.pre_parse_frame, if it is. """
+
+        fl_locs = [(ct_seg.fl_offset, ct_seg.fl_length)] + (ct_seg.fl_alts or [])
+        last_error = None
+        for fl_offset, fl_length in fl_locs:
+            try:
+                verified_seg = self._load_frame_copy(buf, frame_fmt, ct_seg, fl_offset, fl_length, pre_parsed=pre_parsed)
+            except R3D_V1T_Error as e:
+                log.warn(f"Frame @ offset {fl_offset} failed verification: {e!r}")
+                last_error = e
+                pre_parsed = None
+                continue
+
+            verified_seg.fl_offset = ct_seg.fl_offset
+            verified_seg.fl_length = ct_seg.fl_length
+            verified_seg.fl_alts = ct_seg.fl_alts
+            return verified_seg
+
+        raise last_error
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def _load_frame_copy(self, buf: bytes | mmap.mmap, frame_fmt: RVFrameFmt, ct_seg: CTSegment | VVFSFrame,
+                         fl_offset: int, fl_length: int, pre_parsed: tuple | None = None) -> CTSegment | VVFSFrame:
+        """ Read one copy of the frame of a segment from buf (unless it is pre_parsed already), verify it and return the
+        verified segment. """
+
+        if pre_parsed is not None:
+            verified_seg = frames.verify_frame(pre_parsed, frame_fmt, self.vks.frame_hmac_key)
+        else:
+            frame = buf[fl_offset:fl_offset + fl_length]
+            verified_seg = frames.parse_frame(frame, frame_fmt, self.vks.frame_hmac_key)
+
+        # the meta data recorded at load time may not be authenticated, make sure it matches the verified frame.
+        if type(verified_seg) is not type(ct_seg) or verified_seg.km != ct_seg.km or verified_seg.km_data != ct_seg.km_data:
+            raise R3D_V1T_Error(f"Frame @ offset {fl_offset} does not match the meta data recorded for it")
+
+        if isinstance(ct_seg, VVFSFrame):
+            if verified_seg.seq != ct_seg.seq or verified_seg.is_checkpoint != ct_seg.is_checkpoint:
+                raise R3D_V1T_Error(f"vvfs frame does not match its verified frame @ offset {fl_offset}")
+        elif verified_seg.idx != ct_seg.idx or verified_seg.parent_obj_id != ct_seg.parent_obj_id or \
+                verified_seg.sid != ct_seg.sid or verified_seg.is_ref != ct_seg.is_ref:
+            raise R3D_V1T_Error(f"Segment does not match its verified frame @ offset {fl_offset}")
+
+        return verified_seg
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def _decrypt_obj_data(self, mem_obj: MemObj) -> bytes:
+        """ Decrypt a mem_obj using the vault keys and return its plaintext, mem_obj is not modified. """
+
+        # --- segments in offset order. copies of a segment (same idx and sid) are decrypted once.
+        ct_segs: list[CTSegment] = []
+        for ct_seg in sorted(self._obj_segs(mem_obj), key=lambda seg: seg.idx):
+            if ct_segs and ct_seg.sid and (ct_seg.idx, ct_seg.sid) == (ct_segs[-1].idx, ct_segs[-1].sid):
+                continue
+            ct_segs.append(ct_seg)
+
+        # --- decrypt all segments (thread pooled), z_chunks and pt_chunks line up with ct_segs
+        pl_segs, ct_chunks = self._load_payloads(ct_segs)
+        z_chunks = seg_krypt.decrypt_chunks(self.vks.sgk_chacha20, ct_chunks)
+        pt_chunks = [compression.decompress_chunk(pl_seg.km_data, z_chunk) for pl_seg, z_chunk in zip(pl_segs, z_chunks)]
+
+        # --- construct the full file in memory.
+        # b''.join sizes the result from the chunks and copies each chunk once, straight into the bytes returned.
+        # (a preallocated bytearray would take another copy to turn it into bytes.)
+        used = self._check_extents(mem_obj.obj_id, ct_segs, pt_chunks)
+        self._set_z_stats(mem_obj, [(ct_segs[k], pt_chunks[k], z_chunks[k]) for k in used])
+
+        return b''.join([pt_chunks[k] for k in used])
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def _check_extents(obj_id: str, ct_segs: list[CTSegment], pt_chunks: list[bytes]) -> list[int]:
+        """ Check that the plaintext chunks of an object (ct_segs in offset order) cover it without gaps or overlaps,
+        raise R3D_V1T_Error if not (instead of returning zero filled or mixed up data). Return the positions of the
+        chunks that make up the object, copies of a segment are left out. """
+
+        used: list[int] = []
+        pos = 0
+
+        for k, (ct_seg, pt_chunk) in enumerate(zip(ct_segs, pt_chunks)):
+            if ct_seg.idx > pos:
+                raise R3D_V1T_Error(f"Error decrypting {obj_id}: no segment covers bytes {pos} to {ct_seg.idx}.")
+
+            if ct_seg.idx < pos:
+                # a copy of the segment before it (e.g. a replica without sid) is dropped, anything else is corrupt
+                prev = used[-1]
+                if ct_seg.idx == ct_segs[prev].idx and pt_chunk == pt_chunks[prev]:
+                    continue
+                raise R3D_V1T_Error(f"Error decrypting {obj_id}: segment at {ct_seg.idx} overlaps the one before it, "
+                                    f"which ends at {pos}.")
+
+            used.append(k)
+            pos += len(pt_chunk)
+
+        return used
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def _load_payloads(self, ct_segs: list[CTSegment]) -> tuple[list[CTSegment], list[bytes]]:
+        """ Get the ciphertexts of ct_segs. Return the payload segments (segment references are decrypted from the
+        segment they point to) and their ct_chunks, both line up with ct_segs. """
+
+        pl_segs = [self._payload_seg(ct_seg) for ct_seg in ct_segs]
+
+        for pl_seg in pl_segs:
+            if pl_seg.km != RVKryptMode.CHACHA20_POLY1305:
+                raise R3D_V1T_Error(f"Error decrypting segment: Unknown krypt mode in segment: {pl_seg}")
+
+        return pl_segs, [self._load_ct_chunk(pl_seg) for pl_seg in pl_segs]
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def _open_segments(self, ct_segs: list[CTSegment]) -> list[bytes]:
+        """ Decrypt and decompress some segments of an object, without touching the rest of it (see ObjReader). """
+
+        pl_segs, ct_chunks = self._load_payloads(ct_segs)
+        z_chunks = seg_krypt.decrypt_chunks(self.vks.sgk_chacha20, ct_chunks)
+
+        return [compression.decompress_chunk(pl_seg.km_data, z_chunk) for pl_seg, z_chunk in zip(pl_segs, z_chunks)]
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def _set_z_stats(mem_obj: MemObj, seg_chunks: list[tuple[CTSegment, bytes, bytes]]):
+        """ Update the compression stats of mem_obj from its decrypted (ct_seg, pt_chunk, z_chunk)s. """
+
+        mem_obj.z_codec = ''
+        mem_obj.pt_len = 0
+        mem_obj.z_len = 0
+        for ct_seg, pt_chunk, z_chunk in seg_chunks:
+            if ct_seg.is_ref:
+                continue
+            if compression.KM_DATA_KEY in ct_seg.km_data:
+                mem_obj.z_codec = ct_seg.km_data[compression.KM_DATA_KEY]
+            mem_obj.pt_len += len(pt_chunk)
+            mem_obj.z_len += len(z_chunk)
+
     # --------------------------------------------------------------------------------------------------------------------------
     def decrypt_mem_obj(self, mem_obj: MemObj):
         """ Decrypt a mem_obj using the vault keys and update in memory structures (pt_data). """
 
-        if mem_obj.ct_segments is None:
-            raise R3D_IO_Error("mem_obj has no ciphertext segments to decrypt.")
-
-        # --- construct the full file in memory
-        temp_fh = io.BytesIO()
-
-        for ct_seg in mem_obj.ct_segments:
-            if ct_seg.km == RVKryptMode.CHACHA20_POLY1305:
-                ct_chunk = b64.urlsafe_b64decode(ct_seg.ct_chunk_b64)
-                # TODO decrypt this chunk using the vault key
-                # box = SecretBox(self.vks.sgk_chacha20)
-                # decrypted_ct_chunk = box.decrypt(ct_chunk)
-                # temp_fh.write(decrypted_ct_chunk)
-                temp_fh.seek(ct_seg.idx)
-                temp_fh.write(ct_chunk)
-            else:
-                raise R3D_V1T_Error(f"Error decrypting segment: Unknown krypt mode in segment: {ct_seg}")
-
-        mem_obj.pt_data = temp_fh.getvalue()
-        temp_fh.close()
+        mem_obj.pt_data = self._decrypt_obj_data(mem_obj)
+        self.pt_cache.admit(mem_obj)
 
         # dont clear the ct_segments, they are needed for saving the vault later
 
     # --------------------------------------------------------------------------------------------------------------------------
-    def xtract_vlt_to_path(self, xtraction_path: str):
-        """ Extract the vault contents to the specified path. """
+    def get_obj_data(self, obj_id: str) -> bytes:
+        """ Get the plaintext of a vault object, decrypting it first if needed. """
+
+        if obj_id not in self.mem_os:
+            raise R3D_V1T_Error(f"get_obj_data: obj_id='{obj_id}' not found.")
+
+        # hold on to the data, admitting it to pt_cache may evict it from mem_obj right away
+        mem_obj = self.mem_os[obj_id]
+        pt_data = mem_obj.pt_data
+        if pt_data is not None:
+            self.pt_cache.hit(mem_obj)
+            return pt_data
+
+        self.pt_cache.miss()
+        pt_data = self._decrypt_obj_data(mem_obj)
+        mem_obj.pt_data = pt_data
+        self.pt_cache.admit(mem_obj)
+
+        return pt_data
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def cache_stats(self) -> dict[str, int | None]:
+        """ Decrypted data cache stats, see PTCache.stats(). """
+
+        return self.pt_cache.stats()
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def open(self, virt_name: str) -> ObjReader:
+        """ Open the object behind virt_name for reading, as a seekable binary file object. Only the segments that
+        are actually read get decrypted. """
+
+        return self.open_obj(self.vv_fs.get_oid(VirtualFile(pname=virt_name)))
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def open_obj(self, obj_id: str) -> ObjReader:
+        """ Open a vault object for reading by obj_id, see open(). """
+
+        if obj_id not in self.mem_os:
+            raise R3D_V1T_Error(f"open_obj: obj_id='{obj_id}' not found.")
+
+        return ObjReader(self, self.mem_os[obj_id])
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def xtract_vlt_to_path(self, xtraction_path: str, workers: int | None = None,
+                           virt_dir: str | None = None) -> dict[str, int]:
+        """ Extract the vault contents to the specified path. Return the ObjXtractor stats (files written, linked and
+        skipped, objects that failed and were left out).
+
+        Objects are extracted under their vvfs names. An object with several names is written once, the other names are
+        hardlinks to it. Objects without a name (not in the vvfs) are extracted as their obj_id.
+        virt_dir extracts only the virtual files under that vvfs directory (still under their full names), the rest of
+        the vault is not visited.
+        Files already there with the same content (size and keyed fingerprint) are kept, re-extracting a vault only
+        writes what changed.
+
+        Objects are streamed to their files segment by segment on a pool of worker threads (see xtract.ObjXtractor),
+        they are not decrypted into memory. workers=None uses dfcc().krypt_workers.
+        """
 
         if not os.path.exists(xtraction_path):
             os.makedirs(xtraction_path, exist_ok=True)
 
-        for mem_obj in self.mem_os.values():
-            if mem_obj.pt_data is None:
-                log.info(f"Vault object {mem_obj.obj_id} has no plaintext data to xtract.")
-                continue
+        if virt_dir is None:
+            mem_objs = self.mem_os.values()
+            names = self.vv_fs.oid_to_vf
+        else:
+            names = {}
+            for pname in self.vv_fs.iter_pnames(virt_dir):
+                names.setdefault(self.vv_fs.pname_to_oid[pname], []).append(VirtualFile(pname=pname))
+            mem_objs = [self.mem_os[oid] for oid in names if oid in self.mem_os]
 
-            try:
-                output_file_path = os.path.join(xtraction_path, mem_obj.obj_id)
-                with open(output_file_path, "wb") as fh:
-                    fh.write(mem_obj.pt_data)
-                    fh.flush()
-            except Exception as e:
-                log.warn(f"Error extracting vault object {mem_obj.obj_id}: {e}")
-                continue
+        xtractor = ObjXtractor(self, workers=workers)
+        for mem_obj in mem_objs:
+            out_pathnames = []
+            for vf in names.get(mem_obj.obj_id, []):
+                out_pathname = self._xtraction_pathname(xtraction_path, vf)
+                if out_pathname is not None:
+                    out_pathnames.append(out_pathname)
+
+            if not names.get(mem_obj.obj_id):
+                out_pathnames.append(os.path.join(xtraction_path, mem_obj.obj_id))
+
+            if out_pathnames:
+                xtractor.add(mem_obj, out_pathnames)
+
+        for obj_id, e in xtractor.run().items():
+            log.warn(f"Error extracting vault object {obj_id}: {e}")
+
+        log.info(f"xtract_vlt_to_path: {xtractor.stats}")
+        return xtractor.stats
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def _xtraction_pathname(xtraction_path: str, vf: VirtualFile) -> str | None:
+        """ Path a virtual file is extracted to, under xtraction_path. None (and a warning) for names that would end up
+        outside of it. """
+
+        pname = vf.pname.lstrip("/")
+        if pname in ("", ".") or ".." in pname.split("/"):
+            log.warn(f"xtract_vlt_to_path: not extracting '{vf.pname}', it is outside of the extraction path.")
+            return None
+
+        return os.path.join(xtraction_path, *pname.split("/"))
 
     # --------------------------------------------------------------------------------------------------------------------------
     # --------------------------------------------------------------------------------------------------------------------------
@@ -214,12 +965,82 @@ class VaultMan:
         # its the hmac_sha3_384 of pt_data using the key in self.vks.osfp_key
         mobj.obj_id = hmac.new(key=self.vks.osfp_key, msg=pt_data, digestmod=hashlib.sha3_384).hexdigest()
 
-        self.mem_os[mobj.obj_id] = mobj
-        self.encrypt_mem_obj(mobj)
+        # --- same content is already in the vault, only the vvfs needs updating.
+        # (replacing the mem_obj would drop segments that other objects may reference.)
+        if mobj.obj_id not in self.mem_os:
+            self.mem_os[mobj.obj_id] = mobj
+            self.encrypt_mem_obj(mobj)
+            self.pt_cache.admit(mobj)
 
         # --- update the vvfs
         self.vv_fs.link_vf(vf=VirtualFile(pname=virt_name), oid=mobj.obj_id)
 
+    # --------------------------------------------------------------------------------------------------------------------------
+    def new_obj_writer(self) -> ObjWriter:
+        """ Start writing an object into the vault in pieces, see ObjWriter. """
+
+        return ObjWriter(self)
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def put_stream(self, src: BinaryIO | Iterable[bytes], virt_name: str) -> str:
+        """ Upsert object into the vault from a binary file object or an iterable of bytes, with bounded memory.
+        Return the obj_id. """
+
+        obj_writer = self.new_obj_writer()
+
+        if hasattr(src, "read"):
+            read_size = dfcc().default_chunk_size * dfcc().krypt_batch_size
+            while True:
+                data = src.read(read_size)
+                if not data:
+                    break
+                obj_writer.write(data)
+        else:
+            for data in src:
+                if not isinstance(data, (bytes, bytearray, memoryview)):
+                    raise R3D_V1T_Error("put_stream: src must yield bytes.")
+                obj_writer.write(data)
+
+        return obj_writer.finish(virt_name)
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def put_path(self, src_pathname: str, virt_name: str) -> str:
+        """ Upsert the file at src_pathname into the vault, with bounded memory. Return the obj_id. """
+
+        if not os.path.isfile(src_pathname):
+            raise R3D_IO_Error(f"put_path: {src_pathname} is not a file.")
+
+        with open(src_pathname, "rb") as fh:
+            return self.put_stream(fh, virt_name=virt_name)
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def _stage_ct_chunk(self, ct_chunk: bytes) -> int:
+        """ Append a segment ciphertext to the staging file, return its offset there. """
+
+        with self._stg_lock:
+            if self._stg_fh is None:
+                self._stg_fh = tempfile.TemporaryFile(prefix="r3dv1t_stg_")
+                self._stg_size = 0
+
+            stg_offset = self._stg_size
+            os.pwrite(self._stg_fh.fileno(), ct_chunk, stg_offset)
+            self._stg_size += len(ct_chunk)
+
+        return stg_offset
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def _unstage(self, stg_start: int, stg_end: int):
+        """ Drop the staged payloads in [stg_start, stg_end) of the staging file.
+        The space is only given back if nothing was staged after it, otherwise its left as garbage until close. """
+
+        if stg_start < 0 or self._stg_fh is None:
+            return
+
+        with self._stg_lock:
+            if stg_end == self._stg_size:
+                self._stg_size = stg_start
+                self._stg_fh.truncate(stg_start)
+
     # --------------------------------------------------------------------------------------------------------------------------
     def encrypt_mem_obj(self, mem_obj: MemObj):
         """ Encrypt the vault object using the vault key. """
@@ -227,25 +1048,175 @@ class VaultMan:
         if mem_obj.pt_data is None:
             raise R3D_IO_Error("Vault object has no plaintext data to encrypt.")
 
-        chunk_size = dfcc().default_chunk_size
+        if self._new_segment_krypt_mode == RVKryptMode.FERNET:
+            raise NotImplementedError("Fernet encryption is not implemented yet.")
+        elif self._new_segment_krypt_mode != RVKryptMode.CHACHA20_POLY1305:
+            raise R3D_V1T_Error(f"Unknown krypt mode: {self._new_segment_krypt_mode}")
+
+        # --- cut the object into chunks
+        offsets = []
+        pt_chunks = []
+        offset = 0
+        for chunk_len in chunker.make_chunker().split(mem_obj.pt_data, final=True):
+            offsets.append(offset)
+            pt_chunks.append(mem_obj.pt_data[offset:offset + chunk_len])
+            offset += chunk_len
+
+        # --- compress (if worth it) and encrypt all chunks that are not in the segment store yet
+        z_codec = self._pick_compression(pt_chunks)
+        own_segs: dict[str, CTSegment] = {}
+        ct_segments, pt_len, z_len = self._make_segments(offsets, pt_chunks, z_codec, own_segs=own_segs, stage=False)
+
+        for ct_seg in ct_segments:
+            ct_seg.parent_obj_id = mem_obj.obj_id
+
+        mem_obj.ct_segments.extend(ct_segments)
+        mem_obj.z_codec = z_codec or ''
+        mem_obj.pt_len = pt_len
+        mem_obj.z_len = z_len
+
+        self._register_segments(own_segs)
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def _pick_compression(self, pt_chunks: list[bytes]) -> str | None:
+        """ Decide on the compression codec for an object from (a sample of) its chunks. None means no compression. """
+
+        z_codec = dfcc().compression
+        if z_codec is None:
+            return None
+
+        if not compression.worth_compressing(z_codec, pt_chunks):
+            log.dbg(f"_pick_compression: sample does not compress with {z_codec}, storing as is.")
+            return None
+
+        return z_codec
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def _seal_chunks(self, pt_chunks: list[bytes], z_codec: str | None) -> list[tuple[bytes, dict, int]]:
+        """ Compress (if z_codec) and encrypt plaintext chunks. Return (ct_chunk, km_data, z_len) per chunk. """
+
+        if z_codec is None:
+            z_chunks = [(pt_chunk, False) for pt_chunk in pt_chunks]
+        else:
+            z_chunks = compression.compress_chunks(z_codec, pt_chunks)
+
+        ct_chunks = seg_krypt.encrypt_chunks(self.vks.sgk_chacha20, [z_chunk for z_chunk, _ in z_chunks])
+
+        sealed_chunks = []
+        for ct_chunk, (z_chunk, compressed) in zip(ct_chunks, z_chunks):
+            km_data = {compression.KM_DATA_KEY: z_codec} if compressed else {}
+            sealed_chunks.append((ct_chunk, km_data, len(z_chunk)))
+
+        return sealed_chunks
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def _chunk_sids(self, pt_chunks: list[bytes]) -> list[str]:
+        """ Segment ids of plaintext chunks, the hmac_sha3_256 of each chunk using the key in self.vks.ssfp_key """
+
+        return [hmac.new(key=self.vks.ssfp_key, msg=pt_chunk, digestmod=hashlib.sha3_256).hexdigest() for pt_chunk in pt_chunks]
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def _make_segments(self, offsets: list[int], pt_chunks: list[bytes], z_codec: str | None,
+                       own_segs: dict[str, CTSegment], stage: bool) -> tuple[list[CTSegment], int, int]:
+        """ Make the segments of (part of) an object from its chunks at offsets. Return the segments, and the plaintext
+        and compressed bytes of the segments that were sealed (the compression stats).
+
+        With dfcc().dedup, chunks already in the segment store, or in own_segs (sid -> new segments of this object so
+        far), become segment references and are not encrypted again. new segments are added to own_segs, they go to
+        the segment store once their object is in the vault (see _register_segments).
+        stage=True puts the ciphertext of new segments in the staging file instead of memory.
+        parent_obj_id is left for the caller to fill in.
+        """
+
+        sids = self._chunk_sids(pt_chunks) if dfcc().dedup else [''] * len(pt_chunks)
+
+        # --- find the chunks that need sealing, the first of each sid not stored yet
+        seal_at = {}
+        for k, sid in enumerate(sids):
+            if sid and (sid in self.seg_store or sid in own_segs or sid in seal_at):
+                continue
+            seal_at[sid or k] = k
 
-        for i in range(0, len(mem_obj.pt_data), chunk_size):
-            pt_chunk = mem_obj.pt_data[i:i + chunk_size]
+        seal_ks = list(seal_at.values())
+        sealed_chunks = dict(zip(seal_ks, self._seal_chunks([pt_chunks[k] for k in seal_ks], z_codec=z_codec)))
 
+        ct_segments = []
+        pt_len = 0
+        z_len = 0
+        for k, (offset, sid) in enumerate(zip(offsets, sids)):
             ct_seg = CTSegment()
-            ct_seg.idx = i
-            ct_seg.ct_chunk_b64 = b64.urlsafe_b64encode(pt_chunk)  # TODO encrypt this chunk using the vault key
-            ct_seg.parent_obj_id = mem_obj.obj_id
+            ct_seg.idx = offset
+            ct_seg.sid = sid
+
+            if k not in sealed_chunks:
+                ct_seg.is_ref = True
+                ct_segments.append(ct_seg)
+                continue
+
+            ct_chunk, km_data, seg_z_len = sealed_chunks[k]
             ct_seg.km = self._new_segment_krypt_mode
-            if ct_seg.km == RVKryptMode.CHACHA20_POLY1305:
-                ct_seg.km_data = {}  # TODO
-            elif ct_seg.km == RVKryptMode.FERNET:
-                # ct_seg.km_data = {}
-                raise NotImplementedError("Fernet encryption is not implemented yet.")
+            ct_seg.km_data = km_data
+            if stage:
+                ct_seg.stg_offset = self._stage_ct_chunk(ct_chunk)
+                ct_seg.stg_length = len(ct_chunk)
             else:
-                raise R3D_V1T_Error(f"Unknown krypt mode: {ct_seg.km}")
+                ct_seg.ct_chunk = ct_chunk
 
-            mem_obj.ct_segments.append(ct_seg)
+            if sid:
+                own_segs[sid] = ct_seg
+            ct_segments.append(ct_seg)
+            pt_len += len(pt_chunks[k])
+            z_len += seg_z_len
+
+        return ct_segments, pt_len, z_len
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def _register_segments(self, own_segs: dict[str, CTSegment]):
+        """ Add the new segments of an object that is now in the vault to the segment store. """
+
+        for sid, ct_seg in own_segs.items():
+            self.seg_store.setdefault(sid, ct_seg)
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def dedup_stats(self) -> dict[str, int | float]:
+        """ Segment level dedup report: segments of all objects, how many of them hold their own payload (stored) and
+        how many are references to a stored segment. dedup_ratio = segments / stored_segments. """
+
+        segments = 0
+        ref_segments = 0
+        for mem_obj in self.mem_os.values():
+            if mem_obj.seg_table is not None:
+                segments += len(mem_obj.seg_rows)
+                ref_segments += sum(map(mem_obj.seg_table.is_ref, mem_obj.seg_rows))
+                continue
+            segments += len(mem_obj.ct_segments)
+            ref_segments += sum(1 for ct_seg in mem_obj.ct_segments if ct_seg.is_ref)
+
+        stored_segments = segments - ref_segments
+        return {
+            'segments': segments,
+            'stored_segments': stored_segments,
+            'ref_segments': ref_segments,
+            'dedup_ratio': segments / stored_segments if stored_segments else 1.0,
+        }
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def compression_stats(self) -> dict[str, dict]:
+        """ Per object compression stats, obj_id -> {z_codec, pt_len, z_len, ratio}. Objects that were not encrypted or
+        decrypted yet in this session (lazily loaded) have no stats and are left out. """
+
+        stats = {}
+        for oid, mem_obj in self.mem_os.items():
+            if mem_obj.pt_len == 0 and mem_obj.z_len == 0:
+                continue
+            stats[oid] = {
+                'z_codec': mem_obj.z_codec,
+                'pt_len': mem_obj.pt_len,
+                'z_len': mem_obj.z_len,
+                'ratio': mem_obj.z_len / mem_obj.pt_len if mem_obj.pt_len else 1.0,
+            }
+
+        return stats
 
     # --------------------------------------------------------------------------------------------------------------------------
     def make_frame_line(self, ct_seg: CTSegment) -> bytes:
@@ -255,43 +1226,359 @@ class VaultMan:
         if not isinstance(ct_seg, CTSegment):
             raise R3D_V1T_Error("make_frame_line: ct_seg must be an instance of CTSegment.")
 
-        meta_dict = {
-            "i": ct_seg.idx,  # starting offset of the chunk in the original file
-            "o": ct_seg.parent_obj_id,
-            ct_seg.km.value: ct_seg.km_data,
-        }
+        ct_chunk_b64 = b'' if ct_seg.is_ref else self._load_ct_chunk_b64(ct_seg)
+        return frames.make_frame_line(ct_seg, ct_chunk_b64=ct_chunk_b64, frame_hmac_key=self.vks.frame_hmac_key)
 
-        # --- compute frame hmac
-        frame_hmac_msg = json.dumps(meta_dict).encode("ascii") + ct_seg.ct_chunk_b64
-        frame_hmac = hmac.new(key=self.vks.frame_hmac_key, msg=frame_hmac_msg, digestmod=hashlib.sha3_256).hexdigest()
+    # --------------------------------------------------------------------------------------------------------------------------
+    def make_frame(self, ct_seg: CTSegment) -> bytes:
+        """ Make a frame from a CTSegment in the frame format of this vault. """
+
+        if self._frame_fmt == RVFrameFmt.BIN:
+            ct_chunk = b'' if ct_seg.is_ref else self._load_ct_chunk(ct_seg)
+            return frames.make_bin_frame(ct_seg, ct_chunk=ct_chunk, frame_hmac_key=self.vks.frame_hmac_key)
 
-        meta_dict['h'] = frame_hmac
+        return self.make_frame_line(ct_seg)
 
-        # --- encode meta dict
-        meta_dict_b64 = b64.urlsafe_b64encode(json.dumps(meta_dict).encode("ascii"))
+    # --------------------------------------------------------------------------------------------------------------------------
+    def _write_mem_obj_frames(self, fh: BinaryIO, mem_obj: MemObj, seg_table: SegTable):
+        """ Write the frames of all segments of mem_obj to fh, and add them to seg_table (the frames persisted in fh). """
 
-        # [meta_dict_b64] | [chunk or frame payload]
-        line = meta_dict_b64 + b'|' + ct_seg.ct_chunk_b64 + b'\n'
+        seg_locs = []
+        for ct_seg in self._obj_segs(mem_obj):
+            frame = self.make_frame(ct_seg=ct_seg)
+            # TODO better replication later. for now just write the frame twice
+            fl_offset = fh.tell()
+            fh.write(frame)
+            fh.write(frame)
+            fh.flush()
 
-        return line
+            seg_locs.append((ct_seg, fl_offset, len(frame), [(fl_offset + len(frame), len(frame))]))
+
+        # --- dbg
+        if dfcc().dbg_mode and self._frame_fmt == RVFrameFmt.PSV:
+            # save a couple of invalid frame lines for debugging purposes
+            fh.write(b'\n\n')
+
+        seg_table.add_obj(mem_obj.obj_id, seg_locs)
 
     # --------------------------------------------------------------------------------------------------------------------------
-    def save_vault(self, output_pathname: str):
-        """ Save this vault to the output file. """
+    def save_vault(self, output_pathname: str, append: bool = False):
+        """ Save this vault to the output file.
+
+        append=True only writes the frames of objects that are new since the vault was loaded from (or last saved to)
+        output_pathname, at the end of that file. cost is proportional to the change, not the vault size.
+
+        The virtual file names go in as a vvfs checkpoint frame (full save) or a vvfs journal frame with the changes
+        since the last save (append, see dfcc().vvfs_checkpoint_ops).
+        With dfcc().vlt_index the index sidecar of the vault file is (re)written too, by appends only once the frames
+        it does not cover have grown past dfcc().vlt_index_tail_ratio of the ones it does.
+        """
+
+        if append:
+            self._save_vault_append(output_pathname)
+            return
+
+        # write to a temp file first. output_pathname might be the (mmaped) vault file lazy segments are read from,
+        # truncating that in place would pull the rug from under them. the temp file is synced before it replaces the
+        # vault file, an interrupted save leaves the old vault file as it was.
+        tmp_pathname = output_pathname + ".tmp"
+
+        seg_table = SegTable()
+        try:
+            with open(tmp_pathname, "wb") as fh:
+                for mem_obj in self.mem_os.values():
+                    self._write_mem_obj_frames(fh, mem_obj, seg_table)
+                vvfs_frame = self._write_vvfs_frame(fh, is_checkpoint=True, vvfs_data=self.vv_fs.checkpoint())
+                os.fsync(fh.fileno())
+        except BaseException:
+            if os.path.exists(tmp_pathname):
+                os.remove(tmp_pathname)
+            raise
+
+        os.replace(tmp_pathname, output_pathname)
+        _fsync_dir(output_pathname)
+
+        self._persisted_pathname = os.path.realpath(output_pathname)
+        self._persisted_oids = set(self.mem_os.keys())
+        self._persisted_segs = seg_table
+        self._vvfs_persisted(vvfs_frame, journaled_ops=0)
+
+        # an index left over from an earlier save would not match anymore
+        self._index_covered = 0
+        if not dfcc().vlt_index and os.path.exists(vlt_index.index_pathname(output_pathname)):
+            os.remove(vlt_index.index_pathname(output_pathname))
+        self._save_index(output_pathname)
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def _save_vault_append(self, output_pathname: str):
+        """ Append the frames of objects not yet persisted in output_pathname to its end. """
+
+        if not self._persisted_pathname or os.path.realpath(output_pathname) != self._persisted_pathname:
+            raise R3D_IO_Error(f"save_vault: can only append to the vault file this vault was loaded from or saved to, "
+                               f"not {output_pathname}.")
+
+        if not os.path.exists(output_pathname):
+            raise R3D_IO_Error(f"save_vault: vault file {output_pathname} does not exist anymore, can not append.")
+
+        new_oids = [oid for oid in self.mem_os if oid not in self._persisted_oids]
+        log.info(f"save_vault: appending {len(new_oids)} new objects to {output_pathname}")
+
+        with open(output_pathname, "ab") as fh:
+            # an earlier interrupted write may have left a partial last line, dont glue our first frame onto it.
+            # (a partial bin frame needs nothing, the loader resyncs on the magic of the next frame.)
+            if fh.tell() > 0 and self._frame_fmt == RVFrameFmt.PSV:
+                with open(output_pathname, "rb") as rfh:
+                    rfh.seek(-1, os.SEEK_END)
+                    if rfh.read(1) != b'\n':
+                        fh.write(b'\n')
+
+            for oid in new_oids:
+                self._write_mem_obj_frames(fh, self.mem_os[oid], self._persisted_segs)
+                self._persisted_oids.add(oid)
+
+            # --- name changes since the last save, a new checkpoint once the journal since the last one is long
+            ops = self.vv_fs.journal
+            if ops:
+                journaled_ops = self._vvfs_journaled_ops + len(ops)
+                if journaled_ops > dfcc().vvfs_checkpoint_ops:
+                    vvfs_frame = self._write_vvfs_frame(fh, is_checkpoint=True, vvfs_data=self.vv_fs.checkpoint())
+                    journaled_ops = 0
+                else:
+                    vvfs_frame = self._write_vvfs_frame(fh, is_checkpoint=False, vvfs_data=ops)
+                self._vvfs_persisted(vvfs_frame, journaled_ops=journaled_ops)
+
+        # the index still matches the start of the file, loads scan the appended frames after it. rewriting it is
+        # O(vault size), only done once the unindexed tail has grown large (see dfcc().vlt_index_tail_ratio).
+        unindexed = os.path.getsize(output_pathname) - self._index_covered
+        if unindexed > self._index_covered * dfcc().vlt_index_tail_ratio:
+            self._save_index(output_pathname)
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def _save_index(self, output_pathname: str):
+        """ Write the index sidecar of the vault file, from the index entries of everything persisted in it. """
+
+        if not dfcc().vlt_index:
+            return
+
+        self._index_covered = vlt_index.write_index(output_pathname, self._persisted_segs.index_objs(), self._frame_fmt,
+                                                    frame_hmac_key=self.vks.frame_hmac_key, vvfs=self._persisted_vvfs)
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    # --------------------------------------------------------------------------------------------------------------------------
+    # --------------------------------------------------------------------------------------------------------------------------
+    # --------------------------------------------------------------------------------------------------------------------------
+    # -------------------------------------------------------------------------------------------------------------------- vvfs
+    def _write_vvfs_frame(self, fh: BinaryIO, is_checkpoint: bool, vvfs_data: dict | list) -> VVFSFrame:
+        """ Write a vvfs frame (twice, like segment frames) with the next sequence number to fh. vvfs_data is the
+        name table (VaultVirtualFS.checkpoint) for checkpoints, journaled operations for journal frames. Return the
+        frame, located in fh. """
+
+        vvfs_frame = VVFSFrame()
+        vvfs_frame.is_checkpoint = is_checkpoint
+        vvfs_frame.seq = self._vvfs_seq + 1
+        vvfs_frame.km = RVKryptMode.CHACHA20_POLY1305
+
+        # names compress well, always zlib
+        [(ct_chunk, km_data, _)] = self._seal_chunks([json.dumps(vvfs_data).encode("ascii")], z_codec='zlib')
+        vvfs_frame.km_data = km_data
+
+        if self._frame_fmt == RVFrameFmt.BIN:
+            frame = frames.make_vvfs_bin_frame(vvfs_frame, ct_chunk=ct_chunk, frame_hmac_key=self.vks.frame_hmac_key)
+        else:
+            frame = frames.make_vvfs_frame_line(vvfs_frame, ct_chunk_b64=b64.urlsafe_b64encode(ct_chunk),
+                                                frame_hmac_key=self.vks.frame_hmac_key)
+
+        vvfs_frame.fl_offset = fh.tell()
+        vvfs_frame.fl_length = len(frame)
+        vvfs_frame.fl_alts = [(vvfs_frame.fl_offset + len(frame), len(frame))]
+        fh.write(frame)
+        fh.write(frame)
+        fh.flush()
+
+        log.dbg(f"_write_vvfs_frame: seq={vvfs_frame.seq} checkpoint={is_checkpoint} {len(frame):_} bytes")
+        return vvfs_frame
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def _vvfs_persisted(self, vvfs_frame: VVFSFrame, journaled_ops: int):
+        """ vvfs_frame made it into the persisted vault file, the vvfs journal up to now is in there. """
+
+        entry = vlt_index.vvfs_entry(vvfs_frame, vvfs_frame.fl_offset, vvfs_frame.fl_length, vvfs_frame.fl_alts)
+        if vvfs_frame.is_checkpoint:
+            self._persisted_vvfs = [entry]
+        else:
+            self._persisted_vvfs.append(entry)
+
+        self._vvfs_seq = vvfs_frame.seq
+        self._vvfs_journaled_ops = journaled_ops
+        self.vv_fs.journal.clear()
 
-        with open(output_pathname, "wb") as fh:
-            for mem_obj in self.mem_os.values():
-                for ct_seg in mem_obj.ct_segments:
-                    line = self.make_frame_line(ct_seg=ct_seg)
-                    # TODO better replication later. for now just write the line twice
-                    fh.write(line)
-                    fh.write(line)
-                    fh.flush()
+    # --------------------------------------------------------------------------------------------------------------------------
+    def _replay_vvfs(self):
+        """ Rebuild the virtual file names from the vvfs frames found by a load: the latest checkpoint that verifies,
+        then the journal frames after it, in sequence order. Frames before that checkpoint are never read. """
+
+        vvfs_frames = sorted(self._loaded_vvfs, key=lambda vvfs_frame: vvfs_frame.seq)
+        self._loaded_vvfs = []
+
+        self._persisted_vvfs = []
+        self._vvfs_journaled_ops = 0
+        if not vvfs_frames:
+            return
+
+        self._vvfs_seq = max(self._vvfs_seq, vvfs_frames[-1].seq)
+
+        # --- latest usable checkpoint
+        used_frames = []
+        seq = 0
+        for vvfs_frame in reversed(vvfs_frames):
+            if not vvfs_frame.is_checkpoint:
+                continue
+            try:
+                self.vv_fs.load_checkpoint(self._open_vvfs_frame(vvfs_frame))
+            except Exception as e:
+                log.warn(f"vvfs checkpoint seq={vvfs_frame.seq} is not usable: {e!r}")
+                continue
+
+            used_frames.append(vvfs_frame)
+            seq = vvfs_frame.seq
+            break
+
+        # --- journal tail
+        for vvfs_frame in vvfs_frames:
+            if vvfs_frame.is_checkpoint or vvfs_frame.seq <= seq:
+                continue
+            if vvfs_frame.seq != seq + 1:
+                log.warn(f"vvfs frames {seq + 1} to {vvfs_frame.seq - 1} are missing, their name changes are lost.")
+
+            try:
+                ops = self._open_vvfs_frame(vvfs_frame)
+                self.vv_fs.replay(ops)
+            except Exception as e:
+                log.warn(f"vvfs journal seq={vvfs_frame.seq} is not usable: {e!r}")
+                continue
+
+            used_frames.append(vvfs_frame)
+            seq = vvfs_frame.seq
+            self._vvfs_journaled_ops += len(ops)
+
+        self._persisted_vvfs = [
+            vlt_index.vvfs_entry(vvfs_frame, vvfs_frame.fl_offset, vvfs_frame.fl_length, vvfs_frame.fl_alts)
+            for vvfs_frame in used_frames
+        ]
+        log.dbg(f"_replay_vvfs: {len(used_frames)} of {len(vvfs_frames)} vvfs frames replayed, up to seq={seq}")
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def _open_vvfs_frame(self, vvfs_frame: VVFSFrame) -> dict | list:
+        """ Decrypt and decode the payload of a vvfs frame. Frames found by lazy loads (or in the index) are read
+        back from the vault file and verified first. """
+
+        if not vvfs_frame.ct_chunk and not vvfs_frame.ct_chunk_b64:
+            if self._vlt_mm is None:
+                raise R3D_IO_Error(f"vvfs frame seq={vvfs_frame.seq} can not be read, vault file is closed.")
+            vvfs_frame = self._load_verified_frame(self._vlt_mm, self._vlt_mm_fmt, vvfs_frame)
+
+        ct_chunk = vvfs_frame.ct_chunk or b64.urlsafe_b64decode(vvfs_frame.ct_chunk_b64)
+        z_chunk = seg_krypt.decrypt_chunks(self.vks.sgk_chacha20, [ct_chunk])[0]
+
+        return json.loads(compression.decompress_chunk(vvfs_frame.km_data, z_chunk).decode("ascii"))
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    # --------------------------------------------------------------------------------------------------------------------------
+    # --------------------------------------------------------------------------------------------------------------------------
+    # --------------------------------------------------------------------------------------------------------------------------
+    # ---------------------------------------------------------------------------------------------------------------------- gc
+    def drop_orphaned_objects(self) -> list[str]:
+        """ Remove the objects no virtual file points to anymore (see VaultVirtualFS.orphaned_oids) from the object
+        store. Return their obj_ids. """
+
+        orphaned_oids = [oid for oid in self.vv_fs.orphaned_oids if oid in self.mem_os and oid not in self.vv_fs.oid_to_vf]
+        self._drop_objects(orphaned_oids)
+        self.vv_fs.orphaned_oids.clear()
+
+        return orphaned_oids
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def _drop_objects(self, oids: list[str]):
+        """ Remove objects from the object store. Payloads of their segments that objects left in the store still
+        reference (dedup) move to one of those references, they are not lost with the objects. """
+
+        drop = set(oids)
+
+        for mem_obj in self.mem_os.values():
+            if mem_obj.obj_id in drop:
+                continue
+            for pos, ct_seg in enumerate(self._obj_segs(mem_obj)):
+                pl_seg = self._seg_store_get(ct_seg.sid) if ct_seg.is_ref else None
+                if pl_seg is not None and pl_seg.parent_obj_id in drop:
+                    # the segment of mem_obj itself, not one made from its row
+                    self._promote_ref(mem_obj.ct_segments[pos], pl_seg)
+
+        for oid in drop:
+            for ct_seg in self._obj_segs(self.mem_os[oid]):
+                pl_seg = None if ct_seg.is_ref else self._seg_store_get(ct_seg.sid)
+                if pl_seg is not None and pl_seg.parent_obj_id == oid:
+                    del self.seg_store[ct_seg.sid]
+
+            log.info(f"_drop_objects: dropping {oid}")
+            del self.mem_os[oid]
+            self.pt_cache.discard(oid)
+            self._persisted_oids.discard(oid)
+            self._persisted_segs.drop_obj(oid)
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def _promote_ref(self, ref_seg: CTSegment, pl_seg: CTSegment):
+        """ Make the segment reference ref_seg hold the payload of pl_seg (the verified ciphertext, its not decrypted),
+        and the entry of its sid in the segment store. """
+
+        ref_seg.ct_chunk = self._load_ct_chunk(pl_seg)
+        ref_seg.ct_chunk_b64 = b''
+        ref_seg.km = pl_seg.km
+        ref_seg.km_data = dict(pl_seg.km_data)
+        ref_seg.is_ref = False
+
+        # not backed by a vault file (or the staging file) anymore, its frame changed
+        ref_seg.fl_offset = -1
+        ref_seg.fl_length = 0
+        ref_seg.fl_alts = None
+        ref_seg.stg_offset = -1
+        ref_seg.stg_length = 0
+
+        self.seg_store[ref_seg.sid] = ref_seg
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def compact_vlt(self, vlt_file_pathname: str = '') -> dict[str, int]:
+        """ Compact the vault file this vault was loaded from (or last saved to): drop orphaned objects, then rewrite
+        the file with only the frames of the objects in the store. Return a report, the bytes reclaimed and so on.
+
+        Frames are copied as they are, payloads are not decrypted or re-encrypted. Lazy segments are read from the old
+        file one at a time and verified (a bad copy falls back to a replica), replicas of a frame are written anew.
+        Garbage (invalid lines, frames of dropped objects, left over replicas) is not copied.
+
+        Safe to interrupt: the new file is written next to the old one, synced and then renamed over it. The index
+        sidecar is written after that, an interruption in between leaves an index that is detected as stale.
+        """
+
+        vlt_file_pathname = vlt_file_pathname or self._persisted_pathname
+        if not vlt_file_pathname or os.path.realpath(vlt_file_pathname) != self._persisted_pathname:
+            raise R3D_IO_Error(f"compact_vlt: can only compact the vault file this vault was loaded from or saved to, "
+                               f"not {vlt_file_pathname or 'nothing'}.")
+
+        bytes_before = os.path.getsize(vlt_file_pathname)
+        dropped_oids = self.drop_orphaned_objects()
+
+        self.save_vault(vlt_file_pathname)
+
+        bytes_after = os.path.getsize(vlt_file_pathname)
+        report = {
+            "bytes_before": bytes_before,
+            "bytes_after": bytes_after,
+            "bytes_reclaimed": bytes_before - bytes_after,
+            "objects": len(self.mem_os),
+            "objects_dropped": len(dropped_oids),
+        }
+        log.info(f"compact_vlt: {vlt_file_pathname}: {report}")
 
-                # --- dbg
-                if dfcc().dbg_mode:
-                    # save a couple of invalid frame lines for debugging purposes
-                    fh.write(b'\n\n')
+        return report
 
 
 # ------------------------------------------------------------------------------------------------------------------------------
@@ -0,0 +1,224 @@
+''' vlt_index.py
+
+Vault index sidecar (see docs/r3dv1t_file_format.txt). Written next to the vault file as '[vault file].r3x' on save.
+
+The index maps every oid to the frames of its segments (offset, length, replica locations and the segment meta data),
+and lists the vvfs frames still needed to rebuild the virtual file names (the last checkpoint and the journal frames
+after it), so opening a vault does not need to scan and verify every frame:
+- lazy loads build their segments straight from the index, O(index size).
+- eager loads read exactly the indexed frames, no frame finding and no replica skipping.
+
+The index is authenticated with vks.frame_hmac_key, and frames are still verified when their payload is read.
+read_index decodes it without the key, so loads can use it while the keys are still being derived, verify_index has to
+pass before anything taken from it is trusted.
+It covers the vault file up to 'covered' bytes, anything after that (appended without updating the index) is scanned
+as usual. An index that does not match the start of the vault file (rewritten without it) is ignored.
+
+'''
+
+import os
+import json
+import zlib
+import hashlib
+import hmac
+
+import base64 as b64
+
+from libr3dv1t.errors import R3D_V1T_Error
+from libr3dv1t.typedefs import CTSegment, VVFSFrame, RVKryptMode, RVFrameFmt
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+INDEX_SUFFIX = '.r3x'
+
+_INDEX_MAGIC = b'r3x1'
+
+# the index records a digest of the last bytes it covers, to recognise a vault file that was rewritten since.
+_TAIL_SIZE = 4096
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+def index_pathname(vlt_file_pathname: str) -> str:
+    """ Path of the index sidecar of a vault file. """
+
+    return vlt_file_pathname + INDEX_SUFFIX
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+def index_entry(ct_seg: CTSegment, fl_offset: int, fl_length: int, fl_alts: list[tuple[int, int]] | None) -> list:
+    """ Index entry for one segment, whose frame is at fl_offset (and replicas at fl_alts) in the vault file. """
+
+    km = '' if ct_seg.is_ref else ct_seg.km.value
+    return [ct_seg.idx, fl_offset, fl_length, [list(alt) for alt in fl_alts or []], km, ct_seg.km_data, ct_seg.sid,
+            int(ct_seg.is_ref)]
+
+
+def index_entry_seg(oid: str, entry: list) -> CTSegment:
+    """ Lazy CTSegment (no payload, located by fl_offset) from an index entry. """
+
+    idx, fl_offset, fl_length, fl_alts, km, km_data, sid, is_ref = entry
+
+    ct_seg = CTSegment()
+    ct_seg.idx = idx
+    ct_seg.parent_obj_id = oid
+    ct_seg.fl_offset = fl_offset
+    ct_seg.fl_length = fl_length
+    ct_seg.fl_alts = [(alt_offset, alt_length) for alt_offset, alt_length in fl_alts] or None
+    ct_seg.sid = sid
+    ct_seg.is_ref = bool(is_ref)
+    if not ct_seg.is_ref:
+        ct_seg.km = RVKryptMode(km)
+        ct_seg.km_data = km_data
+
+    return ct_seg
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+def vvfs_entry(vvfs_frame: VVFSFrame, fl_offset: int, fl_length: int, fl_alts: list[tuple[int, int]] | None) -> list:
+    """ Index entry for one vvfs frame, at fl_offset (and replicas at fl_alts) in the vault file. """
+
+    return [vvfs_frame.seq, int(vvfs_frame.is_checkpoint), fl_offset, fl_length, [list(alt) for alt in fl_alts or []],
+            vvfs_frame.km.value, vvfs_frame.km_data]
+
+
+def vvfs_entry_frame(entry: list) -> VVFSFrame:
+    """ VVFSFrame without payload (located by fl_offset) from an index entry. """
+
+    seq, is_checkpoint, fl_offset, fl_length, fl_alts, km, km_data = entry
+
+    vvfs_frame = VVFSFrame()
+    vvfs_frame.seq = seq
+    vvfs_frame.is_checkpoint = bool(is_checkpoint)
+    vvfs_frame.fl_offset = fl_offset
+    vvfs_frame.fl_length = fl_length
+    vvfs_frame.fl_alts = [(alt_offset, alt_length) for alt_offset, alt_length in fl_alts] or None
+    vvfs_frame.km = RVKryptMode(km)
+    vvfs_frame.km_data = km_data
+
+    return vvfs_frame
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+def tail_digest(fh, covered: int) -> str:
+    """ Digest of the last (up to) _TAIL_SIZE bytes before covered in the open vault file fh. """
+
+    tail_start = max(0, covered - _TAIL_SIZE)
+    tail = os.pread(fh.fileno(), covered - tail_start, tail_start)
+
+    return hashlib.blake2b(tail, digest_size=16).hexdigest()
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+def make_index(objs: dict[str, list], covered: int, tail: str, frame_fmt: RVFrameFmt, frame_hmac_key: bytes,
+               vvfs: list[list] | None = None) -> bytes:
+    """ Serialize and authenticate an index. objs maps oid -> index entries of its segments, vvfs has the index
+    entries of the vvfs frames. """
+
+    index = {
+        "covered": covered,
+        "tail": tail,
+        "fmt": frame_fmt.value,
+        "objs": objs,
+        "vvfs": vvfs or [],
+    }
+
+    index_b64 = b64.urlsafe_b64encode(zlib.compress(json.dumps(index).encode("ascii")))
+    index_hmac = hmac.new(key=frame_hmac_key, msg=_INDEX_MAGIC + b'|' + index_b64, digestmod=hashlib.sha3_256).hexdigest()
+
+    return _INDEX_MAGIC + b'|' + index_b64 + b'|' + index_hmac.encode("ascii") + b'\n'
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+def parse_index(data: bytes, frame_hmac_key: bytes) -> dict:
+    """ Verify and decode an index. Raise R3D_V1T_Error if its invalid. """
+
+    verify_index(data, frame_hmac_key=frame_hmac_key)
+    return decode_index(data)
+
+
+def verify_index(data: bytes, frame_hmac_key: bytes):
+    """ Check the hmac of an index. Raise R3D_V1T_Error if its invalid. """
+
+    fields = _index_fields(data)
+    recomputed_hmac = hmac.new(key=frame_hmac_key, msg=fields[0] + b'|' + fields[1], digestmod=hashlib.sha3_256).hexdigest()
+    if not hmac.compare_digest(fields[2], recomputed_hmac.encode("ascii")):
+        raise R3D_V1T_Error("Invalid vault index: hmac mismatch.")
+
+
+def decode_index(data: bytes) -> dict:
+    """ Decode an index without verifying it (see verify_index). Raise R3D_V1T_Error if it does not decode. """
+
+    fields = _index_fields(data)
+    try:
+        index = json.loads(zlib.decompress(b64.urlsafe_b64decode(fields[1])).decode("utf-8"))
+    except Exception as e:
+        raise R3D_V1T_Error(f"Invalid vault index: does not decode: {e!r}")
+
+    # indexes written before vvfs frames existed have no vvfs entries
+    index.setdefault("vvfs", [])
+
+    return index
+
+
+def _index_fields(data: bytes) -> list[bytes]:
+    """ magic, payload and hmac of an index. """
+
+    fields = data.strip().split(b'|')
+    if len(fields) != 3 or fields[0] != _INDEX_MAGIC:
+        raise R3D_V1T_Error("Invalid vault index: bad layout.")
+
+    return fields
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+def read_index(vlt_file_pathname: str, frame_fmt: RVFrameFmt) -> tuple[dict, bytes] | None:
+    """ Read and decode the index sidecar of a vault file, return it and its raw data. Return None if there is none.
+    Raise R3D_V1T_Error if it does not decode or does not belong to the vault file as it is now (stale).
+    The index is not verified, that needs the keys: call verify_index on the raw data before trusting it. """
+
+    pathname = index_pathname(vlt_file_pathname)
+    if not os.path.exists(pathname):
+        return None
+
+    with open(pathname, "rb") as fh:
+        index_data = fh.read()
+    index = decode_index(index_data)
+
+    if index["fmt"] != frame_fmt.value:
+        raise R3D_V1T_Error(f"Stale vault index: frame format {index['fmt']} != {frame_fmt.value}")
+
+    with open(vlt_file_pathname, "rb") as fh:
+        if os.fstat(fh.fileno()).st_size < index["covered"] or tail_digest(fh, index["covered"]) != index["tail"]:
+            raise R3D_V1T_Error("Stale vault index: vault file changed since the index was written.")
+
+    return index, index_data
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+def write_index(vlt_file_pathname: str, objs: dict[str, list], frame_fmt: RVFrameFmt, frame_hmac_key: bytes,
+                vvfs: list[list] | None = None) -> int:
+    """ Write the index sidecar for a vault file, covering the whole file as it is now. Return the bytes covered. """
+
+    with open(vlt_file_pathname, "rb") as fh:
+        covered = os.fstat(fh.fileno()).st_size
+        tail = tail_digest(fh, covered)
+
+    index_data = make_index(objs, covered=covered, tail=tail, frame_fmt=frame_fmt, frame_hmac_key=frame_hmac_key,
+                            vvfs=vvfs)
+
+    pathname = index_pathname(vlt_file_pathname)
+    tmp_pathname = pathname + ".tmp"
+    with open(tmp_pathname, "wb") as fh:
+        fh.write(index_data)
+
+    os.replace(tmp_pathname, pathname)
+
+    return covered
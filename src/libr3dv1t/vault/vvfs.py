@@ -24,7 +24,9 @@ the corresponding pname would be:
 
 """
 
+import fnmatch
 import posixpath
+from typing import Iterator
 
 from libr3dv1t.log_utilz.log_man import default_logger as log
 from libr3dv1t.errors import R3D_V1T_Error
@@ -35,6 +37,8 @@ from libr3dv1t.errors import R3D_V1T_Error
 # this will have data and logic, not good fit for typedefs.
 class VirtualFile:
 
+    __slots__ = ('pname',)
+
     def __init__(self, pname: str):
         self.pname: str = posixpath.normpath(pname)
 
@@ -46,23 +50,84 @@ class VirtualFile:
             return False
         return self.pname == other.pname
 
+    def __hash__(self):
+        return hash(self.pname)
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+def split_pname(pname: str) -> list[str]:
+    """ Components of a normalised pname, its path in the vvfs tree. A leading '/' (or '//') is a component of its own,
+    so '/a' and 'a' are different names, same as in oid_to_vf. """
+
+    stripped = pname.lstrip('/')
+    lead = pname[:len(pname) - len(stripped)]
+
+    return ([lead] if lead else []) + (stripped.split('/') if stripped else [])
+
+
+def join_parts(parts: list[str]) -> str:
+    """ The pname of a path in the vvfs tree, undoes split_pname. '' for the root. """
+
+    if parts and parts[0].startswith('/'):
+        return parts[0] + '/'.join(parts[1:])
+
+    return '/'.join(parts)
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+class VDirNode:
+    """ A directory in the vvfs tree index (see VaultVirtualFS.root). Directories exist as long as there are virtual
+    files under them. """
+
+    __slots__ = ('dirs', 'files')
+
+    def __init__(self):
+
+        # sub directories by name
+        self.dirs: dict[str, VDirNode] = {}
+
+        # names of the virtual files directly in this directory
+        self.files: set[str] = set()
+
 
 # ------------------------------------------------------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------------------------------------------------------
 class VaultVirtualFS:
-    """  """
+    """ Map between virtual files (by pname) and oids. Lookups, links and unlinks are O(1), they never walk the map.
+    They do not log either, a log call (it inspects the stack) costs more than the operation itself.
+
+    The names are also indexed as a tree of their '/' separated components (root), so directories can be listed,
+    walked, globbed, renamed and deleted at a cost proportional to the subtree, not the whole vault.
+    """
 
     def __init__(self):
         """ Initialize a new VVFS. """
 
-        # vvfs main data structure is a map from oid to list of VirtualFile
-        self.oid_to_vf: dict[str, list[VirtualFile]] = {}
+        # vvfs main data structure is a map from oid to the set of VirtualFiles pointing to it
+        self.oid_to_vf: dict[str, set[VirtualFile]] = {}
+
+        # reverse index, pname -> oid. always has exactly the virtual files in oid_to_vf.
+        self.pname_to_oid: dict[str, str] = {}
+
+        # tree index over the pnames (see split_pname), has exactly the virtual files in pname_to_oid.
+        self.root = VDirNode()
+
+        # oids cleaned up because no virtual file points to them anymore. their objects are garbage in the vault
+        # object store, VaultMan.compact_vlt drops them.
+        self.orphaned_oids: set[str] = set()
+
+        # link/unlink operations not persisted yet, ['l', pname, oid] or ['u', pname]. VaultMan.save_vault writes them
+        # to the vault file as journal frames and clears this.
+        self.journal: list[list] = []
 
         log.dbg("New VVFS initialized.")
 
     # --------------------------------------------------------------------------------------------------------------------------
     def clean_up_orphaned_oids(self):
-        """ Clean up orphaned oids. An oid is considered orphaned if there are no virtual files pointing to it. """
+        """ Clean up orphaned oids. An oid is considered orphaned if there are no virtual files pointing to it.
+        link_vf and unlink_vf clean up as they go, this walks the whole map. """
 
         log.dbg("clean_up_orphaned_oids: start")
         orphaned_oids = []
@@ -74,8 +139,25 @@ class VaultVirtualFS:
 
         # remove orphaned oids from the map
         for orphaned_oid in orphaned_oids:
-            log.info(f"clean_up_orphaned_oids: Removing orphaned oid '{orphaned_oid}'.")
-            del self.oid_to_vf[orphaned_oid]
+            self._orphan_oid(orphaned_oid)
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def _orphan_oid(self, oid: str):
+        """ Remove an oid no virtual file points to anymore from the map, remember it in orphaned_oids. """
+
+        del self.oid_to_vf[oid]
+        self.orphaned_oids.add(oid)
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def _remove_vf(self, vf: VirtualFile, oid: str):
+        """ Remove the association of vf with oid (the one pname_to_oid has for it), orphaned oids are cleaned up. """
+
+        del self.pname_to_oid[vf.pname]
+
+        vfiles = self.oid_to_vf[oid]
+        vfiles.discard(vf)
+        if not vfiles:
+            self._orphan_oid(oid)
 
     # --------------------------------------------------------------------------------------------------------------------------
     def link_vf(self, vf: VirtualFile, oid: str):
@@ -86,29 +168,21 @@ class VaultVirtualFS:
         if not isinstance(oid, str):
             raise R3D_V1T_Error(f"VaultVirtualFS.link_vf: oid must be str, got {type(oid)}.")
 
-        log.info(f"link_vf: '{vf}' <---> '{oid}'")
-
-        run_oid_clean_up = False
-
         # if vf.pname already points to some oid, we need to remove that association first
-        for existing_oid, vfiles in self.oid_to_vf.items():
-            for existing_vf in vfiles:
-                if existing_vf == vf:
-                    log.info(f"link_vf: Removing existing association for '{vf}' with oid '{existing_oid}'.")
-                    vfiles.remove(existing_vf)
-                    # this might create orphaned oids
-                    if not vfiles:
-                        run_oid_clean_up = True
-
-        # --- clean up orphaned oids if needed
-        if run_oid_clean_up:
-            self.clean_up_orphaned_oids()
+        existing_oid = self.pname_to_oid.get(vf.pname)
+        if existing_oid == oid:
+            return
+        if existing_oid is not None:
+            self._remove_vf(vf, existing_oid)
+        else:
+            self._tree_add(vf.pname)
 
         # now we can add the new association
-        if oid in self.oid_to_vf:
-            self.oid_to_vf[oid].append(vf)
-        else:
-            self.oid_to_vf[oid] = [vf]
+        self.orphaned_oids.discard(oid)
+        self.oid_to_vf.setdefault(oid, set()).add(vf)
+        self.pname_to_oid[vf.pname] = oid
+
+        self.journal.append(['l', vf.pname, oid])
 
     # --------------------------------------------------------------------------------------------------------------------------
     def unlink_vf(self, vf: VirtualFile):
@@ -117,36 +191,24 @@ class VaultVirtualFS:
         if not isinstance(vf, VirtualFile):
             raise R3D_V1T_Error(f"VaultVirtualFS.unlink_vf: vf must be VirtualFile, got {type(vf)}.")
 
-        log.dbg(f"unlink_vf: '{vf.pname}'")
-        run_oid_clean_up = False
-
         # find the oid that this virtual file points to and remove the association
-        for oid, vfiles in self.oid_to_vf.items():
-            for existing_vf in vfiles:
-                if existing_vf == vf:
-                    log.info(f"unlink_vf: Removing association for '{vf.pname}' with oid '{oid}'.")
-                    vfiles.remove(existing_vf)
-                    # this might create orphaned oids
-                    if not vfiles:
-                        run_oid_clean_up = True
+        oid = self.pname_to_oid.get(vf.pname)
+        if oid is None:
+            return
 
-        # --- clean up orphaned oids if needed
-        if run_oid_clean_up:
-            self.clean_up_orphaned_oids()
+        self._remove_vf(vf, oid)
+        self._tree_remove(vf.pname)
+        self.journal.append(['u', vf.pname])
 
     # --------------------------------------------------------------------------------------------------------------------------
     def get_oid(self, vf: VirtualFile) -> str:
         """ Get the oid for a given virtual file path name. """
 
-        log.dbg(f"get_oid({vf})")
-
-        for oid, vfiles in self.oid_to_vf.items():
-            for existing_vf in vfiles:
-                if existing_vf == vf:
-                    log.info(f"get_oid: Found oid='{oid}' for '{vf}'.")
-                    return oid
+        oid = self.pname_to_oid.get(vf.pname)
+        if oid is None:
+            raise R3D_V1T_Error(f"get_oid: {vf} not found.")
 
-        raise R3D_V1T_Error(f"get_oid: {vf} not found.")
+        return oid
 
     # --------------------------------------------------------------------------------------------------------------------------
     def get_vf_by_oid(self, oid: str) -> list[VirtualFile]:
@@ -156,6 +218,226 @@ class VaultVirtualFS:
 
         if oid in self.oid_to_vf:
             log.info(f"get_vf_by_oid: Found {len(self.oid_to_vf[oid])} virtual files for oid '{oid}'.")
-            return self.oid_to_vf[oid]
+            return list(self.oid_to_vf[oid])
 
         raise R3D_V1T_Error(f"get_vf_by_oid: oid='{oid}' not found.")
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def checkpoint(self) -> dict[str, list[str]]:
+        """ The whole name table, oid -> pnames of the virtual files pointing to it. see load_checkpoint.
+        Orphaned oids are in it with no pnames, so they are still known to be garbage after a reload. """
+
+        oid_to_pnames = {oid: [] for oid in sorted(self.orphaned_oids)}
+        oid_to_pnames.update({oid: sorted(vf.pname for vf in vfiles) for oid, vfiles in self.oid_to_vf.items()})
+
+        return oid_to_pnames
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def load_checkpoint(self, oid_to_pnames: dict[str, list[str]]):
+        """ Add the virtual files of a checkpoint (see checkpoint) to this vvfs. Not journaled. """
+
+        if not isinstance(oid_to_pnames, dict):
+            raise R3D_V1T_Error(f"VaultVirtualFS.load_checkpoint: bad checkpoint, got {type(oid_to_pnames)}.")
+
+        self.replay([['l', pname, oid] for oid, pnames in oid_to_pnames.items() for pname in pnames])
+
+        # oids without pnames were orphaned when the checkpoint was taken
+        self.orphaned_oids.update(oid for oid, pnames in oid_to_pnames.items() if not pnames and oid not in self.oid_to_vf)
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def replay(self, ops: list[list]):
+        """ Apply journaled operations (see journal), e.g. read back from a vault file. Not journaled again. """
+
+        journal_len = len(self.journal)
+
+        try:
+            for op in ops:
+                if len(op) == 3 and op[0] == 'l':
+                    self.link_vf(VirtualFile(pname=op[1]), op[2])
+                elif len(op) == 2 and op[0] == 'u':
+                    self.unlink_vf(VirtualFile(pname=op[1]))
+                else:
+                    raise R3D_V1T_Error(f"VaultVirtualFS.replay: bad journal operation {op!r:.64}")
+        finally:
+            del self.journal[journal_len:]
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    # --------------------------------------------------------------------------------------------------------------------------
+    # -------------------------------------------------------------------------------------------------------------------- tree
+    def _tree_add(self, pname: str):
+        """ Add a new name to the tree index. """
+
+        parts = split_pname(pname)
+        node = self.root
+        for part in parts[:-1]:
+            child = node.dirs.get(part)
+            if child is None:
+                child = node.dirs[part] = VDirNode()
+            node = child
+
+        node.files.add(parts[-1])
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def _tree_remove(self, pname: str):
+        """ Remove a name from the tree index, directories left empty go with it. """
+
+        parts = split_pname(pname)
+        nodes = [self.root]
+        for part in parts[:-1]:
+            node = nodes[-1].dirs.get(part)
+            if node is None:
+                return
+            nodes.append(node)
+
+        nodes[-1].files.discard(parts[-1])
+
+        # --- prune empty directories, deepest first
+        for depth in range(len(nodes) - 1, 0, -1):
+            if nodes[depth].dirs or nodes[depth].files:
+                break
+            del nodes[depth - 1].dirs[parts[depth - 1]]
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def _dir_parts(path: str) -> list[str]:
+        """ Tree path of a directory, '' and '.' are the root. """
+
+        pname = VirtualFile(pname=path).pname
+        return [] if pname == '.' else split_pname(pname)
+
+    def _find_dir(self, parts: list[str]) -> VDirNode | None:
+
+        node = self.root
+        for part in parts:
+            node = node.dirs.get(part)
+            if node is None:
+                return None
+
+        return node
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def isdir(self, path: str) -> bool:
+        """ True if there are virtual files under path. """
+
+        return self._find_dir(self._dir_parts(path)) is not None
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def listdir(self, path: str = '') -> list[str]:
+        """ Sorted names of the directories and virtual files directly in directory path ('' is the root). """
+
+        node = self._find_dir(self._dir_parts(path))
+        if node is None:
+            raise R3D_V1T_Error(f"listdir: no such directory '{path}'.")
+
+        return sorted(node.dirs.keys() | node.files)
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def walk(self, path: str = '') -> Iterator[tuple[str, list[str], list[str]]]:
+        """ os.walk for the vvfs: yield (dirpath, dirnames, filenames) for directory path and every directory under it,
+        top down, names sorted. dirnames can be pruned in place to skip subtrees. Nothing if path is not a directory. """
+
+        start_parts = self._dir_parts(path)
+        start_node = self._find_dir(start_parts)
+        if start_node is not None:
+            yield from self._walk(start_parts, start_node)
+
+    @staticmethod
+    def _walk(start_parts: list[str], start_node: VDirNode) -> Iterator[tuple[str, list[str], list[str]]]:
+
+        stack = [(start_parts, start_node)]
+        while stack:
+            parts, node = stack.pop()
+            dirnames = sorted(node.dirs)
+            yield join_parts(parts), dirnames, sorted(node.files)
+
+            for dirname in reversed(dirnames):
+                if dirname in node.dirs:
+                    stack.append((parts + [dirname], node.dirs[dirname]))
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def iter_pnames(self, path: str = '') -> Iterator[str]:
+        """ pnames of all virtual files under directory path, recursively. """
+
+        for dirpath, _, filenames in self.walk(path):
+            for filename in filenames:
+                yield posixpath.join(dirpath, filename)
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def glob(self, pattern: str) -> list[str]:
+        """ Sorted pnames of the virtual files matching pattern. Components are matched with fnmatch ('*', '?', '[..]'
+        do not cross '/'), a '**' component matches any number of directories. Only the directories the pattern can
+        reach are visited. """
+
+        matches = set()
+        self._glob(self.root, [], split_pname(VirtualFile(pattern).pname), matches)
+
+        return sorted(matches)
+
+    def _glob(self, node: VDirNode, parts: list[str], pattern_parts: list[str], matches: set[str]):
+
+        pattern_part, rest = pattern_parts[0], pattern_parts[1:]
+
+        if pattern_part == '**':
+            if not rest:
+                for dirpath, _, filenames in self._walk(parts, node):
+                    matches.update(posixpath.join(dirpath, filename) for filename in filenames)
+                return
+            self._glob(node, parts, rest, matches)
+            for dirname, child in node.dirs.items():
+                self._glob(child, parts + [dirname], pattern_parts, matches)
+            return
+
+        # --- names in this directory the component matches, literal components are a lookup
+        if fnmatch.fnmatchcase(pattern_part, '*[[*?]*'):
+            names = node.dirs.keys() if rest else node.files
+            names = [name for name in names if fnmatch.fnmatchcase(name, pattern_part)]
+        else:
+            names = [pattern_part] if pattern_part in (node.dirs if rest else node.files) else []
+
+        for name in names:
+            if rest:
+                self._glob(node.dirs[name], parts + [name], rest, matches)
+            else:
+                matches.add(join_parts(parts + [name]))
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def _subtree_pnames(self, path: str) -> list[str]:
+        """ The virtual file path itself (if there is one) and every virtual file under directory path. """
+
+        pname = VirtualFile(pname=path).pname
+        pnames = [pname] if pname in self.pname_to_oid else []
+        pnames.extend(self.iter_pnames(path))
+
+        return pnames
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def rename_tree(self, src: str, dst: str) -> int:
+        """ Rename virtual file src, and everything under directory src, to dst (like mv, names already at dst are
+        replaced). Return the number of virtual files renamed. """
+
+        src_parts = self._dir_parts(src)
+        dst_parts = self._dir_parts(dst)
+        if not src_parts or dst_parts[:len(src_parts)] == src_parts:
+            raise R3D_V1T_Error(f"rename_tree: can not move '{src}' into itself ('{dst}').")
+
+        renamed = 0
+        for pname in self._subtree_pnames(src):
+            new_pname = join_parts(dst_parts + split_pname(pname)[len(src_parts):])
+            oid = self.pname_to_oid[pname]
+
+            # link first, the oid is never orphaned in between
+            self.link_vf(VirtualFile(pname=new_pname), oid)
+            self.unlink_vf(VirtualFile(pname=pname))
+            renamed += 1
+
+        return renamed
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def delete_tree(self, path: str) -> int:
+        """ Unlink virtual file path, and everything under directory path. Return the number of virtual files unlinked. """
+
+        pnames = self._subtree_pnames(path)
+        for pname in pnames:
+            self.unlink_vf(VirtualFile(pname=pname))
+
+        return len(pnames)
@@ -0,0 +1,372 @@
+''' xtract.py
+
+Streaming, parallel extraction of vault objects to files (see VaultMan.xtract_vlt_to_path).
+
+Objects are never materialized in memory. Segments are decrypted in batches on a thread pool (libsodium, zlib & co and
+os.pwrite all release the GIL) and written straight to their offset (CTSegment.idx) in the output files, which are
+preallocated with posix_fallocate where the platform has it.
+
+- Segments are processed in vault file offset order, so reading a lazily loaded (mmaped) vault stays sequential.
+- A segment shared by several objects (dedup) is decrypted once and written to all of them.
+- Only a few batches are in flight at any time, peak memory is bounded by workers * batch size, not the object sizes.
+- Output files are opened when their first segment is scheduled and closed after their last one is written.
+
+An object can be extracted to several pathnames (all the virtual files pointing to its oid). It is written once, the
+other pathnames are hardlinked to it (copied if the file system can't hardlink).
+
+Incremental: files already on disk with the right size and keyed fingerprint (the oid) are kept as they are. An object
+whose files are all up to date is not decrypted at all.
+
+'''
+
+import os
+import stat
+import hmac
+import shutil
+import hashlib
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future
+
+from libr3dv1t.central_config import dfcc
+from libr3dv1t.errors import R3D_V1T_Error
+from libr3dv1t.typedefs import MemObj, CTSegment
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+# batches in flight per worker
+_INFLIGHT_PER_WORKER = 2
+
+# read size when fingerprinting files already on disk
+_FP_READ_SIZE = 1024 * 1024
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+class _XtractTarget:
+    """ One object being extracted, to one or more output files. """
+
+    def __init__(self, mem_obj: MemObj, ct_segs: list[CTSegment], out_pathnames: list[str]):
+
+        self.mem_obj = mem_obj
+        self.ct_segs = ct_segs
+        self.out_pathnames = out_pathnames
+
+        # the file the object data is written to (or already is in), the other out_pathnames are linked to it.
+        self.out_pathname = out_pathnames[0]
+
+        # out_pathnames that are already up to date on disk
+        self.fresh: list[str] = []
+        self.fd = -1
+
+        # segments not written yet, the file is closed when this gets to 0
+        self.pending = len(ct_segs)
+        self.error: Exception | None = None
+
+        # (idx, length) of the plaintext chunks written to the file, checked against the object once all are in
+        self.streamed = False
+        self.extents: list[tuple[int, int]] = []
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+class ObjXtractor:
+    """ Extract vault objects to files. add() the objects, then run(). """
+
+    def __init__(self, vman, workers: int | None = None):
+
+        self._vman = vman
+        self._workers = max(1, workers if workers is not None else dfcc().krypt_workers)
+        self._targets: list[_XtractTarget] = []
+        self._lock = threading.Lock()
+
+        # files written, hardlinked (or copied), skipped because they were up to date, and objects that failed
+        self.stats = {"written": 0, "linked": 0, "skipped": 0, "failed": 0}
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def add(self, mem_obj: MemObj, out_pathnames: list[str]):
+        """ Queue mem_obj to be extracted to out_pathnames. """
+
+        if not out_pathnames:
+            raise R3D_V1T_Error(f"ObjXtractor.add: no output pathnames for {mem_obj.obj_id}")
+
+        self._targets.append(_XtractTarget(mem_obj, self._vman._obj_segs(mem_obj), list(out_pathnames)))
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def run(self) -> dict[str, Exception]:
+        """ Extract all queued objects. Return obj_id -> error for the objects that failed, their output files are
+        removed. """
+
+        # --- payload segment -> [(target, idx)] it has to be written to. segment references resolve to their payload.
+        # payloads with a sid are keyed by their frame and sid, the segment a reference resolves to can be made anew for
+        # every reference (see VaultMan._seg_store_get). segments without a sid are never referenced.
+        groups: dict[int | tuple[int, str], tuple[CTSegment, list[tuple[_XtractTarget, int]]]] = {}
+
+        for target in self._targets:
+            mem_obj = target.mem_obj
+
+            # up to date on disk, at most some links to make
+            self._find_fresh(target)
+            if target.fresh:
+                target.out_pathname = target.fresh[0]
+                continue
+
+            # already decrypted (or put in this session), nothing to decrypt. (pt_data can be evicted any time, see
+            # VaultMan.pt_cache)
+            pt_data = mem_obj.pt_data
+            if pt_data is not None or not target.ct_segs:
+                self._write_whole(target, pt_data or b'')
+                continue
+
+            try:
+                self._check_seg_order(target)
+                pl_segs = [self._vman._payload_seg(ct_seg) for ct_seg in target.ct_segs]
+            except Exception as e:
+                target.error = e
+                continue
+
+            target.streamed = True
+            for ct_seg, pl_seg in zip(target.ct_segs, pl_segs):
+                group_key = (pl_seg.fl_offset, pl_seg.sid) if pl_seg.sid else id(pl_seg)
+                groups.setdefault(group_key, (pl_seg, []))[1].append((target, ct_seg.idx))
+
+        # --- vault file order, segments that are not backed by the vault file (in memory, staged) first
+        ordered_groups = sorted(groups.values(), key=lambda group: group[0].fl_offset)
+        batch_size = dfcc().krypt_batch_size
+
+        inflight: deque[Future] = deque()
+        with ThreadPoolExecutor(max_workers=self._workers) as executor:
+            for i in range(0, len(ordered_groups), batch_size):
+                batch = ordered_groups[i:i + batch_size]
+                self._open_targets(batch)
+
+                while len(inflight) >= self._workers * _INFLIGHT_PER_WORKER:
+                    inflight.popleft().result()
+                inflight.append(executor.submit(self._xtract_batch, batch))
+
+            while inflight:
+                inflight.popleft().result()
+
+        # --- close what is left open (failed targets), check what was streamed, drop the output of failed objects,
+        # link the rest
+        errors = {}
+        for target in self._targets:
+            self._close_target(target)
+            if target.error is None and target.streamed:
+                try:
+                    self._check_written(target)
+                except Exception as e:
+                    target.error = e
+
+            if target.error is not None:
+                errors[target.mem_obj.obj_id] = target.error
+                self.stats["failed"] += 1
+                if not target.fresh and os.path.exists(target.out_pathname):
+                    os.remove(target.out_pathname)
+                continue
+
+            self.stats["skipped"] += len(target.fresh)
+            if not target.fresh:
+                self.stats["written"] += 1
+
+            for out_pathname in target.out_pathnames:
+                if out_pathname == target.out_pathname or out_pathname in target.fresh:
+                    continue
+                try:
+                    self._link(target.out_pathname, out_pathname)
+                    self.stats["linked"] += 1
+                except Exception as e:
+                    errors[target.mem_obj.obj_id] = e
+
+        return errors
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def _check_seg_order(target: _XtractTarget):
+        """ The part of VaultMan._check_extents that needs no plaintext: the segments (sorted by offset here) start at
+        offset 0. Gaps and overlaps are only known once the chunks are decrypted, see _check_written. """
+
+        target.ct_segs = sorted(target.ct_segs, key=lambda ct_seg: ct_seg.idx)
+        if target.ct_segs[0].idx != 0:
+            raise R3D_V1T_Error(f"Error extracting {target.mem_obj.obj_id}: no segment covers bytes 0 to "
+                                f"{target.ct_segs[0].idx}.")
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def _check_written(self, target: _XtractTarget):
+        """ Check a streamed output file against its object: the chunks written cover it without gaps or overlaps (same
+        rules as VaultMan._check_extents) and the file has their size. Raise R3D_V1T_Error if not. The chunks
+        themselves were verified when they were decrypted, the file is not read back. """
+
+        obj_id = target.mem_obj.obj_id
+        pos = 0
+        prev_extent = None
+        for idx, length in sorted(target.extents):
+            if idx > pos:
+                raise R3D_V1T_Error(f"Error extracting {obj_id}: no segment covers bytes {pos} to {idx}.")
+
+            if idx < pos:
+                # a copy of the segment before it, the same bytes written again
+                if (idx, length) == prev_extent:
+                    continue
+                raise R3D_V1T_Error(f"Error extracting {obj_id}: segment at {idx} overlaps the one before it, "
+                                    f"which ends at {pos}.")
+
+            prev_extent = (idx, length)
+            pos += length
+
+        size = os.path.getsize(target.out_pathname)
+        if size != pos:
+            raise R3D_V1T_Error(f"Error extracting {obj_id}: {target.out_pathname} has {size} bytes, not {pos}.")
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def _find_fresh(self, target: _XtractTarget):
+        """ Find the out_pathnames of target that already hold the object data: right size, then right fingerprint. """
+
+        for out_pathname in target.out_pathnames:
+            try:
+                st = os.lstat(out_pathname)
+            except OSError:
+                continue
+
+            if not stat.S_ISREG(st.st_mode) or not self._size_matches(target, st.st_size):
+                continue
+
+            # hardlinks of a file already found up to date need no fingerprinting
+            if any(os.path.samefile(out_pathname, fresh_pathname) for fresh_pathname in target.fresh):
+                target.fresh.append(out_pathname)
+            elif self._file_matches(target.mem_obj, out_pathname):
+                target.fresh.append(out_pathname)
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def _size_matches(target: _XtractTarget, size: int) -> bool:
+        """ Can a file of this size hold the object data. Exact for decrypted objects, the size of a lazy object is only
+        known to be past its last segment offset. """
+
+        pt_data = target.mem_obj.pt_data
+        if pt_data is not None:
+            return size == len(pt_data)
+        if not target.ct_segs:
+            return size == 0
+
+        return size > max(ct_seg.idx for ct_seg in target.ct_segs)
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def _file_matches(self, mem_obj: MemObj, pathname: str) -> bool:
+        """ Does the file hold the object data. the oid is the keyed fingerprint of it (see VaultMan.put_object). """
+
+        osfp = hmac.new(key=self._vman.vks.osfp_key, digestmod=hashlib.sha3_384)
+        try:
+            with open(pathname, "rb") as fh:
+                while data := fh.read(_FP_READ_SIZE):
+                    osfp.update(data)
+        except OSError:
+            return False
+
+        return hmac.compare_digest(osfp.hexdigest(), mem_obj.obj_id)
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def _link(src_pathname: str, dst_pathname: str):
+        """ Make dst_pathname a hardlink of src_pathname, replacing whatever is there. copy if hardlinks don't work. """
+
+        if os.path.lexists(dst_pathname) and os.path.samefile(src_pathname, dst_pathname):
+            return
+
+        os.makedirs(os.path.dirname(dst_pathname) or ".", exist_ok=True)
+        tmp_pathname = dst_pathname + ".r3x_tmp"
+        if os.path.lexists(tmp_pathname):
+            os.remove(tmp_pathname)
+
+        try:
+            os.link(src_pathname, tmp_pathname)
+        except OSError:
+            shutil.copyfile(src_pathname, tmp_pathname)
+
+        os.replace(tmp_pathname, dst_pathname)
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def _write_whole(self, target: _XtractTarget, pt_data: bytes):
+        """ Write an object that needs no decryption. """
+
+        try:
+            self._prepare_out(target.out_pathname)
+            with open(target.out_pathname, "wb") as fh:
+                fh.write(pt_data)
+        except Exception as e:
+            target.error = e
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def _open_targets(self, batch: list):
+        """ Open (and preallocate) the output files of a batch that are not open yet. """
+
+        for _, writes in batch:
+            for target, _ in writes:
+                if target.fd >= 0 or target.error is not None:
+                    continue
+
+                try:
+                    self._prepare_out(target.out_pathname)
+                    target.fd = os.open(target.out_pathname, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+
+                    # the size is only known once the last segment is decrypted, preallocate up to its offset.
+                    size_hint = max(ct_seg.idx for ct_seg in target.ct_segs)
+                    if size_hint > 0 and hasattr(os, "posix_fallocate"):
+                        try:
+                            os.posix_fallocate(target.fd, 0, size_hint)
+                        except OSError:
+                            pass  # not supported by the file system, pwrite extends the file as it goes
+                except Exception as e:
+                    target.error = e
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def _xtract_batch(self, batch: list):
+        """ Decrypt a batch of payload segments and write them to their output files. runs on the thread pool. """
+
+        # batches are krypt_batch_size segments, so seg_krypt decrypts them serially on this worker.
+        try:
+            pt_chunks = self._vman._open_segments([pl_seg for pl_seg, _ in batch])
+        except Exception:
+            # find the bad segments, one at a time, so only their objects fail
+            pt_chunks = []
+            for pl_seg, writes in batch:
+                try:
+                    pt_chunks.extend(self._vman._open_segments([pl_seg]))
+                except Exception as e:
+                    pt_chunks.append(None)
+                    with self._lock:
+                        for target, _ in writes:
+                            target.error = target.error or e
+
+        for (_, writes), pt_chunk in zip(batch, pt_chunks):
+            for target, idx in writes:
+                if pt_chunk is not None and target.error is None:
+                    try:
+                        os.pwrite(target.fd, pt_chunk, idx)
+                    except Exception as e:
+                        target.error = e
+
+                with self._lock:
+                    if pt_chunk is not None:
+                        target.extents.append((idx, len(pt_chunk)))
+                    target.pending -= 1
+                    if target.pending == 0:
+                        self._close_target(target)
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def _prepare_out(pathname: str):
+        """ Create the parent directories of an output file, remove an outdated file there. (writing through it would
+        also change its hardlinks, or the target of a symlink.) """
+
+        os.makedirs(os.path.dirname(pathname) or ".", exist_ok=True)
+        if os.path.lexists(pathname):
+            os.remove(pathname)
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def _close_target(target: _XtractTarget):
+
+        if target.fd >= 0:
+            os.close(target.fd)
+            target.fd = -1
@@ -0,0 +1,110 @@
+import io
+import os
+import sys
+import random
+import asyncio
+import unittest
+import tempfile
+import subprocess as sp
+from pathlib import Path
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+_repo_root = sp.check_output("git rev-parse --show-toplevel", shell=True).strip().decode('utf8')
+_include_search_path = str((Path(_repo_root) / 'src').resolve())
+
+if _include_search_path not in sys.path:
+    sys.path.insert(0, _include_search_path)
+
+from libr3dv1t.vault.async_vault_man import AsyncVaultMan
+from libr3dv1t.vault.vault_man import VaultMan
+from libr3dv1t.errors import R3D_V1T_Error
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# -------------------------------------------------------------------------------------------------------------------- test data
+test_upw_1 = b"change_me"
+
+test_objects = {
+    'small.txt': b"this is a test file\n",
+    'rand.bin': random.Random(42).randbytes(100_000),
+    'dir_1/text.txt': b"test 33333333333\n\n" * 500,
+}
+
+
+async def _ticker(ticks: list[int], stop: asyncio.Event):
+    while not stop.is_set():
+        ticks[0] += 1
+        await asyncio.sleep(0.005)
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+class TestAsyncVaultMan(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.vlt_pathname = os.path.join(self.tmp_dir.name, "test.r3dv1t")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    async def test_put_save_read(self):
+        # the loop keeps running while the KDF runs
+        ticks = [0]
+        stop = asyncio.Event()
+        ticker = asyncio.create_task(_ticker(ticks, stop))
+        avm = await AsyncVaultMan.create(vlt_password=test_upw_1)
+        stop.set()
+        await ticker
+        self.assertGreater(ticks[0], 1)
+
+        oids = {}
+        for virt_name, pt_data in test_objects.items():
+            oids[virt_name] = await avm.put_object(pt_data, virt_name)
+
+        async def _pieces():
+            for k in range(0, 49_000, 7_000):
+                yield test_objects['rand.bin'][k:k + 7_000]
+
+        oid = await avm.put_stream(_pieces(), 'streamed.bin')
+        self.assertEqual(await avm.get_obj_data(oid), test_objects['rand.bin'][:49_000])
+        oid_2 = await avm.put_stream(io.BytesIO(test_objects['small.txt']), 'small_2.txt')
+        self.assertEqual(oid_2, oids['small.txt'])
+
+        await avm.save_vault(self.vlt_pathname)
+        await avm.close()
+
+        # concurrent reads on a lazily loaded vault
+        avm = await AsyncVaultMan.create(vlt_password=test_upw_1, vlt_file_pathname_to_load=self.vlt_pathname,
+                                         lazy_load=True)
+        all_data = await asyncio.gather(*[avm.get_obj_data(oids[virt_name]) for virt_name in test_objects])
+        self.assertEqual(all_data, list(test_objects.values()))
+
+        rand_oid = oids['rand.bin']
+        self.assertEqual(await avm.read(rand_oid, 30_000, 5_000), test_objects['rand.bin'][30_000:35_000])
+
+        chunks = [chunk async for chunk in avm.iter_obj(rand_oid, offset=1_000, size=60_000, chunk_size=8_192)]
+        self.assertEqual(b''.join(chunks), test_objects['rand.bin'][1_000:61_000])
+        self.assertTrue(all(len(chunk) <= 8_192 for chunk in chunks))
+
+        chunks = [chunk async for chunk in avm.iter_obj(oids['small.txt'])]
+        self.assertEqual(b''.join(chunks), test_objects['small.txt'])
+        await avm.close()
+
+    async def test_wrap_and_errors(self):
+        avm = AsyncVaultMan(VaultMan(vlt_password=test_upw_1))
+        await avm.put_object(b'data', 'a.txt')
+        self.assertEqual(await avm.get_obj_data(avm.get_oid('a.txt')), b'data')
+
+        with self.assertRaises(R3D_V1T_Error):
+            await avm.get_obj_data('no_such_oid')
+        with self.assertRaises(R3D_V1T_Error):
+            await avm.put_stream(['not bytes'], 'b.txt')
+        with self.assertRaises(R3D_V1T_Error):
+            VaultMan(vlt_password=None)
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+if '__main__' == __name__:
+    unittest.main()
@@ -0,0 +1,88 @@
+import sys
+import random
+import unittest
+import subprocess as sp
+from pathlib import Path
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+_repo_root = sp.check_output("git rev-parse --show-toplevel", shell=True).strip().decode('utf8')
+_include_search_path = str((Path(_repo_root) / 'src').resolve())
+
+if _include_search_path not in sys.path:
+    sys.path.insert(0, _include_search_path)
+
+from libr3dv1t.vault.chunker import FixedChunker, CDCChunker
+from libr3dv1t.errors import R3D_V1T_Error
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# -------------------------------------------------------------------------------------------------------------------- test data
+test_data = random.Random(9).randbytes(200_000)
+
+
+def _chunks(data: bytes, lengths: list[int]) -> list[bytes]:
+    result = []
+    pos = 0
+    for chunk_len in lengths:
+        result.append(data[pos:pos + chunk_len])
+        pos += chunk_len
+    return result
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+class TestChunker(unittest.TestCase):
+
+    def test_fixed(self):
+        chunker = FixedChunker(1000)
+        self.assertEqual(chunker.split(b'x' * 2500, final=False), [1000, 1000])
+        self.assertEqual(chunker.split(b'x' * 2500, final=True), [1000, 1000, 500])
+        self.assertEqual(chunker.split(b'', final=True), [])
+
+    def test_cdc_bounds(self):
+        chunker = CDCChunker(512, 2048, 8192)
+        lengths = chunker.split(test_data, final=True)
+
+        self.assertEqual(sum(lengths), len(test_data))
+        self.assertTrue(all(512 <= chunk_len <= 8192 for chunk_len in lengths[:-1]))
+        avg = len(test_data) / len(lengths)
+        self.assertTrue(1024 < avg < 4096, avg)
+
+        # zeros never hit a cut point, max_size kicks in
+        self.assertEqual(chunker.split(bytes(20_000), final=True), [8192, 8192, 3616])
+
+    def test_cdc_streaming_matches_one_shot(self):
+        chunker = CDCChunker(512, 2048, 8192)
+        one_shot = chunker.split(test_data, final=True)
+
+        streamed = []
+        pending = bytearray()
+        for pos in range(0, len(test_data), 7000):
+            pending += test_data[pos:pos + 7000]
+            lengths = chunker.split(pending, final=False)
+            streamed.extend(lengths)
+            del pending[:sum(lengths)]
+        streamed.extend(chunker.split(pending, final=True))
+
+        self.assertEqual(streamed, one_shot)
+
+    def test_cdc_survives_insert(self):
+        chunker = CDCChunker(512, 2048, 8192)
+        edited = test_data[:50_000] + b'inserted bytes' + test_data[50_000:]
+
+        chunks_before = set(_chunks(test_data, chunker.split(test_data, final=True)))
+        chunks_after = _chunks(edited, chunker.split(edited, final=True))
+        unchanged = sum(1 for chunk in chunks_after if chunk in chunks_before)
+        self.assertGreaterEqual(unchanged, len(chunks_after) - 3)
+
+        # fixed size chunks after the insert point all change
+        fixed = FixedChunker(2048)
+        fixed_before = set(_chunks(test_data, fixed.split(test_data, final=True)))
+        fixed_after = _chunks(edited, fixed.split(edited, final=True))
+        self.assertLess(sum(1 for chunk in fixed_after if chunk in fixed_before), len(fixed_after) // 2)
+
+    def test_bad_sizes(self):
+        with self.assertRaises(R3D_V1T_Error):
+            CDCChunker(4096, 2048, 8192)
+        with self.assertRaises(R3D_V1T_Error):
+            FixedChunker(0)
@@ -25,6 +25,7 @@ test_upw_1_osfp_prefix = "bfd6b76fe1bb9fd3"
 test_upw_1_frame_hmac_prefix = "bb66b271e7b8c3c2"
 test_upw_1_chacha20_prefix = "4137c0ec4f64bd16"
 test_upw_1_fernet_prefix = "1cb9f38b4b831a4f"
+test_upw_1_ssfp_prefix = "37a314e31b621d2d"
 
 
 # ------------------------------------------------------------------------------------------------------------------------------
@@ -69,6 +70,7 @@ class TestKDF(unittest.TestCase):
         self.assertEqual(vks.frame_hmac_key.hex()[:len(test_upw_1_frame_hmac_prefix)], test_upw_1_frame_hmac_prefix)
         self.assertEqual(vks.sgk_chacha20.hex()[:len(test_upw_1_chacha20_prefix)], test_upw_1_chacha20_prefix)
         self.assertEqual(vks.sgk_fernet.hex()[:len(test_upw_1_fernet_prefix)], test_upw_1_fernet_prefix)
+        self.assertEqual(vks.ssfp_key.hex()[:len(test_upw_1_ssfp_prefix)], test_upw_1_ssfp_prefix)
 
     # --------------------------------------------------------------------------------------------------------------------------
     def test_vks(self):
@@ -0,0 +1,125 @@
+import os
+import sys
+import stat
+import time
+import tempfile
+import unittest
+import subprocess as sp
+from pathlib import Path
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+_repo_root = sp.check_output("git rev-parse --show-toplevel", shell=True).strip().decode('utf8')
+_include_search_path = str((Path(_repo_root) / 'src').resolve())
+
+if _include_search_path not in sys.path:
+    sys.path.insert(0, _include_search_path)
+
+from libr3dv1t.central_config import dfcc
+from libr3dv1t.krypt_utilz import kdf
+from libr3dv1t.krypt_utilz.key_agent import KeyAgent, AgentClient, derive_vks
+from libr3dv1t.typedefs import VaultKeys
+from libr3dv1t.vault.vault_man import VaultMan
+from libr3dv1t.errors import R3D_V1T_Error
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# -------------------------------------------------------------------------------------------------------------------- test data
+test_upw_1 = b"change_me"
+
+# keys derived in process, what the agent must hand out
+_test_vks_1 = kdf.vks_set_from_user_pass(test_upw_1)
+
+
+def _same_keys(vks_a: VaultKeys, vks_b: VaultKeys) -> bool:
+    return all(getattr(vks_a, slot) == getattr(vks_b, slot) for slot in VaultKeys.__slots__)
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+class TestKeyAgent(unittest.TestCase):
+
+    def setUp(self):
+        self.agent = KeyAgent(ttl=None)
+        self.sock_path = self.agent.start()
+        self.client = AgentClient(self.sock_path)
+
+    def tearDown(self):
+        self.agent.shutdown()
+        self.assertFalse(os.path.exists(os.path.dirname(self.sock_path)))
+
+    def test_vks_cached(self):
+        self.assertEqual(stat.S_IMODE(os.stat(self.sock_path).st_mode), 0o600)
+        self.assertEqual(stat.S_IMODE(os.stat(os.path.dirname(self.sock_path)).st_mode), 0o700)
+
+        self.assertTrue(_same_keys(self.client.vks(test_upw_1), _test_vks_1))
+
+        # second time from the cache, no KDF
+        t0 = time.perf_counter()
+        self.assertTrue(_same_keys(self.client.vks(test_upw_1), _test_vks_1))
+        self.assertLess(time.perf_counter() - t0, 0.5)
+        self.assertEqual(self.client.status()['keys'], 1)
+
+        # VaultMan and derive_vks go through the agent of the central config
+        old_sock = dfcc().agent_sock
+        dfcc().agent_sock = self.sock_path
+        try:
+            t0 = time.perf_counter()
+            vman = VaultMan(vlt_password=test_upw_1)
+            self.assertLess(time.perf_counter() - t0, 0.5)
+            self.assertTrue(_same_keys(vman.vks, _test_vks_1))
+
+            # a locked agent is not used, the keys are derived in process
+            self.client.lock(b'lock_pw')
+            self.assertTrue(_same_keys(derive_vks(test_upw_1), _test_vks_1))
+        finally:
+            dfcc().agent_sock = old_sock
+
+        # a second agent can't take over the socket of a live one
+        self.assertRaises(R3D_V1T_Error, KeyAgent().bind, self.sock_path)
+
+    def test_lock_ttl_forget(self):
+        # named keys, put in the cache directly, the KDF is tested above
+        self.agent._put('name:work', _test_vks_1, None)
+        self.agent._put('name:short', _test_vks_1, 0.2)
+        self.assertEqual(self.client.status()['names'], ['short', 'work'])
+        self.assertTrue(_same_keys(self.client.get('work'), _test_vks_1))
+
+        # locked: everything but unlock is refused, keys are kept
+        self.client.lock(b'lock_pw')
+        self.assertRaises(R3D_V1T_Error, self.client.get, 'work')
+        self.assertRaises(R3D_V1T_Error, self.client.status)
+        self.assertRaises(R3D_V1T_Error, self.client.unlock, b'wrong')
+        self.client.unlock(b'lock_pw')
+        self.assertTrue(_same_keys(self.client.get('work'), _test_vks_1))
+        self.assertRaises(R3D_V1T_Error, self.client.unlock, b'lock_pw')
+
+        time.sleep(0.3)
+        self.assertRaises(R3D_V1T_Error, self.client.get, 'short')
+        self.assertEqual(self.client.status()['names'], ['work'])
+
+        self.client.forget()
+        self.assertRaises(R3D_V1T_Error, self.client.get, 'work')
+
+        # bad requests get an error reply, not a dead agent
+        self.assertFalse(self.agent.handle_request({'op': 'nope'})['ok'])
+        self.assertFalse(self.agent.handle_request({'op': 'vks', 'upw': '!!'})['ok'])
+        self.assertFalse(self.agent.handle_request({'op': 'add', 'name': 'x', 'upw': '', 'ttl': -1})['ok'])
+
+    def test_private_dir_only(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            os.chmod(tmp_dir, 0o755)
+            self.assertRaises(R3D_V1T_Error, KeyAgent().bind, os.path.join(tmp_dir, 'agent.sock'))
+
+        # no agent there, the KDF runs in process
+        old_sock = dfcc().agent_sock
+        dfcc().agent_sock = os.path.join(os.path.dirname(self.sock_path), 'no_such.sock')
+        try:
+            self.assertTrue(_same_keys(derive_vks(test_upw_1), _test_vks_1))
+        finally:
+            dfcc().agent_sock = old_sock
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+if '__main__' == __name__:
+    unittest.main()
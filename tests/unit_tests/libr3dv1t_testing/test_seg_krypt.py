@@ -0,0 +1,54 @@
+import sys
+import random
+import unittest
+import subprocess as sp
+from pathlib import Path
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+_repo_root = sp.check_output("git rev-parse --show-toplevel", shell=True).strip().decode('utf8')
+_include_search_path = str((Path(_repo_root) / 'src').resolve())
+
+if _include_search_path not in sys.path:
+    sys.path.insert(0, _include_search_path)
+
+from libr3dv1t.krypt_utilz import seg_krypt
+from libr3dv1t.errors import R3D_V1T_Error
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# -------------------------------------------------------------------------------------------------------------------- test data
+test_key = bytes(range(32))
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+class TestSegKrypt(unittest.TestCase):
+
+    def test_roundtrip_serial_and_pooled(self):
+        rng = random.Random(7)
+        pt_chunks = [rng.randbytes(rng.randint(0, 3000)) for _ in range(500)]
+
+        for workers in [1, 4]:
+            ct_chunks = seg_krypt.encrypt_chunks(test_key, pt_chunks, workers=workers)
+            self.assertEqual(len(ct_chunks), len(pt_chunks))
+
+            for decrypt_workers in [1, 4]:
+                self.assertEqual(seg_krypt.decrypt_chunks(test_key, ct_chunks, workers=decrypt_workers), pt_chunks)
+
+        # every pooled call ran on the same pool
+        self.assertIs(seg_krypt._get_executor(4), seg_krypt._executors[4])
+        self.assertLessEqual(len(seg_krypt._executors[4]._threads), 4)
+
+    def test_nonces_are_not_reused(self):
+        ct_chunks = seg_krypt.encrypt_chunks(test_key, [b'same chunk'] * 200, workers=4)
+        self.assertEqual(len(set(ct_chunks)), 200)
+
+    def test_wrong_key(self):
+        ct_chunks = seg_krypt.encrypt_chunks(test_key, [b'abc', b'def'])
+        self.assertRaises(R3D_V1T_Error, seg_krypt.decrypt_chunks, bytes(32), ct_chunks)
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+if '__main__' == __name__:
+    unittest.main()
@@ -0,0 +1,92 @@
+import sys
+import unittest
+import subprocess as sp
+from pathlib import Path
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+_repo_root = sp.check_output("git rev-parse --show-toplevel", shell=True).strip().decode('utf8')
+_include_search_path = str((Path(_repo_root) / 'src').resolve())
+
+if _include_search_path not in sys.path:
+    sys.path.insert(0, _include_search_path)
+
+from libr3dv1t.vault import vlt_index
+from libr3dv1t.vault.seg_table import SegTable
+from libr3dv1t.typedefs import CTSegment, MemObj, RVKryptMode
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+def _make_seg(idx: int, sid: str = '', is_ref: bool = False, km_data: dict | None = None) -> CTSegment:
+    ct_seg = CTSegment()
+    ct_seg.idx = idx
+    ct_seg.parent_obj_id = 'oid_1'
+    ct_seg.sid = sid
+    ct_seg.is_ref = is_ref
+    if not is_ref:
+        ct_seg.km = RVKryptMode.CHACHA20_POLY1305
+        ct_seg.km_data = km_data if km_data is not None else {}
+    return ct_seg
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+class TestSegTable(unittest.TestCase):
+
+    def test_round_trip(self):
+        seg_locs = [
+            (_make_seg(0, sid='ab' * 32), 100, 50, [(150, 50)]),
+            (_make_seg(2048, sid='cd' * 32, is_ref=True), 200, 30, [(231, 30)]),
+            (_make_seg(4096, km_data={'z': 'zlib'}), 300, 40, None),
+            (_make_seg(6144, sid='odd_sid'), 400, 40, [(500, 40), (600, 40)]),
+            (_make_seg(8192, sid='AB' * 32), 700, 40, [(740, 40)]),
+        ]
+
+        seg_table = SegTable()
+        seg_table.add_obj('oid_0', [(_make_seg(0), 0, 10, None)])
+        rows = seg_table.add_obj('oid_1', seg_locs)
+        self.assertEqual(rows, range(1, 6))
+
+        # every segment comes back as its index entry says, odd values included
+        expected = [vlt_index.index_entry(ct_seg, *loc) for ct_seg, *loc in seg_locs]
+        self.assertEqual(seg_table.index_objs()['oid_1'], expected)
+        for row, (ct_seg, fl_offset, fl_length, fl_alts) in zip(rows, seg_locs):
+            seg = seg_table.seg(row)
+            self.assertEqual((seg.parent_obj_id, seg.idx, seg.sid, seg.is_ref, seg.km, seg.km_data),
+                             (ct_seg.parent_obj_id, ct_seg.idx, ct_seg.sid, ct_seg.is_ref, ct_seg.km, ct_seg.km_data))
+            self.assertEqual((seg.fl_offset, seg.fl_length, seg.fl_alts), (fl_offset, fl_length, fl_alts))
+            self.assertEqual(seg_table.is_ref(row), ct_seg.is_ref)
+
+        seg_table.drop_obj('oid_0')
+        self.assertNotIn('oid_0', seg_table)
+        self.assertEqual(list(seg_table.index_objs()), ['oid_1'])
+
+    def test_overflow_adds_nothing(self):
+        seg_table = SegTable()
+        self.assertRaises(OverflowError, seg_table.add_obj, 'oid_1', [(_make_seg(0), 0, 10, None),
+                                                                      (_make_seg(2 ** 64), 10, 10, None)])
+        self.assertEqual(len(seg_table), 0)
+        self.assertEqual(seg_table.add_obj('oid_1', [(_make_seg(0), 0, 10, None)]), range(0, 1))
+
+    def test_mem_obj_rows(self):
+        seg_table = SegTable()
+        mem_obj = MemObj()
+        mem_obj.obj_id = 'oid_1'
+        mem_obj.seg_table = seg_table
+        mem_obj.seg_rows = seg_table.add_obj('oid_1', [(_make_seg(k * 10), k * 100, 50, None) for k in range(3)])
+
+        # rows become CTSegments once, when they are asked for
+        ct_segs = mem_obj.ct_segments
+        self.assertEqual([ct_seg.idx for ct_seg in ct_segs], [0, 10, 20])
+        self.assertIs(mem_obj.ct_segments, ct_segs)
+        self.assertIsNone(mem_obj.seg_table)
+
+        # typedefs have no __dict__
+        self.assertRaises(AttributeError, setattr, ct_segs[0], 'no_such_attr', 1)
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+if '__main__' == __name__:
+    unittest.main()
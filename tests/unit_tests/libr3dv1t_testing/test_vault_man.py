@@ -0,0 +1,1015 @@
+import io
+import os
+import copy
+import sys
+import random
+import shutil
+import unittest
+import threading
+import tempfile
+from unittest import mock
+import subprocess as sp
+from pathlib import Path
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+_repo_root = sp.check_output("git rev-parse --show-toplevel", shell=True).strip().decode('utf8')
+_include_search_path = str((Path(_repo_root) / 'src').resolve())
+
+if _include_search_path not in sys.path:
+    sys.path.insert(0, _include_search_path)
+
+from libr3dv1t.central_config import dfcc
+from libr3dv1t.vault import frames, vlt_index
+from libr3dv1t.krypt_utilz import key_agent
+from libr3dv1t.vault.vault_man import VaultMan
+from libr3dv1t.vault.vvfs import VirtualFile
+from libr3dv1t.errors import R3D_V1T_Error, R3D_IO_Error
+from libr3dv1t.typedefs import RVFrameFmt
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# -------------------------------------------------------------------------------------------------------------------- test data
+test_upw_1 = b"change_me"
+
+
+def _make_test_objects() -> dict[str, bytes]:
+    rng = random.Random(42)
+    return {
+        'small.txt': b"this is a test file\n",
+        'rand.bin': rng.randbytes(10_000),
+        'dir_1/text.txt': b"test 33333333333\n\n" * 500,
+    }
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+class TestVaultMan(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        cls.vlt_pathname = os.path.join(cls.tmp_dir.name, "test.r3dv1t")
+        cls.test_objects = _make_test_objects()
+
+        vm = VaultMan(vlt_password=test_upw_1)
+        cls.oids = {}
+        for virt_name, pt_data in cls.test_objects.items():
+            vm.put_object(pt_data=pt_data, virt_name=virt_name)
+            cls.oids[virt_name] = vm.vv_fs.get_oid(VirtualFile(virt_name))
+
+        vm.save_vault(cls.vlt_pathname)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp_dir.cleanup()
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def test_load_eager(self):
+        vm = VaultMan(vlt_password=test_upw_1, vlt_file_pathname_to_load=self.vlt_pathname)
+
+        self.assertEqual(len(vm.mem_os), len(self.test_objects))
+        for virt_name, pt_data in self.test_objects.items():
+            self.assertEqual(vm.mem_os[self.oids[virt_name]].pt_data, pt_data)
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def test_load_parallel_matches_serial(self):
+        vm_serial = VaultMan(vlt_password=test_upw_1)
+        vm_serial.load_vlt(self.vlt_pathname, workers=1)
+        vm_parallel = VaultMan(vlt_password=test_upw_1)
+        vm_parallel.load_vlt(self.vlt_pathname, workers=3)
+
+        self.assertEqual(list(vm_serial.mem_os.keys()), list(vm_parallel.mem_os.keys()))
+        for oid, mem_obj in vm_serial.mem_os.items():
+            par_obj = vm_parallel.mem_os[oid]
+            self.assertEqual(mem_obj.pt_data, par_obj.pt_data)
+            self.assertEqual([(s.idx, s.km, s.ct_chunk_b64) for s in mem_obj.ct_segments],
+                             [(s.idx, s.km, s.ct_chunk_b64) for s in par_obj.ct_segments])
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def test_load_lazy(self):
+        vm = VaultMan(vlt_password=test_upw_1, vlt_file_pathname_to_load=self.vlt_pathname, lazy_load=True)
+
+        self.assertEqual(len(vm.mem_os), len(self.test_objects))
+        for mem_obj in vm.mem_os.values():
+            self.assertIsNone(mem_obj.pt_data)
+            for ct_seg in mem_obj.ct_segments:
+                self.assertEqual(ct_seg.ct_chunk_b64, b'')
+                self.assertGreaterEqual(ct_seg.fl_offset, 0)
+
+        for virt_name, pt_data in self.test_objects.items():
+            self.assertEqual(vm.get_obj_data(self.oids[virt_name]), pt_data)
+
+        vm.close()
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def test_load_index_overlaps_kdf(self):
+        vlt_copy = os.path.join(self.tmp_dir.name, "indexed.r3dv1t")
+        shutil.copyfile(self.vlt_pathname, vlt_copy)
+        shutil.copyfile(vlt_index.index_pathname(self.vlt_pathname), vlt_index.index_pathname(vlt_copy))
+        vks = VaultMan(vlt_password=test_upw_1).vks
+
+        # the keys are held back until the first indexed frame is read (for at most a few seconds)
+        frame_read = threading.Event()
+        keys_out = threading.Event()
+
+        def _held_back_derive_vks(upw):
+            frame_read.wait(timeout=5)
+            keys_out.set()
+            return vks
+
+        # frames pre-parsed before the keys were handed out
+        pre_parsed_frames = []
+        pre_parse_frame = frames.pre_parse_frame
+
+        def _recording_pre_parse_frame(frame, frame_fmt):
+            if not keys_out.is_set():
+                pre_parsed_frames.append(frame)
+            frame_read.set()
+            return pre_parse_frame(frame, frame_fmt)
+
+        scanned_spans = []
+        iter_frame_spans = frames.iter_frame_spans
+
+        def _recording_iter_frame_spans(*args):
+            spans = list(iter_frame_spans(*args))
+            scanned_spans.extend(spans)
+            return iter(spans)
+
+        with mock.patch.object(key_agent, 'derive_vks', _held_back_derive_vks), \
+                mock.patch.object(frames, 'pre_parse_frame', _recording_pre_parse_frame), \
+                mock.patch.object(frames, 'iter_frame_spans', _recording_iter_frame_spans):
+            vm = VaultMan(vlt_password=test_upw_1, vlt_file_pathname_to_load=vlt_copy)
+            self.assertGreater(len(pre_parsed_frames), 0)
+            self.assertEqual(scanned_spans, [])
+            for virt_name, pt_data in self.test_objects.items():
+                self.assertEqual(vm.get_obj_data(self.oids[virt_name]), pt_data)
+
+            # an index that decodes but does not verify is dropped once the keys are there, the file is scanned
+            with open(vlt_index.index_pathname(vlt_copy), "rb") as fh:
+                index_data = fh.read().rstrip(b'\n')
+            with open(vlt_index.index_pathname(vlt_copy), "wb") as fh:
+                fh.write(index_data[:-1] + (b'0' if index_data[-1:] != b'0' else b'1') + b'\n')
+
+            frame_read.clear()
+            keys_out.clear()
+            vm2 = VaultMan(vlt_password=test_upw_1, vlt_file_pathname_to_load=vlt_copy)
+            self.assertGreater(len(scanned_spans), 0)
+            self.assertEqual(vm2.vv_fs.checkpoint(), vm.vv_fs.checkpoint())
+            for virt_name, pt_data in self.test_objects.items():
+                self.assertEqual(vm2.get_obj_data(self.oids[virt_name]), pt_data)
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def test_load_overlaps_kdf(self):
+        # no index, so the eager load scans and pre-parses frames while the KDF runs
+        vlt_copy = os.path.join(self.tmp_dir.name, "no_index.r3dv1t")
+        shutil.copyfile(self.vlt_pathname, vlt_copy)
+
+        pre_parsed_frames = []
+        pre_parse_frame = frames.pre_parse_frame
+
+        def _recording_pre_parse_frame(frame, frame_fmt):
+            pre_parsed_frames.append(frame)
+            return pre_parse_frame(frame, frame_fmt)
+
+        with mock.patch.object(frames, 'pre_parse_frame', _recording_pre_parse_frame):
+            vm = VaultMan(vlt_password=test_upw_1, vlt_file_pathname_to_load=vlt_copy)
+        self.assertGreater(len(pre_parsed_frames), 0)
+
+        # same vault as a load with the keys already there
+        vm_keys = VaultMan(vlt_password=None, vlt_file_pathname_to_load=vlt_copy, vks=vm.vks)
+        self.assertEqual(list(vm.mem_os), list(vm_keys.mem_os))
+        self.assertEqual(vm.vv_fs.checkpoint(), vm_keys.vv_fs.checkpoint())
+        for virt_name, pt_data in self.test_objects.items():
+            self.assertEqual(vm.get_obj_data(self.oids[virt_name]), pt_data)
+
+        # bad arguments fail right away, not on the KDF thread. a failed KDF fails the load, even a lazy one whose
+        # vvfs replay would otherwise skip the frames it can't open.
+        self.assertRaises(R3D_V1T_Error, VaultMan, vlt_password="change_me")
+        self.assertRaises(R3D_V1T_Error, VaultMan, vlt_password=None, vks=b'keys')
+        with mock.patch.object(key_agent, 'derive_vks', side_effect=R3D_V1T_Error("KDF failed")):
+            self.assertRaises(R3D_V1T_Error, VaultMan, vlt_password=test_upw_1, vlt_file_pathname_to_load=vlt_copy,
+                              lazy_load=True)
+
+        # pre-parsing needs no key, a tampered frame only fails verification
+        with open(vlt_copy, "rb") as fh:
+            first_line = fh.readline().rstrip(b'\n')
+        sep = first_line.index(b'|')
+        bad_line = first_line[:sep + 1] + (b'A' if first_line[sep + 1:sep + 2] != b'A' else b'B') + first_line[sep + 2:]
+        pre_parsed = frames.pre_parse_frame(bad_line, RVFrameFmt.PSV)
+        self.assertRaises(R3D_V1T_Error, frames.verify_frame, pre_parsed, RVFrameFmt.PSV, vm.vks.frame_hmac_key)
+        pre_parsed = frames.pre_parse_frame(first_line, RVFrameFmt.PSV)
+        self.assertEqual(frames.verify_frame(pre_parsed, RVFrameFmt.PSV, vm.vks.frame_hmac_key).parent_obj_id,
+                         vm.parse_frame_line(first_line).parent_obj_id)
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def test_lazy_save_over_backing_file(self):
+        vlt_copy = os.path.join(self.tmp_dir.name, "copy.r3dv1t")
+        with open(self.vlt_pathname, "rb") as src_fh, open(vlt_copy, "wb") as dst_fh:
+            dst_fh.write(src_fh.read())
+
+        vm = VaultMan(vlt_password=test_upw_1, vlt_file_pathname_to_load=vlt_copy, lazy_load=True)
+        vm.save_vault(vlt_copy)
+        vm.close()
+
+        vm2 = VaultMan(vlt_password=test_upw_1, vlt_file_pathname_to_load=vlt_copy)
+        for virt_name, pt_data in self.test_objects.items():
+            self.assertEqual(vm2.get_obj_data(self.oids[virt_name]), pt_data)
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def test_lazy_detects_tampering_on_access(self):
+        vlt_bad = os.path.join(self.tmp_dir.name, "bad.r3dv1t")
+        with open(self.vlt_pathname, "rb") as fh:
+            lines = fh.readlines()
+
+        # flip a payload byte in every copy of the first frame
+        first_line = lines[0]
+        sep = first_line.index(b'|')
+        bad_line = first_line[:sep + 1] + (b'A' if first_line[sep + 1:sep + 2] != b'A' else b'B') + first_line[sep + 2:]
+        lines = [bad_line if line == first_line else line for line in lines]
+        with open(vlt_bad, "wb") as fh:
+            fh.writelines(lines)
+
+        vm = VaultMan(vlt_password=test_upw_1, vlt_file_pathname_to_load=vlt_bad, lazy_load=True)
+        bad_oid = vm.parse_frame_line(first_line).parent_obj_id
+        self.assertRaises(R3D_V1T_Error, vm.get_obj_data, bad_oid)
+        vm.close()
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def test_put_stream_and_path(self):
+        vm = VaultMan(vlt_password=test_upw_1)
+        pt_data = self.test_objects['rand.bin']
+
+        # odd sized pieces, so chunk boundaries do not line up with write boundaries
+        pieces = [pt_data[i:i + 777] for i in range(0, len(pt_data), 777)]
+        oid_stream = vm.put_stream(iter(pieces), virt_name='streamed.bin')
+        self.assertEqual(oid_stream, self.oids['rand.bin'])
+        self.assertIsNone(vm.mem_os[oid_stream].pt_data)
+        self.assertEqual(vm.get_obj_data(oid_stream), pt_data)
+
+        src_pathname = os.path.join(self.tmp_dir.name, "src_text.txt")
+        with open(src_pathname, "wb") as fh:
+            fh.write(self.test_objects['dir_1/text.txt'])
+        oid_path = vm.put_path(src_pathname, virt_name='from_path.txt')
+        self.assertEqual(oid_path, self.oids['dir_1/text.txt'])
+
+        # same content again, nothing new is staged
+        stg_size = vm._stg_size
+        self.assertEqual(vm.put_stream(iter(pieces), virt_name='streamed_again.bin'), oid_stream)
+        self.assertEqual(vm._stg_size, stg_size)
+
+        # the plaintext buffered per flush does not grow with the number of cores
+        with mock.patch.object(dfcc(), 'krypt_workers', 64):
+            obj_writer = vm.new_obj_writer()
+            self.assertEqual(obj_writer._batch_bytes, obj_writer._chunker.max_size * dfcc().krypt_batch_size * 4)
+
+        out_pathname = os.path.join(self.tmp_dir.name, "streamed.r3dv1t")
+        vm.save_vault(out_pathname)
+        vm.close()
+
+        vm2 = VaultMan(vlt_password=test_upw_1, vlt_file_pathname_to_load=out_pathname)
+        self.assertEqual(vm2.get_obj_data(oid_stream), pt_data)
+        self.assertEqual(vm2.get_obj_data(oid_path), self.test_objects['dir_1/text.txt'])
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def test_save_append(self):
+        vlt_copy = os.path.join(self.tmp_dir.name, "append.r3dv1t")
+        with open(self.vlt_pathname, "rb") as src_fh, open(vlt_copy, "wb") as dst_fh:
+            dst_fh.write(src_fh.read())
+        size_before = os.path.getsize(vlt_copy)
+
+        vm = VaultMan(vlt_password=test_upw_1, vlt_file_pathname_to_load=vlt_copy, lazy_load=True)
+        vm.put_object(pt_data=b"new object\n", virt_name='new.txt')
+        new_oid = vm.vv_fs.get_oid(VirtualFile('new.txt'))
+        vm.save_vault(vlt_copy, append=True)
+
+        # only the new frames got written, the old bytes are untouched
+        with open(vlt_copy, "rb") as fh:
+            appended = fh.read()
+        with open(self.vlt_pathname, "rb") as fh:
+            self.assertEqual(appended[:size_before], fh.read())
+        self.assertLess(os.path.getsize(vlt_copy) - size_before, 2048)
+
+        # nothing new, nothing written
+        size_after = os.path.getsize(vlt_copy)
+        vm.save_vault(vlt_copy, append=True)
+        self.assertEqual(os.path.getsize(vlt_copy), size_after)
+
+        # appending to some other file is not allowed
+        self.assertRaises(R3D_IO_Error, vm.save_vault, self.vlt_pathname + ".other", append=True)
+        vm.close()
+
+        vm2 = VaultMan(vlt_password=test_upw_1, vlt_file_pathname_to_load=vlt_copy)
+        self.assertEqual(vm2.get_obj_data(new_oid), b"new object\n")
+        for virt_name, pt_data in self.test_objects.items():
+            self.assertEqual(vm2.get_obj_data(self.oids[virt_name]), pt_data)
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def test_replicas_are_skipped(self):
+        n_frames = {}
+        for virt_name, pt_data in self.test_objects.items():
+            n_frames[self.oids[virt_name]] = len(range(0, len(pt_data), 2048))
+
+        for lazy in [False, True]:
+            vm = VaultMan(vlt_password=test_upw_1, vlt_file_pathname_to_load=self.vlt_pathname, lazy_load=lazy)
+            for oid, mem_obj in vm.mem_os.items():
+                self.assertEqual(len(mem_obj.ct_segments), n_frames[oid])
+            vm.close()
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def test_replica_fallback(self):
+        vlt_bad = os.path.join(self.tmp_dir.name, "bad_primary.r3dv1t")
+        with open(self.vlt_pathname, "rb") as fh:
+            lines = fh.readlines()
+
+        # corrupt only the primary copy of the first frame, its replica right after it is intact
+        first_line = lines[0]
+        self.assertEqual(lines[1], first_line)
+        sep = first_line.index(b'|')
+        lines[0] = first_line[:sep + 1] + (b'A' if first_line[sep + 1:sep + 2] != b'A' else b'B') + first_line[sep + 2:]
+        with open(vlt_bad, "wb") as fh:
+            fh.writelines(lines)
+
+        for lazy in [False, True]:
+            vm = VaultMan(vlt_password=test_upw_1, vlt_file_pathname_to_load=vlt_bad, lazy_load=lazy)
+            for virt_name, pt_data in self.test_objects.items():
+                self.assertEqual(vm.get_obj_data(self.oids[virt_name]), pt_data)
+            vm.close()
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def test_compression(self):
+        compression_before = dfcc().compression
+        dfcc().compression = 'zlib'
+        try:
+            vm = VaultMan(vlt_password=test_upw_1)
+            for virt_name, pt_data in self.test_objects.items():
+                vm.put_object(pt_data=pt_data, virt_name=virt_name)
+            oid_streamed = vm.put_stream(iter([b"log line 42\n" * 1000]), virt_name='streamed.log')
+
+            stats = vm.compression_stats()
+            self.assertEqual(stats[self.oids['dir_1/text.txt']]['z_codec'], 'zlib')
+            self.assertLess(stats[self.oids['dir_1/text.txt']]['ratio'], 0.5)
+            self.assertEqual(stats[oid_streamed]['z_codec'], 'zlib')
+            # random data does not compress, stored as is
+            self.assertEqual(stats[self.oids['rand.bin']]['z_codec'], '')
+            self.assertEqual(stats[self.oids['rand.bin']]['ratio'], 1.0)
+
+            vlt_z = os.path.join(self.tmp_dir.name, "compressed.r3dv1t")
+            vm.save_vault(vlt_z)
+            vm.close()
+        finally:
+            dfcc().compression = compression_before
+
+        self.assertLess(os.path.getsize(vlt_z), os.path.getsize(self.vlt_pathname))
+
+        vm2 = VaultMan(vlt_password=test_upw_1, vlt_file_pathname_to_load=vlt_z)
+        for virt_name, pt_data in self.test_objects.items():
+            self.assertEqual(vm2.get_obj_data(self.oids[virt_name]), pt_data)
+        self.assertEqual(vm2.get_obj_data(oid_streamed), b"log line 42\n" * 1000)
+        self.assertEqual(vm2.compression_stats()[self.oids['dir_1/text.txt']]['z_codec'], 'zlib')
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def test_cdc_chunker(self):
+        chunker_before = dfcc().chunker
+        dfcc().chunker = 'cdc'
+        try:
+            vm = VaultMan(vlt_password=test_upw_1)
+            big = random.Random(3).randbytes(60_000)
+            vm.put_object(pt_data=big, virt_name='big.bin')
+            oid = vm.vv_fs.get_oid(VirtualFile('big.bin'))
+            oid_streamed = vm.put_stream(io.BytesIO(big), virt_name='big_streamed.bin')
+            self.assertEqual(oid_streamed, oid)
+
+            # content defined cut points, segments are not all the same size
+            idx_1 = [s.idx for s in vm.mem_os[oid].ct_segments]
+            self.assertGreater(len(idx_1), 10)
+            self.assertGreater(len({b - a for a, b in zip(idx_1, idx_1[1:])}), 1)
+
+            oid_streamed_2 = vm.put_stream(io.BytesIO(big + b'tail'), virt_name='big_2.bin')
+            idx_2 = [s.idx for s in vm.mem_os[oid_streamed_2].ct_segments]
+            self.assertEqual(idx_2[:-2], idx_1[:-2])
+
+            vlt_cdc = os.path.join(self.tmp_dir.name, "cdc.r3dv1t")
+            vm.save_vault(vlt_cdc)
+            vm.close()
+        finally:
+            dfcc().chunker = chunker_before
+
+        vm2 = VaultMan(vlt_password=test_upw_1, vlt_file_pathname_to_load=vlt_cdc)
+        self.assertEqual(vm2.get_obj_data(oid), big)
+        self.assertEqual(vm2.get_obj_data(oid_streamed_2), big + b'tail')
+
+    def test_dedup(self):
+        base = random.Random(5).randbytes(20_000)
+        dedup_objects = {
+            'base.bin': base,
+            'base_plus.bin': base + b'appended',
+            'zeros.bin': bytes(10_000),
+        }
+
+        vlt_sizes = {}
+        for dedup in [False, True]:
+            dedup_before = dfcc().dedup
+            dfcc().dedup = dedup
+            try:
+                vm = VaultMan(vlt_password=test_upw_1)
+                for virt_name, pt_data in dedup_objects.items():
+                    vm.put_object(pt_data=pt_data, virt_name=virt_name)
+                oids = {virt_name: vm.vv_fs.get_oid(VirtualFile(virt_name)) for virt_name in dedup_objects}
+                oid_streamed = vm.put_stream(iter([base[:6000], base[6000:], b'streamed']), virt_name='streamed.bin')
+
+                stats = vm.dedup_stats()
+                vlt_dedup = os.path.join(self.tmp_dir.name, f"dedup_{dedup}.r3dv1t")
+                vm.save_vault(vlt_dedup)
+                vlt_sizes[dedup] = os.path.getsize(vlt_dedup)
+                vm.close()
+            finally:
+                dfcc().dedup = dedup_before
+
+        # 10 chunks of base stored once, 9 + 9 shared by base_plus and streamed, 3 of the 4 full zero chunks shared
+        self.assertEqual(stats['segments'], 10 + 10 + 10 + 5)
+        self.assertEqual(stats['ref_segments'], 9 + 9 + 3)
+        self.assertEqual(stats['dedup_ratio'], 35 / 14)
+        self.assertLess(vlt_sizes[True], vlt_sizes[False] * 0.5)
+
+        for lazy in [False, True]:
+            vm2 = VaultMan(vlt_password=test_upw_1, vlt_file_pathname_to_load=vlt_dedup, lazy_load=lazy)
+            for virt_name, pt_data in dedup_objects.items():
+                self.assertEqual(vm2.get_obj_data(oids[virt_name]), pt_data)
+            self.assertEqual(vm2.get_obj_data(oid_streamed), base + b'streamed')
+            self.assertEqual(vm2.dedup_stats(), stats)
+
+            # lazily loaded segments stay rows of the segment table, reading objects does not make CTSegments of them
+            self.assertEqual(all(mem_obj.seg_table is not None for mem_obj in vm2.mem_os.values()), lazy)
+            vm2.close()
+
+        # new objects dedup against segments loaded from the file, also when appended
+        new_data = b'N' * 2048 + base[2048:]
+        vm3 = VaultMan(vlt_password=test_upw_1, vlt_file_pathname_to_load=vlt_dedup, lazy_load=True)
+        vm3.put_object(pt_data=new_data, virt_name='new.bin')
+        oid_new = vm3.vv_fs.get_oid(VirtualFile('new.bin'))
+        self.assertEqual(vm3.dedup_stats()['stored_segments'], stats['stored_segments'] + 1)
+        vm3.save_vault(vlt_dedup, append=True)
+        vm3.close()
+
+        vm4 = VaultMan(vlt_password=test_upw_1, vlt_file_pathname_to_load=vlt_dedup)
+        self.assertEqual(vm4.get_obj_data(oid_new), new_data)
+        self.assertEqual(vm4.get_obj_data(oids['base.bin']), base)
+
+    def test_dedup_bin_frames(self):
+        vm = VaultMan(vlt_password=test_upw_1, frame_fmt=RVFrameFmt.BIN)
+        vm.put_object(pt_data=bytes(10_000), virt_name='zeros.bin')
+        vm.put_object(pt_data=bytes(12_000), virt_name='more_zeros.bin')
+        self.assertEqual(vm.dedup_stats()['stored_segments'], 3)
+        oid_1 = vm.vv_fs.get_oid(VirtualFile('zeros.bin'))
+        oid_2 = vm.vv_fs.get_oid(VirtualFile('more_zeros.bin'))
+
+        vlt_bin = os.path.join(self.tmp_dir.name, "dedup_bin.r3dv1t")
+        vm.save_vault(vlt_bin)
+        vm.close()
+
+        for lazy in [False, True]:
+            vm2 = VaultMan(vlt_password=test_upw_1, vlt_file_pathname_to_load=vlt_bin, lazy_load=lazy)
+            self.assertEqual(vm2.get_obj_data(oid_1), bytes(10_000))
+            self.assertEqual(vm2.get_obj_data(oid_2), bytes(12_000))
+            vm2.close()
+
+    def test_open_random_access(self):
+        big = random.Random(11).randbytes(100_000)
+        vm = VaultMan(vlt_password=test_upw_1)
+        vm.put_object(pt_data=big, virt_name='dir_2/big.bin')
+        oid = vm.vv_fs.get_oid(VirtualFile('dir_2/big.bin'))
+
+        # served straight from pt_data
+        with vm.open('dir_2/big.bin') as reader:
+            self.assertEqual(reader.seek(-10, io.SEEK_END), len(big) - 10)
+            self.assertEqual(reader.read(), big[-10:])
+
+        vlt_big = os.path.join(self.tmp_dir.name, "big.r3dv1t")
+        vm.save_vault(vlt_big)
+        vm.close()
+
+        vm2 = VaultMan(vlt_password=test_upw_1, vlt_file_pathname_to_load=vlt_big, lazy_load=True)
+
+        # count the segments that get decrypted
+        opened_segs = []
+        open_segments = vm2._open_segments
+        vm2._open_segments = lambda ct_segs: opened_segs.extend(ct_segs) or open_segments(ct_segs)
+
+        with vm2.open_obj(oid) as reader:
+            reader.seek(50_000)
+            self.assertEqual(reader.read(4000), big[50_000:54_000])
+            self.assertLessEqual(len(opened_segs), 2 + 4)
+
+            # reads across segment boundaries, at the end, past the end
+            for offset, size in [(2047, 2), (0, 10_000), (99_990, 100), (100_000, 10), (123_456, 1)]:
+                reader.seek(offset)
+                self.assertEqual(reader.read(size), big[offset:offset + size])
+            self.assertEqual(reader.size, len(big))
+
+        self.assertIsNone(vm2.mem_os[oid].pt_data)
+
+        # sequential reads through a buffered reader
+        opened_segs.clear()
+        with io.BufferedReader(vm2.open_obj(oid), buffer_size=3000) as reader:
+            self.assertEqual(b''.join(iter(lambda: reader.read(777), b'')), big)
+        self.assertEqual(len(opened_segs), len(vm2.mem_os[oid].ct_segments))
+        vm2.close()
+
+    def test_index(self):
+        vlt_copy = os.path.join(self.tmp_dir.name, "indexed.r3dv1t")
+        for suffix in ['', vlt_index.INDEX_SUFFIX]:
+            shutil.copyfile(self.vlt_pathname + suffix, vlt_copy + suffix)
+
+        # record every frame span the loaders scan
+        scanned_spans = []
+        iter_frame_spans = frames.iter_frame_spans
+
+        def _recording_iter_frame_spans(*args):
+            spans = list(iter_frame_spans(*args))
+            scanned_spans.extend(spans)
+            return iter(spans)
+
+        with mock.patch.object(frames, 'iter_frame_spans', _recording_iter_frame_spans):
+            for lazy, use_index in [(True, True), (False, True), (True, False)]:
+                scanned_spans.clear()
+                vm = VaultMan(vlt_password=test_upw_1)
+                vm.load_vlt(vlt_copy, lazy=lazy, workers=1, use_index=use_index)
+                self.assertEqual(len(scanned_spans) == 0, use_index)
+                for virt_name, pt_data in self.test_objects.items():
+                    self.assertEqual(vm.get_obj_data(self.oids[virt_name]), pt_data)
+                if lazy:
+                    self.assertTrue(all(ct_seg.fl_alts for mem_obj in vm.mem_os.values() for ct_seg in mem_obj.ct_segments))
+                vm.close()
+
+            # a small append leaves the index alone, the new object is found by scanning only the appended frames
+            index_data = Path(vlt_index.index_pathname(vlt_copy)).read_bytes()
+            vm = VaultMan(vlt_password=test_upw_1, vlt_file_pathname_to_load=vlt_copy, lazy_load=True)
+            vm.put_object(pt_data=b"indexed new object\n", virt_name='new.txt')
+            new_oid = vm.vv_fs.get_oid(VirtualFile('new.txt'))
+            vm.save_vault(vlt_copy, append=True)
+            self.assertEqual(Path(vlt_index.index_pathname(vlt_copy)).read_bytes(), index_data)
+
+            scanned_spans.clear()
+            vm2 = VaultMan(vlt_password=test_upw_1, vlt_file_pathname_to_load=vlt_copy, lazy_load=True)
+            # the segment frame and the vvfs journal frame, twice each
+            self.assertEqual(len(scanned_spans), 4)
+            self.assertEqual(vm2.get_obj_data(new_oid), b"indexed new object\n")
+            vm2.close()
+
+            # once the unindexed tail is large the next append rewrites the index, nothing is scanned after that
+            vm.put_object(pt_data=b"second new object\n", virt_name='new_2.txt')
+            with mock.patch.object(dfcc(), 'vlt_index_tail_ratio', 0.0):
+                vm.save_vault(vlt_copy, append=True)
+            vm.close()
+
+            scanned_spans.clear()
+            vm2 = VaultMan(vlt_password=test_upw_1, vlt_file_pathname_to_load=vlt_copy, lazy_load=True)
+            self.assertEqual(scanned_spans, [])
+            self.assertEqual(vm2.get_obj_data(new_oid), b"indexed new object\n")
+            self.assertEqual(vm2.get_obj_data(vm2.vv_fs.get_oid(VirtualFile('new_2.txt'))), b"second new object\n")
+            vm2.close()
+
+            # frames appended behind the back of the index are scanned, the indexed part is not
+            vm_other = VaultMan(vlt_password=test_upw_1)
+            vm_other.put_object(pt_data=b"appended behind the index\n", virt_name='other.txt')
+            other_oid = vm_other.vv_fs.get_oid(VirtualFile('other.txt'))
+            vlt_other = os.path.join(self.tmp_dir.name, "other.r3dv1t")
+            vm_other.save_vault(vlt_other)
+            with open(vlt_other, "rb") as src_fh, open(vlt_copy, "ab") as dst_fh:
+                dst_fh.write(src_fh.read())
+
+            scanned_spans.clear()
+            vm3 = VaultMan(vlt_password=test_upw_1, vlt_file_pathname_to_load=vlt_copy, lazy_load=True)
+            # the segment frame and the vvfs checkpoint frame of the other vault, twice each
+            self.assertEqual(len(scanned_spans), 4)
+            self.assertEqual(vm3.get_obj_data(other_oid), b"appended behind the index\n")
+            self.assertEqual(len(vm3.mem_os), len(self.test_objects) + 3)
+            vm3.close()
+
+        # a stale index (vault rewritten without it) or a tampered one is ignored, loads fall back to a full scan
+        shutil.copyfile(vlt_other, vlt_copy)
+        vm4 = VaultMan(vlt_password=test_upw_1, vlt_file_pathname_to_load=vlt_copy, lazy_load=True)
+        self.assertEqual(list(vm4.mem_os), [other_oid])
+        vm4.close()
+
+        shutil.copyfile(self.vlt_pathname, vlt_copy)
+        with open(self.vlt_pathname + vlt_index.INDEX_SUFFIX, "rb") as fh:
+            index_data = bytearray(fh.read())
+        index_data[10] ^= 0x01
+        with open(vlt_copy + vlt_index.INDEX_SUFFIX, "wb") as fh:
+            fh.write(index_data)
+        vm5 = VaultMan(vlt_password=test_upw_1, vlt_file_pathname_to_load=vlt_copy)
+        for virt_name, pt_data in self.test_objects.items():
+            self.assertEqual(vm5.get_obj_data(self.oids[virt_name]), pt_data)
+
+    def test_xtract(self):
+        big = random.Random(13).randbytes(300_000)
+        vm = VaultMan(vlt_password=test_upw_1)
+        xtract_objects = dict(self.test_objects, **{'big.bin': big, 'big_2.bin': big[:150_000] + b'x', 'empty': b''})
+        for virt_name, pt_data in xtract_objects.items():
+            vm.put_object(pt_data=pt_data, virt_name=virt_name)
+        oids = {virt_name: vm.vv_fs.get_oid(VirtualFile(virt_name)) for virt_name in xtract_objects}
+
+        vlt_x = os.path.join(self.tmp_dir.name, "xtract.r3dv1t")
+        vm.save_vault(vlt_x)
+
+        def _check_xtracted(out_dir, expected: dict[str, bytes]):
+            found = sorted(str(p.relative_to(out_dir)) for p in Path(out_dir).rglob("*") if p.is_file())
+            self.assertEqual(found, sorted(expected))
+            for rel_pathname, pt_data in expected.items():
+                with open(os.path.join(out_dir, rel_pathname), "rb") as fh:
+                    self.assertEqual(fh.read(), pt_data)
+
+        # straight from memory, by name
+        out_mem = os.path.join(self.tmp_dir.name, "xtracted_mem")
+        vm.xtract_vlt_to_path(out_mem, workers=3)
+        _check_xtracted(out_mem, xtract_objects)
+        vm.close()
+
+        # streamed from a lazily loaded vault, names come from its vvfs frames.
+        # empty objects have no frames, they do not survive a save
+        saved_objects = {virt_name: pt_data for virt_name, pt_data in xtract_objects.items() if virt_name != 'empty'}
+        for workers in [1, 3]:
+            vm2 = VaultMan(vlt_password=test_upw_1, vlt_file_pathname_to_load=vlt_x, lazy_load=True)
+            out_lazy = os.path.join(self.tmp_dir.name, f"xtracted_lazy_{workers}")
+            vm2.xtract_vlt_to_path(out_lazy, workers=workers)
+            _check_xtracted(out_lazy, saved_objects)
+            self.assertTrue(all(mem_obj.pt_data is None for mem_obj in vm2.mem_os.values()))
+            vm2.close()
+
+        # an object with a broken segment (all copies) is left out, everything else is extracted
+        vm3 = VaultMan(vlt_password=test_upw_1, vlt_file_pathname_to_load=vlt_x, lazy_load=True)
+        bad_seg = vm3.mem_os[oids['rand.bin']].ct_segments[2]
+        bad_locs = [(bad_seg.fl_offset, bad_seg.fl_length)] + (bad_seg.fl_alts or [])
+        bad_seg.fl_alts = None
+        bad_seg.fl_offset += 1
+        out_bad = os.path.join(self.tmp_dir.name, "xtracted_bad")
+        vm3.xtract_vlt_to_path(out_bad, workers=2)
+        del saved_objects['rand.bin']
+        _check_xtracted(out_bad, saved_objects)
+
+        # same, all copies of a frame broken on disk and the vault loaded eagerly: the object is left with a hole where
+        # that segment was, its output is dropped instead of written with zeros
+        vm3.close()
+        vlt_broken = os.path.join(self.tmp_dir.name, "xtract_broken.r3dv1t")
+        with open(vlt_x, "rb") as fh:
+            vlt_data = bytearray(fh.read())
+        for fl_offset, fl_length in bad_locs:
+            vlt_data[fl_offset + fl_length // 2] ^= 0x01
+        with open(vlt_broken, "wb") as fh:
+            fh.write(vlt_data)
+
+        vm4 = VaultMan(vlt_password=test_upw_1, vlt_file_pathname_to_load=vlt_broken)
+        self.assertIsNone(vm4.mem_os[oids['rand.bin']].pt_data)
+        out_broken = os.path.join(self.tmp_dir.name, "xtracted_broken")
+        stats = vm4.xtract_vlt_to_path(out_broken, workers=2)
+        self.assertEqual((stats["written"], stats["failed"]), (len(saved_objects), 1))
+        _check_xtracted(out_broken, saved_objects)
+        vm4.close()
+
+    def test_xtract_names_and_incremental(self):
+        vm = VaultMan(vlt_password=test_upw_1)
+        for virt_name, pt_data in self.test_objects.items():
+            vm.put_object(pt_data=pt_data, virt_name=virt_name)
+        vm.put_object(pt_data=self.test_objects['rand.bin'], virt_name='dir_3/rand_copy.bin')
+        vm.put_object(pt_data=b'outside', virt_name='../outside.txt')
+
+        out_dir = os.path.join(self.tmp_dir.name, "xtracted_names")
+        stats = vm.xtract_vlt_to_path(out_dir)
+        self.assertEqual(stats, {"written": 3, "linked": 1, "skipped": 0, "failed": 0})
+        self.assertFalse(os.path.exists(os.path.join(self.tmp_dir.name, "outside.txt")))
+
+        # same oid, written once, the other name is a hardlink
+        rand_pathname = os.path.join(out_dir, "rand.bin")
+        copy_pathname = os.path.join(out_dir, "dir_3", "rand_copy.bin")
+        self.assertTrue(os.path.samefile(rand_pathname, copy_pathname))
+        with open(copy_pathname, "rb") as fh:
+            self.assertEqual(fh.read(), self.test_objects['rand.bin'])
+
+        # nothing changed, nothing written
+        self.assertEqual(vm.xtract_vlt_to_path(out_dir), {"written": 0, "linked": 0, "skipped": 4, "failed": 0})
+
+        # a modified file (same size) and a removed link are redone, the rest is kept
+        with open(os.path.join(out_dir, "small.txt"), "r+b") as fh:
+            fh.write(b"X")
+        os.remove(copy_pathname)
+        text_ino = os.stat(os.path.join(out_dir, "dir_1", "text.txt")).st_ino
+        self.assertEqual(vm.xtract_vlt_to_path(out_dir), {"written": 1, "linked": 1, "skipped": 2, "failed": 0})
+        with open(os.path.join(out_dir, "small.txt"), "rb") as fh:
+            self.assertEqual(fh.read(), self.test_objects['small.txt'])
+        self.assertEqual(os.stat(os.path.join(out_dir, "dir_1", "text.txt")).st_ino, text_ino)
+        self.assertTrue(os.path.samefile(rand_pathname, copy_pathname))
+
+        # one folder only, under its full name
+        out_dir_3 = os.path.join(self.tmp_dir.name, "xtracted_dir_3")
+        stats = vm.xtract_vlt_to_path(out_dir_3, virt_dir='dir_3')
+        self.assertEqual(stats, {"written": 1, "linked": 0, "skipped": 0, "failed": 0})
+        self.assertEqual(os.listdir(out_dir_3), ['dir_3'])
+        self.assertEqual(os.listdir(os.path.join(out_dir_3, 'dir_3')), ['rand_copy.bin'])
+        vm.close()
+
+    def test_pt_cache(self):
+        budget_before = dfcc().pt_cache_budget
+        dfcc().pt_cache_budget = 12_000
+        try:
+            vm = VaultMan(vlt_password=test_upw_1, vlt_file_pathname_to_load=self.vlt_pathname)
+        finally:
+            dfcc().pt_cache_budget = budget_before
+
+        # eager load decrypts everything, only what fits the budget stays in memory
+        stats = vm.cache_stats()
+        self.assertLessEqual(stats["bytes"], 12_000)
+        self.assertGreaterEqual(stats["evictions"], 1)
+        self.assertEqual(stats["objects"], sum(mem_obj.pt_data is not None for mem_obj in vm.mem_os.values()))
+        self.assertLess(stats["objects"], len(self.test_objects))
+
+        # evicted objects come back from their segments
+        evicted_name = next(virt_name for virt_name, oid in self.oids.items() if vm.mem_os[oid].pt_data is None)
+        for virt_name in [evicted_name, evicted_name]:
+            self.assertEqual(vm.get_obj_data(self.oids[virt_name]), self.test_objects[virt_name])
+        stats = vm.cache_stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+        self.assertLessEqual(stats["bytes"], 12_000)
+
+        # bigger than the budget, served but not kept
+        big = random.Random(15).randbytes(20_000)
+        vm.put_object(pt_data=big, virt_name='big.bin')
+        big_oid = vm.vv_fs.get_oid(VirtualFile('big.bin'))
+        self.assertIsNone(vm.mem_os[big_oid].pt_data)
+        self.assertEqual(vm.get_obj_data(big_oid), big)
+        with vm.open_obj(big_oid) as reader:
+            reader.seek(15_000)
+            self.assertEqual(reader.read(100), big[15_000:15_100])
+        self.assertLessEqual(vm.cache_stats()["bytes"], 12_000)
+
+    def test_reassembly_checks_extents(self):
+        oid = self.oids['rand.bin']
+        pt_data = self.test_objects['rand.bin']
+
+        def _load_rand() -> tuple[VaultMan, list]:
+            # in memory segments, lazy ones would fail verification against their frame once modified
+            vm = VaultMan(vlt_password=test_upw_1)
+            vm.put_object(pt_data=pt_data, virt_name='rand.bin')
+            vm.mem_os[oid].pt_data = None
+            return vm, vm.mem_os[oid].ct_segments
+
+        # segment order and copies of segments do not matter
+        vm, ct_segs = _load_rand()
+        random.Random(3).shuffle(ct_segs)
+        ct_segs.append(copy.copy(ct_segs[1]))
+        dup_seg = copy.copy(ct_segs[2])
+        dup_seg.sid = ''
+        ct_segs.append(dup_seg)
+        self.assertEqual(vm.get_obj_data(oid), pt_data)
+        self.assertEqual(vm.mem_os[oid].pt_len, len(pt_data))
+        vm.close()
+
+        # a missing segment is a gap, not zero bytes
+        vm, ct_segs = _load_rand()
+        del ct_segs[1]
+        with self.assertRaisesRegex(R3D_V1T_Error, "no segment covers"):
+            vm.get_obj_data(oid)
+        vm.close()
+
+        # a segment at the wrong offset overlaps its neighbour
+        vm, ct_segs = _load_rand()
+        ct_segs[1].idx -= 10
+        with self.assertRaisesRegex(R3D_V1T_Error, "overlaps"):
+            vm.get_obj_data(oid)
+        vm.close()
+
+    def test_compact(self):
+        rand = random.Random(17).randbytes(40_000)
+        compact_objects = {'rand.bin': rand, 'rand_half.bin': rand[:20_480] + b'tail', 'small.txt': b'small'}
+
+        vm = VaultMan(vlt_password=test_upw_1)
+        for virt_name, pt_data in compact_objects.items():
+            vm.put_object(pt_data=pt_data, virt_name=virt_name)
+        oids = {virt_name: vm.vv_fs.get_oid(VirtualFile(virt_name)) for virt_name in compact_objects}
+
+        vlt_c = os.path.join(self.tmp_dir.name, "compact.r3dv1t")
+        vm.save_vault(vlt_c)
+        vm.close()
+
+        # garbage at the end of the file, an object appended and then orphaned
+        with open(vlt_c, "ab") as fh:
+            fh.write(b'garbage line\n' * 100)
+        vm = VaultMan(vlt_password=test_upw_1, vlt_file_pathname_to_load=vlt_c, lazy_load=True)
+        for virt_name, oid in oids.items():
+            vm.vv_fs.link_vf(VirtualFile(virt_name), oid)
+        vm.put_object(pt_data=b'short lived', virt_name='tmp.txt')
+        vm.save_vault(vlt_c, append=True)
+
+        # interrupted, the vault file is left as it was
+        size_before = os.path.getsize(vlt_c)
+        with mock.patch.object(VaultMan, "_write_mem_obj_frames", side_effect=KeyboardInterrupt):
+            self.assertRaises(KeyboardInterrupt, vm.compact_vlt)
+        self.assertEqual(os.path.getsize(vlt_c), size_before)
+        self.assertFalse(os.path.exists(vlt_c + ".tmp"))
+
+        # rand.bin holds the payloads rand_half.bin references, they stay
+        vm.vv_fs.unlink_vf(VirtualFile('rand.bin'))
+        vm.vv_fs.unlink_vf(VirtualFile('tmp.txt'))
+
+        report = vm.compact_vlt()
+        self.assertEqual(report["objects_dropped"], 2)
+        self.assertEqual(report["objects"], 2)
+        self.assertEqual(report["bytes_before"], size_before)
+        self.assertEqual(report["bytes_reclaimed"], size_before - os.path.getsize(vlt_c))
+        self.assertGreater(report["bytes_reclaimed"], 40_000)
+        self.assertEqual(vm.get_obj_data(oids['rand_half.bin']), compact_objects['rand_half.bin'])
+        vm.close()
+
+        for lazy in [False, True]:
+            vm2 = VaultMan(vlt_password=test_upw_1, vlt_file_pathname_to_load=vlt_c, lazy_load=lazy)
+            self.assertEqual(sorted(vm2.mem_os), sorted([oids['rand_half.bin'], oids['small.txt']]))
+            self.assertEqual(vm2.get_obj_data(oids['rand_half.bin']), compact_objects['rand_half.bin'])
+            self.assertEqual(vm2.get_obj_data(oids['small.txt']), b'small')
+            vm2.close()
+
+        # orphaned in an earlier session: unlinked, full save, reload. the checkpoint remembers the orphan.
+        vm3 = VaultMan(vlt_password=test_upw_1, vlt_file_pathname_to_load=vlt_c)
+        vm3.vv_fs.unlink_vf(VirtualFile('small.txt'))
+        vm3.save_vault(vlt_c)
+        vm3.close()
+
+        vm4 = VaultMan(vlt_password=test_upw_1, vlt_file_pathname_to_load=vlt_c, lazy_load=True)
+        self.assertEqual(vm4.vv_fs.orphaned_oids, {oids['small.txt']})
+        report = vm4.compact_vlt()
+        self.assertEqual(report["objects_dropped"], 1)
+        self.assertGreater(report["bytes_reclaimed"], 0)
+        self.assertEqual(list(vm4.mem_os), [oids['rand_half.bin']])
+        vm4.close()
+
+        vm5 = VaultMan(vlt_password=test_upw_1, vlt_file_pathname_to_load=vlt_c)
+        self.assertEqual(list(vm5.mem_os), [oids['rand_half.bin']])
+        self.assertEqual(vm5.vv_fs.orphaned_oids, set())
+        vm5.close()
+
+        # only the vault file this vault came from
+        self.assertRaises(R3D_IO_Error, VaultMan(vlt_password=test_upw_1).compact_vlt)
+
+    def test_vvfs_persisted(self):
+        vm = VaultMan(vlt_password=test_upw_1)
+        for virt_name, pt_data in self.test_objects.items():
+            vm.put_object(pt_data=pt_data, virt_name=virt_name)
+        vm.put_object(pt_data=self.test_objects['small.txt'], virt_name='dir_2/small_copy.txt')
+
+        vlt_v = os.path.join(self.tmp_dir.name, "vvfs.r3dv1t")
+        vm.save_vault(vlt_v)
+        self.assertEqual(vm.vv_fs.journal, [])
+        vm.close()
+
+        # names survive every way of loading
+        for lazy, workers, use_index in [(False, 1, True), (False, 1, False), (False, 3, False), (True, None, True),
+                                         (True, None, False)]:
+            vm2 = VaultMan(vlt_password=test_upw_1)
+            vm2.load_vlt(vlt_v, lazy=lazy, workers=workers, use_index=use_index)
+            self.assertEqual(vm2.vv_fs.checkpoint(), vm.vv_fs.checkpoint())
+            self.assertEqual(vm2.vv_fs.journal, [])
+            vm2.close()
+
+        # appending saves journal the changes, a load replays them on top of the checkpoint
+        vm3 = VaultMan(vlt_password=test_upw_1, vlt_file_pathname_to_load=vlt_v, lazy_load=True)
+        vm3.put_object(pt_data=b'new', virt_name='new.txt')
+        vm3.vv_fs.link_vf(VirtualFile('renamed.txt'), vm3.vv_fs.get_oid(VirtualFile('small.txt')))
+        vm3.vv_fs.unlink_vf(VirtualFile('small.txt'))
+        self.assertEqual(len(vm3.vv_fs.journal), 3)
+        vm3.save_vault(vlt_v, append=True)
+        vm3.put_object(pt_data=b'newer', virt_name='dir_1/text.txt')
+        vm3.save_vault(vlt_v, append=True)
+        self.assertEqual([entry[:2] for entry in vm3._persisted_vvfs], [[1, 1], [2, 0], [3, 0]])
+        expected_names = vm3.vv_fs.checkpoint()
+        vm3.close()
+
+        for lazy in [False, True]:
+            vm4 = VaultMan(vlt_password=test_upw_1, vlt_file_pathname_to_load=vlt_v, lazy_load=lazy)
+            self.assertEqual(vm4.vv_fs.checkpoint(), expected_names)
+            self.assertEqual(vm4.get_obj_data(vm4.vv_fs.get_oid(VirtualFile('dir_1/text.txt'))), b'newer')
+            self.assertRaises(R3D_V1T_Error, vm4.vv_fs.get_oid, VirtualFile('small.txt'))
+            vm4.close()
+
+        # once the journal gets long an appending save writes a checkpoint, loads skip the journal before it
+        checkpoint_ops_before = dfcc().vvfs_checkpoint_ops
+        dfcc().vvfs_checkpoint_ops = 3
+        try:
+            vm5 = VaultMan(vlt_password=test_upw_1, vlt_file_pathname_to_load=vlt_v, lazy_load=True)
+            vm5.vv_fs.unlink_vf(VirtualFile('new.txt'))
+            vm5.save_vault(vlt_v, append=True)
+            self.assertEqual([entry[:2] for entry in vm5._persisted_vvfs], [[4, 1]])
+            expected_names = vm5.vv_fs.checkpoint()
+            vm5.close()
+        finally:
+            dfcc().vvfs_checkpoint_ops = checkpoint_ops_before
+
+        with mock.patch.object(VaultMan, "_open_vvfs_frame", autospec=True,
+                               side_effect=VaultMan._open_vvfs_frame) as open_vvfs_frame:
+            vm6 = VaultMan(vlt_password=test_upw_1, vlt_file_pathname_to_load=vlt_v, lazy_load=True)
+        self.assertEqual([call.args[1].seq for call in open_vvfs_frame.call_args_list], [4])
+        self.assertEqual(vm6.vv_fs.checkpoint(), expected_names)
+        vm6.close()
+
+        # a broken journal frame (all copies) loses its changes, the rest is replayed
+        vm7 = VaultMan(vlt_password=test_upw_1, vlt_file_pathname_to_load=vlt_v)
+        vm7.put_object(pt_data=b'lost', virt_name='lost.txt')
+        vm7.save_vault(vlt_v, append=True)
+        vm7.put_object(pt_data=b'kept', virt_name='kept.txt')
+        vm7.save_vault(vlt_v, append=True)
+        lost_entry = vm7._persisted_vvfs[1]
+        with open(vlt_v, "r+b") as fh:
+            for fl_offset, fl_length in [lost_entry[2:4]] + lost_entry[4]:
+                fh.seek(fl_offset + fl_length // 2)
+                byte = fh.read(1)
+                fh.seek(-1, os.SEEK_CUR)
+                fh.write(b'A' if byte != b'A' else b'B')
+
+        vm8 = VaultMan(vlt_password=test_upw_1)
+        vm8.load_vlt(vlt_v, use_index=False)
+        self.assertRaises(R3D_V1T_Error, vm8.vv_fs.get_oid, VirtualFile('lost.txt'))
+        self.assertEqual(vm8.get_obj_data(vm8.vv_fs.get_oid(VirtualFile('kept.txt'))), b'kept')
+
+    def test_get_obj_data_unknown_oid(self):
+        vm = VaultMan(vlt_password=test_upw_1)
+        self.assertRaises(R3D_V1T_Error, vm.get_obj_data, 'no_such_oid')
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+class TestVaultManBinFrames(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        cls.psv_pathname = os.path.join(cls.tmp_dir.name, "test_psv.r3dv1t")
+        cls.bin_pathname = os.path.join(cls.tmp_dir.name, "test_bin.r3dv1t")
+        cls.test_objects = _make_test_objects()
+
+        vm = VaultMan(vlt_password=test_upw_1, frame_fmt=RVFrameFmt.BIN)
+        cls.oids = {}
+        for virt_name, pt_data in cls.test_objects.items():
+            vm.put_object(pt_data=pt_data, virt_name=virt_name)
+            cls.oids[virt_name] = vm.vv_fs.get_oid(VirtualFile(virt_name))
+
+        vm.save_vault(cls.bin_pathname)
+        vm._frame_fmt = RVFrameFmt.PSV
+        vm.save_vault(cls.psv_pathname)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp_dir.cleanup()
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def test_bin_is_smaller(self):
+        self.assertLess(os.path.getsize(self.bin_pathname), 0.8 * os.path.getsize(self.psv_pathname))
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def test_load_modes(self):
+        for lazy, workers in [(False, 1), (False, 3), (True, None)]:
+            vm = VaultMan(vlt_password=test_upw_1)
+            vm.load_vlt(self.bin_pathname, lazy=lazy, workers=workers)
+            self.assertEqual(vm._frame_fmt, RVFrameFmt.BIN)
+            self.assertEqual(len(vm.mem_os), len(self.test_objects))
+            for virt_name, pt_data in self.test_objects.items():
+                self.assertEqual(vm.get_obj_data(self.oids[virt_name]), pt_data)
+                self.assertEqual(vm.vv_fs.get_oid(VirtualFile(virt_name)), self.oids[virt_name])
+            vm.close()
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def test_corrupt_primary_resyncs(self):
+        with open(self.bin_pathname, "rb") as fh:
+            vlt_bytes = bytearray(fh.read())
+
+        # break the length field in the header of the very first frame and a payload byte further in
+        vlt_bytes[20] ^= 0xff
+        vlt_bytes[len(vlt_bytes) // 2] ^= 0xff
+
+        vlt_bad = os.path.join(self.tmp_dir.name, "bad.r3dv1t")
+        with open(vlt_bad, "wb") as fh:
+            fh.write(vlt_bytes)
+
+        for lazy in [False, True]:
+            vm = VaultMan(vlt_password=test_upw_1, vlt_file_pathname_to_load=vlt_bad, lazy_load=lazy)
+            for virt_name, pt_data in self.test_objects.items():
+                self.assertEqual(vm.get_obj_data(self.oids[virt_name]), pt_data)
+            vm.close()
+
+    # --------------------------------------------------------------------------------------------------------------------------
+    def test_append_keeps_format(self):
+        vlt_copy = os.path.join(self.tmp_dir.name, "append_bin.r3dv1t")
+        with open(self.bin_pathname, "rb") as src_fh, open(vlt_copy, "wb") as dst_fh:
+            dst_fh.write(src_fh.read())
+
+        # the vault format wins over the requested format for new vaults
+        vm = VaultMan(vlt_password=test_upw_1, vlt_file_pathname_to_load=vlt_copy, frame_fmt=RVFrameFmt.PSV)
+        vm.put_object(pt_data=b"new object\n", virt_name='new.txt')
+        vm.save_vault(vlt_copy, append=True)
+
+        vm2 = VaultMan(vlt_password=test_upw_1, vlt_file_pathname_to_load=vlt_copy)
+        self.assertEqual(vm2.get_obj_data(vm.vv_fs.get_oid(VirtualFile('new.txt'))), b"new object\n")
+        self.assertEqual(len(vm2.mem_os), len(self.test_objects) + 1)
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+if '__main__' == __name__:
+    unittest.main()
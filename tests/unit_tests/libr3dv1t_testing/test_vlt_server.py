@@ -0,0 +1,171 @@
+import sys
+import json
+import asyncio
+import random
+import unittest
+import subprocess as sp
+from pathlib import Path
+
+import tornado.testing
+import tornado.tcpclient
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+_repo_root = sp.check_output("git rev-parse --show-toplevel", shell=True).strip().decode('utf8')
+_include_search_path = str((Path(_repo_root) / 'src').resolve())
+
+if _include_search_path not in sys.path:
+    sys.path.insert(0, _include_search_path)
+
+from libr3dv1t.server.vlt_server import make_app, parse_range, serve, ServerMetrics
+from libr3dv1t.vault.async_vault_man import AsyncVaultMan
+from libr3dv1t.vault.vault_man import VaultMan
+from libr3dv1t.errors import R3D_V1T_Error
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# -------------------------------------------------------------------------------------------------------------------- test data
+test_upw_1 = b"change_me"
+test_data = random.Random(5).randbytes(100_000)
+
+# one VaultMan for all tests, the KDF takes seconds
+_vman = VaultMan(vlt_password=test_upw_1)
+_vman.put_object(pt_data=test_data, virt_name='dir_1/rand.bin')
+_vman.put_object(pt_data=b'', virt_name='empty')
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+class TestParseRange(unittest.TestCase):
+
+    def test_parse_range(self):
+        self.assertEqual(parse_range("bytes=0-99", 1000), (0, 100))
+        self.assertEqual(parse_range("bytes=900-", 1000), (900, 1000))
+        self.assertEqual(parse_range("bytes=900-5000", 1000), (900, 1000))
+        self.assertEqual(parse_range("bytes=-100", 1000), (900, 1000))
+        self.assertEqual(parse_range("bytes=-5000", 1000), (0, 1000))
+
+        # not a single byte range, ignored
+        self.assertIsNone(parse_range("bytes=0-1,5-6", 1000))
+        self.assertIsNone(parse_range("items=0-1", 1000))
+        self.assertIsNone(parse_range("bytes=50-10", 1000))
+
+        self.assertRaises(ValueError, parse_range, "bytes=1000-", 1000)
+        self.assertRaises(ValueError, parse_range, "bytes=-0", 1000)
+        self.assertRaises(ValueError, parse_range, "bytes=-10", 0)
+        self.assertRaises(ValueError, parse_range, "bytes=0-", 0)
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+class TestVltServer(tornado.testing.AsyncHTTPTestCase):
+
+    def get_app(self):
+        self.metrics = ServerMetrics()
+        self.token = "test_token"
+        return make_app(AsyncVaultMan(_vman), metrics=self.metrics, token=self.token)
+
+    def fetch(self, path, **kwargs):
+        kwargs.setdefault("headers", {}).setdefault("Authorization", f"Bearer {self.token}")
+        return super().fetch(path, **kwargs)
+
+    def test_get(self):
+        response = self.fetch("/objs/dir_1/rand.bin")
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.body, test_data)
+        self.assertEqual(response.headers["Accept-Ranges"], "bytes")
+
+        response = self.fetch("/objs/empty")
+        self.assertEqual((response.code, response.body), (200, b''))
+
+        response = self.fetch("/objs/dir_1/rand.bin", method="HEAD")
+        self.assertEqual(int(response.headers["Content-Length"]), len(test_data))
+
+        response = self.fetch("/objs/no_such.bin")
+        self.assertEqual(response.code, 404)
+
+        response = self.fetch("/objs/empty", headers={"Range": "bytes=-10"})
+        self.assertEqual(response.code, 416)
+        self.assertEqual(response.headers["Content-Range"], "bytes */0")
+
+    def test_range(self):
+        response = self.fetch("/objs/dir_1/rand.bin", headers={"Range": "bytes=50000-50999"})
+        self.assertEqual(response.code, 206)
+        self.assertEqual(response.body, test_data[50_000:51_000])
+        self.assertEqual(response.headers["Content-Range"], f"bytes 50000-50999/{len(test_data)}")
+
+        response = self.fetch("/objs/dir_1/rand.bin", headers={"Range": "bytes=-10"})
+        self.assertEqual(response.body, test_data[-10:])
+
+        response = self.fetch("/objs/dir_1/rand.bin", headers={"Range": "bytes=200000-"})
+        self.assertEqual(response.code, 416)
+        self.assertEqual(response.headers["Content-Range"], f"bytes */{len(test_data)}")
+        self.assertEqual(self.metrics.range_requests, 2)
+
+    def test_put_streaming(self):
+        upload = random.Random(6).randbytes(300_000)
+
+        async def _body_producer(write):
+            for k in range(0, len(upload), 10_000):
+                await write(upload[k:k + 10_000])
+
+        response = self.fetch("/objs/up/load.bin", method="PUT", body_producer=_body_producer,
+                              headers={"Transfer-Encoding": "chunked"})
+        self.assertEqual(response.code, 201)
+        reply = json.loads(response.body)
+        self.assertEqual(reply["size"], len(upload))
+        self.assertEqual(_vman.get_obj_data(reply["oid"]), upload)
+
+        response = self.fetch("/objs/up/load.bin", headers={"Range": "bytes=123456-223455"})
+        self.assertEqual(response.body, upload[123_456:223_456])
+
+        metrics = json.loads(self.fetch("/metrics").body)
+        self.assertEqual(metrics["server"]["uploads"], 1)
+        self.assertEqual(metrics["server"]["bytes_in"], len(upload))
+        self.assertEqual(metrics["objects"], len(_vman.mem_os))
+        self.assertIn("dedup_ratio", metrics["dedup"])
+
+    @tornado.testing.gen_test(timeout=30)
+    async def test_put_aborted(self):
+        # more than one flush of the obj writer, so some of it is staged before the client goes away
+        stg_size = _vman._stg_size
+        head = (f"PUT /objs/aborted.bin HTTP/1.1\r\nHost: 127.0.0.1\r\nAuthorization: Bearer {self.token}\r\n"
+                f"Content-Length: 10000000\r\n\r\n").encode("ascii")
+        stream = await tornado.tcpclient.TCPClient().connect("127.0.0.1", self.get_http_port())
+        await stream.write(head + random.Random(7).randbytes(1_500_000))
+        while _vman._stg_size == stg_size:
+            await asyncio.sleep(0.01)
+
+        stream.close()
+        while _vman._stg_size != stg_size:
+            await asyncio.sleep(0.01)
+        self.assertRaises(R3D_V1T_Error, AsyncVaultMan(_vman).get_oid, 'aborted.bin')
+
+    def test_auth(self):
+        response = self.fetch("/objs/dir_1/rand.bin", headers={"Authorization": "Bearer wrong"})
+        self.assertEqual(response.code, 401)
+        self.assertEqual(response.headers["WWW-Authenticate"], "Bearer")
+        self.assertEqual(self.fetch("/metrics", headers={"Authorization": ""}).code, 401)
+
+        # dns rebinding: right token or not, only loopback Host values are answered
+        response = self.fetch("/objs/dir_1/rand.bin", headers={"Host": "rebound.example.com"})
+        self.assertEqual(response.code, 403)
+        response = self.fetch("/objs/dir_1/rand.bin", headers={"Host": f"localhost:{self.get_http_port()}"})
+        self.assertEqual(response.body, test_data)
+        self.assertEqual(self.metrics.errors, 3)
+
+    def test_loopback_only(self):
+        self.assertRaises(R3D_V1T_Error, serve, AsyncVaultMan(_vman), 0, "0.0.0.0")
+
+        # a new token for every server
+        server_1, token_1 = serve(AsyncVaultMan(_vman), 0)
+        server_2, token_2 = serve(AsyncVaultMan(_vman), 0)
+        server_1.stop()
+        server_2.stop()
+        self.assertGreaterEqual(len(token_1), 32)
+        self.assertNotEqual(token_1, token_2)
+
+
+# ------------------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------------------------------------------------------
+if '__main__' == __name__:
+    unittest.main()
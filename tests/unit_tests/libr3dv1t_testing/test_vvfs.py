@@ -74,6 +74,121 @@ class TestVOPNMap(unittest.TestCase):
         # unlinking again should not raise an error
         vv_fs.unlink_vf(vf=VirtualFile('aaa.txt'))
 
+        # oid_1 has no names left, its garbage until linked again
+        self.assertEqual(vv_fs.orphaned_oids, {'oid_1'})
+        vv_fs.link_vf(vf=VirtualFile(pname='ccc.txt'), oid='oid_1')
+        self.assertEqual(vv_fs.orphaned_oids, set())
+
+    def test_reverse_index(self):
+        vv_fs = VaultVirtualFS()
+
+        for k in range(100):
+            vv_fs.link_vf(vf=VirtualFile(pname=f'dir/{k}.txt'), oid=f'oid_{k % 10}')
+        for k in range(0, 100, 3):
+            vv_fs.link_vf(vf=VirtualFile(pname=f'dir/{k}.txt'), oid=f'oid_{k % 7}')
+        for k in range(0, 100, 5):
+            vv_fs.unlink_vf(vf=VirtualFile(pname=f'dir/{k}.txt'))
+
+        # pname_to_oid has exactly the names in oid_to_vf, no oid is left without names
+        from_oids = {vf.pname: oid for oid, vfiles in vv_fs.oid_to_vf.items() for vf in vfiles}
+        self.assertEqual(vv_fs.pname_to_oid, from_oids)
+        self.assertTrue(all(vv_fs.oid_to_vf.values()))
+        self.assertEqual(vv_fs.get_oid(VirtualFile('dir/./3.txt')), 'oid_3')
+
+        # linking a name to the oid it already points to changes nothing
+        journal_len = len(vv_fs.journal)
+        vv_fs.link_vf(vf=VirtualFile(pname='dir/3.txt'), oid='oid_3')
+        self.assertEqual(len(vv_fs.journal), journal_len)
+        self.assertEqual(vv_fs.get_vf_by_oid('oid_3').count(VirtualFile('dir/3.txt')), 1)
+
+    def test_journal_replay(self):
+        vv_fs = VaultVirtualFS()
+
+        vv_fs.link_vf(vf=VirtualFile(pname='aaa.txt'), oid='oid_1')
+        checkpoint = vv_fs.checkpoint()
+        vv_fs.journal.clear()
+
+        vv_fs.link_vf(vf=VirtualFile(pname='dir/bbb.txt'), oid='oid_2')
+        vv_fs.unlink_vf(vf=VirtualFile('aaa.txt'))
+        vv_fs.unlink_vf(vf=VirtualFile('no_such.txt'))
+        self.assertEqual(vv_fs.journal, [['l', 'dir/bbb.txt', 'oid_2'], ['u', 'aaa.txt']])
+
+        # checkpoint + journal tail rebuilds the same names, without journaling them again
+        vv_fs_2 = VaultVirtualFS()
+        vv_fs_2.load_checkpoint(checkpoint)
+        vv_fs_2.replay(vv_fs.journal)
+        self.assertEqual(vv_fs_2.checkpoint(), vv_fs.checkpoint())
+        self.assertEqual(vv_fs_2.journal, [])
+
+        # orphans are in checkpoints without names, and orphans again when loaded
+        self.assertEqual(vv_fs.checkpoint(), {'oid_1': [], 'oid_2': ['dir/bbb.txt']})
+        vv_fs_3 = VaultVirtualFS()
+        vv_fs_3.load_checkpoint(vv_fs.checkpoint())
+        self.assertEqual(vv_fs_3.orphaned_oids, {'oid_1'})
+        self.assertNotIn('oid_1', vv_fs_3.oid_to_vf)
+
+        self.assertRaises(R3D_V1T_Error, vv_fs_2.replay, [['x', 'aaa.txt']])
+        self.assertEqual(vv_fs_2.journal, [])
+
+    def test_tree(self):
+        vv_fs = VaultVirtualFS()
+
+        for pname in ['a.txt', 'docs/x.md', 'docs/y.txt', 'docs/sub/z.md', 'docs/sub/deep/w.md', '/abs/f.txt']:
+            vv_fs.link_vf(vf=VirtualFile(pname=pname), oid=f'oid_{pname}')
+
+        self.assertEqual(vv_fs.listdir(), ['/', 'a.txt', 'docs'])
+        self.assertEqual(vv_fs.listdir('docs/'), ['sub', 'x.md', 'y.txt'])
+        self.assertEqual(vv_fs.listdir('/abs'), ['f.txt'])
+        self.assertRaises(R3D_V1T_Error, vv_fs.listdir, 'docs/x.md')
+        self.assertRaises(R3D_V1T_Error, vv_fs.listdir, 'nope')
+
+        self.assertEqual([dirpath for dirpath, _, _ in vv_fs.walk('docs')], ['docs', 'docs/sub', 'docs/sub/deep'])
+        self.assertEqual(sorted(vv_fs.iter_pnames()), sorted(vv_fs.pname_to_oid))
+
+        # dirnames pruned in place are not walked
+        pruned = []
+        for dirpath, dirnames, _ in vv_fs.walk('docs'):
+            pruned.append(dirpath)
+            if 'sub' in dirnames:
+                dirnames.remove('sub')
+        self.assertEqual(pruned, ['docs'])
+
+        self.assertEqual(vv_fs.glob('docs/*.md'), ['docs/x.md'])
+        self.assertEqual(vv_fs.glob('docs/**/*.md'), ['docs/sub/deep/w.md', 'docs/sub/z.md', 'docs/x.md'])
+        self.assertEqual(vv_fs.glob('*/sub/*'), ['docs/sub/z.md'])
+        self.assertEqual(vv_fs.glob('/abs/**'), ['/abs/f.txt'])
+        self.assertEqual(vv_fs.glob('a.tx?'), ['a.txt'])
+        self.assertEqual(vv_fs.glob('docs/nope/*'), [])
+
+    def test_tree_rename_delete(self):
+        vv_fs = VaultVirtualFS()
+
+        for pname in ['docs/x.md', 'docs/sub/z.md', 'docs/sub/deep/w.md', 'other/o.txt']:
+            vv_fs.link_vf(vf=VirtualFile(pname=pname), oid=f'oid_{pname}')
+
+        self.assertEqual(vv_fs.rename_tree('docs/sub', 'moved'), 2)
+        self.assertEqual(vv_fs.listdir(), ['docs', 'moved', 'other'])
+        self.assertEqual(vv_fs.listdir('docs'), ['x.md'])
+        self.assertEqual(vv_fs.get_oid(VirtualFile('moved/deep/w.md')), 'oid_docs/sub/deep/w.md')
+        self.assertEqual(vv_fs.orphaned_oids, set())
+
+        # a single file, and moves into itself
+        self.assertEqual(vv_fs.rename_tree('other/o.txt', 'docs/o.txt'), 1)
+        self.assertFalse(vv_fs.isdir('other'))
+        self.assertRaises(R3D_V1T_Error, vv_fs.rename_tree, 'docs', 'docs/inner')
+        self.assertRaises(R3D_V1T_Error, vv_fs.rename_tree, '', 'root')
+
+        self.assertEqual(vv_fs.delete_tree('moved'), 2)
+        self.assertEqual(vv_fs.delete_tree('no_such'), 0)
+        self.assertEqual(vv_fs.listdir(), ['docs'])
+        self.assertEqual(vv_fs.orphaned_oids, {'oid_docs/sub/z.md', 'oid_docs/sub/deep/w.md'})
+
+        # renames and deletes are link/unlink ops in the journal, a replay gives the same tree
+        vv_fs_2 = VaultVirtualFS()
+        vv_fs_2.replay(vv_fs.journal)
+        self.assertEqual(vv_fs_2.checkpoint(), vv_fs.checkpoint())
+        self.assertEqual(list(vv_fs_2.walk()), list(vv_fs.walk()))
+
 # ------------------------------------------------------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------------------------------------------------------
 if '__main__' == __name__: